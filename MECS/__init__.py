@@ -6,9 +6,12 @@ It includes packages for:
     uploading data to a server
 """
 
-import pkg_resources
+from importlib.metadata import version, PackageNotFoundError
 
-__version__ = pkg_resources.get_distribution('MECS').version
+try:
+    __version__ = version('MECS')
+except PackageNotFoundError:
+    __version__ = "unknown"
 
 class MECSError(Exception): pass
 class MECSConfigError(MECSError): pass
@@ -2,13 +2,47 @@
 
 Scripts which are triggerable from the command line interface.
 Providing access to the primary functionality of the MECS system.
+
+Each command's module is only imported when the command is run,
+so a command doesn't pay for the dependencies of the others (e.g. pandas or the hardware drivers)
 """
 
-from .test import test, test2
-from .status import status
-from .initialise import initialise
-from .generate import generate
-from .aggregate import aggregate
-from .server import register, upload
-from .update import update
-from .calibrate import calibrate
+from importlib import import_module
+
+commands = {
+    # console script: (module, function)
+    "mecs-test": ("test", "test"),
+    "mecs-test2": ("test", "test2"),
+    "mecs-status": ("status", "status"),
+    "mecs-init": ("initialise", "initialise"),
+    "mecs-generate": ("generate", "generate"),
+    "mecs-aggregate": ("aggregate", "aggregate"),
+    "mecs-register": ("server", "register"),
+    "mecs-upload": ("server", "upload"),
+    "mecs-update": ("update", "update"),
+    "mecs-calibrate": ("calibrate", "calibrate"),
+    "mecs-convert": ("convert", "convert"),
+    "mecs-daemon": ("daemon", "daemon"),
+    "mecs-ctl": ("daemon", "ctl"),
+}
+
+def lazy(module, name):
+    def command():
+        return getattr(import_module(f".{module}", __name__), name)()
+    command.__name__ = name
+    command.__qualname__ = name
+    return command
+
+test = lazy("test", "test")
+test2 = lazy("test", "test2")
+status = lazy("status", "status")
+initialise = lazy("initialise", "initialise")
+generate = lazy("generate", "generate")
+aggregate = lazy("aggregate", "aggregate")
+register = lazy("server", "register")
+upload = lazy("server", "upload")
+update = lazy("update", "update")
+calibrate = lazy("calibrate", "calibrate")
+convert = lazy("convert", "convert")
+daemon = lazy("daemon", "daemon")
+ctl = lazy("daemon", "ctl")
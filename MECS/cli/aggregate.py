@@ -6,15 +6,27 @@ import logging
 import os
 
 from .. import __version__
-from ..config import conf
+from ..config import get_config
+from ..locking import locked, DATA_LOCK
 from ..data_management.aggregate import aggregate as agg
+from .utils import get_aggregated_format
 
 log = logging.getLogger(__name__)
 
 
 def aggregate():
+    conf = get_config()
     log.debug(f"MECS v{__version__} aggregating data")
+    run_aggregate(conf)
+
+def run_aggregate(conf, feed=None, build=True):
+    """
+    shared with mecs-daemon, which passes in the records it has generated
+    and leaves building the day files to the upload task (build=False)
+    """
     ROOT = os.path.expanduser(conf.get('MECS', 'root_folder'))
     OUTPUT_FOLDER = os.path.join(ROOT, conf.get('MECS', 'output_folder'))
     AGGREGATED_FOLDER = os.path.join(ROOT, conf.get('MECS', 'aggregated_folder'))
-    agg(OUTPUT_FOLDER, AGGREGATED_FOLDER)
+    FORMAT = get_aggregated_format(conf)
+    with locked(os.path.join(ROOT, DATA_LOCK)):
+        agg(OUTPUT_FOLDER, AGGREGATED_FOLDER, fmt=FORMAT, feed=feed, build=build)
@@ -4,13 +4,14 @@ import copy
 import json
 
 from .. import __version__
-from ..config import conf
+from ..config import get_config
 
 from .utils import get_board, get_devices_config
 
 log = logging.getLogger(__name__)
 
 def calibrate():
+    conf = get_config()
     log.debug(f"MECS v{__version__} calibrating current sensors")
 
     CALIBRATION_SAMPLES = conf.getint('MECS', 'calibration_samples', fallback=25)
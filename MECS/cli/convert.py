@@ -0,0 +1,32 @@
+"""Triggered via mecs-convert
+Converts existing json files in the aggregated and archive folders
+into the configured aggregated_format
+"""
+import glob
+import logging
+import os
+
+from .. import __version__
+from ..config import get_config
+from ..data_management.formats import convert as convert_file
+
+from .utils import get_aggregated_format
+
+log = logging.getLogger(__name__)
+
+
+def convert():
+    conf = get_config()
+    log.debug(f"MECS v{__version__} converting aggregated data")
+    ROOT = os.path.expanduser(conf.get('MECS', 'root_folder'))
+    AGGREGATED_FOLDER = os.path.join(ROOT, conf.get('MECS', 'aggregated_folder'))
+    ARCHIVE_FOLDER = os.path.join(ROOT, conf.get('MECS', 'archive_folder'))
+    FORMAT = get_aggregated_format(conf)
+    if FORMAT.name == "json":
+        log.info("aggregated_format is json, nothing to convert")
+        return
+    for folder in [AGGREGATED_FOLDER, ARCHIVE_FOLDER]:
+        files = sorted(glob.glob(os.path.join(folder, "*.json")))
+        log.info(f"converting {len(files)} files in {folder} to {FORMAT.name}")
+        for path in files:
+            convert_file(path, FORMAT, remove=True)
@@ -0,0 +1,59 @@
+"""Triggered via mecs-daemon
+Runs acquisition, aggregation and upload in a single long-running process
+mecs-ctl sends commands (status, run <task>, stop) to the running daemon
+"""
+import json
+import logging
+import os
+
+from .. import __version__
+from ..config import get_config, load_config, parser
+from ..daemon import Supervisor, Task, send_command
+
+log = logging.getLogger(__name__)
+
+
+def get_socket_path(conf):
+    ROOT = os.path.expanduser(conf.get('MECS', 'root_folder'))
+    return os.path.expanduser(conf.get('MECS-DAEMON', 'control_socket', fallback=os.path.join(ROOT, 'mecs.sock')))
+
+def get_tasks(conf, feed):
+    """task periods and offsets are given in minutes"""
+    from .aggregate import run_aggregate
+    from .server import run_upload
+    minutes = lambda option, fallback: 60 * conf.getfloat('MECS-DAEMON', option, fallback=fallback)
+    return [
+        Task("aggregate", lambda: run_aggregate(conf, feed=feed, build=False), minutes('aggregate_every', 60), minutes('aggregate_offset', 0)),
+        Task("upload", lambda: run_upload(conf), minutes('upload_every', 60), minutes('upload_offset', 5)),
+    ]
+
+def daemon():
+    # mecs-ctl shares this module, so the heavier imports are only made here
+    from ..data_management.aggregate import RecordFeed
+    from .generate import get_reducer, get_store
+    from .utils import get_board
+    conf = get_config()
+    log.debug(f"MECS v{__version__} starting daemon")
+    ROOT = os.path.expanduser(conf.get('MECS', 'root_folder'))
+    OUTPUT_FOLDER = os.path.join(ROOT, conf.get('MECS', 'output_folder'))
+    reducer = get_reducer(conf)
+    store = get_store(conf, OUTPUT_FOLDER)
+    feed = RecordFeed()
+    supervisor = Supervisor(get_tasks(conf, feed), ROOT, socket_path=get_socket_path(conf), feed=feed)
+    board = get_board(conf)
+    log.info(f"sampling every {board.interval}s")
+    try:
+        supervisor.run(OUTPUT_FOLDER, board.readings, reducer=reducer, delay=board.interval, store=store)
+    finally:
+        board.close()
+
+def ctl():
+    args, command = parser.parse_known_args()
+    conf = load_config(args.conf)
+    socket_path = get_socket_path(conf)
+    try:
+        response = send_command(socket_path, *(command or ["status"]))
+    except OSError as exc:
+        log.warning(f"could not contact mecs-daemon on {socket_path}: {exc}")
+        exit(1)
+    print(json.dumps(response, indent=2, default=str))
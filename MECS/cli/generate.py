@@ -6,9 +6,11 @@ Calls MECS.data_management.generate.generate
 import logging
 import os
 
-from .. import __version__
-from ..config import conf
+from .. import __version__, MECSConfigError
+from ..config import get_config
 from ..data_management.generate import generate as gen
+from ..data_management.accumulator import reducers
+from ..data_management.storage import SegmentStore, MinuteFileStore
 
 from .utils import get_board
 
@@ -16,8 +18,29 @@ log = logging.getLogger(__name__)
 
 
 def generate():
+    conf = get_config()
     log.debug(f"MECS v{__version__} generating data")
     ROOT = os.path.expanduser(conf.get('MECS', 'root_folder'))
     OUTPUT_FOLDER = os.path.join(ROOT, conf.get('MECS', 'output_folder'))
+    reducer = get_reducer(conf)
+    store = get_store(conf, OUTPUT_FOLDER)
     board = get_board(conf)
-    gen(OUTPUT_FOLDER, board.readings)
+    log.info(f"sampling every {board.interval}s")
+    try:
+        gen(OUTPUT_FOLDER, board.readings, reducer=reducer, delay=board.interval, store=store)
+    finally:
+        board.close()
+
+def get_reducer(conf):
+    REDUCER = conf.get('MECS', 'reducer', fallback='mean')
+    if REDUCER not in reducers:
+        raise MECSConfigError(f"reducer {REDUCER!r} is not supported, try one of [{', '.join(reducers.keys())}]")
+    return reducers[REDUCER]
+
+def get_store(conf, output_folder):
+    STORAGE = conf.get('MECS', 'storage', fallback='segment')
+    if STORAGE == 'segment':
+        return SegmentStore(output_folder, fsync_every=conf.getint('MECS', 'fsync_every', fallback=10))
+    elif STORAGE == 'minute':
+        return MinuteFileStore(output_folder)
+    raise MECSConfigError(f"storage {STORAGE!r} is not supported, try one of [segment, minute]")
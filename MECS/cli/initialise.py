@@ -8,12 +8,13 @@ import logging
 
 from .. import __version__
 
-from ..config import args, conf, save_config
+from ..config import get_args, get_config, save_config
 
 log = logging.getLogger(__name__)
 
 
 def initialise():
+    args, conf = get_args(), get_config()
     log.debug(f"MECS v{__version__} initialising")
     initialise_unit_id(args.conf, conf)
     initialise_type(args.conf, conf)
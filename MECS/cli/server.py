@@ -7,21 +7,28 @@ import os
 from configparser import NoOptionError
 
 from .. import __version__
-from ..config import conf, args
-from ..communication import MECSServer
+from ..config import get_args, get_config
+from ..communication import MECSServer, UploadScheduler
+from ..journal import UploadJournal
+from ..locking import locked, DATA_LOCK
 
 log = logging.getLogger(__name__)
 
-# on the server we store the data in a folder named for the unit_id
-# It's essential these are unique
-UNIT_ID = conf.get('MECS', 'unit_id', fallback="unidentified")
-REMOTE_FOLDER = f"{UNIT_ID}"
 
-# local folders are specified in the config
-ROOT = os.path.expanduser(conf.get('MECS', 'root_folder'))
-ARCHIVE_FOLDER = os.path.join(ROOT, conf.get('MECS', 'archive_folder'))
-AGGREGATED_FOLDER = os.path.join(ROOT, conf.get('MECS', 'aggregated_folder'))
+def get_folders(conf):
+    """local folders are specified in the config"""
+    ROOT = os.path.expanduser(conf.get('MECS', 'root_folder'))
+    ARCHIVE_FOLDER = os.path.join(ROOT, conf.get('MECS', 'archive_folder'))
+    AGGREGATED_FOLDER = os.path.join(ROOT, conf.get('MECS', 'aggregated_folder'))
+    return ROOT, ARCHIVE_FOLDER, AGGREGATED_FOLDER
 
+def get_remote_folder(conf):
+    """
+    on the server we store the data in a folder named for the unit_id
+    It's essential these are unique
+    """
+    UNIT_ID = conf.get('MECS', 'unit_id', fallback="unidentified")
+    return f"{UNIT_ID}"
 
 def get_server(conf):
     try:
@@ -30,16 +37,33 @@ def get_server(conf):
         HOST = conf.get('MECS-SERVER', 'host')
         PORT = conf.get('MECS-SERVER', 'port')
     except NoOptionError as exc:
-        log.warning(f"error in configuration file {args.conf}")
+        log.warning(f"error in configuration file {get_args().conf}")
         log.warning(exc)
         log.warning("required for server upload")
         log.warning("Run mecs-init to set the values")
         log.error("No connection to server!")
         exit(0)
-    return MECSServer(USERNAME, HOST, PORT, DESTINATION_ROOT)
+    MULTIPLEX = conf.getboolean('MECS-SERVER', 'multiplex', fallback=True)
+    return MECSServer(USERNAME, HOST, PORT, DESTINATION_ROOT, multiplex=MULTIPLEX)
+
+def get_scheduler(conf, server, journal, root):
+    """upload limits are given in kB and kB/s in the config file, 0 for no limit"""
+    bandwidth = conf.getfloat('MECS-SERVER', 'bandwidth_limit', fallback=0) * 1000
+    budget = conf.getfloat('MECS-SERVER', 'run_budget', fallback=0) * 1000
+    return UploadScheduler(
+        server, journal, root,
+        bandwidth=bandwidth or None,
+        budget=int(budget) or None,
+        order=conf.get('MECS-SERVER', 'backlog_order', fallback="newest"),
+        backoff=conf.getfloat('MECS-SERVER', 'retry_backoff', fallback=300),
+        max_backoff=conf.getfloat('MECS-SERVER', 'max_backoff', fallback=86400)
+    )
 
 def register():
+    conf = get_config()
     log.debug(f"MECS v{__version__} registering with server")
+    ROOT, ARCHIVE_FOLDER, AGGREGATED_FOLDER = get_folders(conf)
+    REMOTE_FOLDER = get_remote_folder(conf)
     server = get_server(conf)
     server.register()
 
@@ -48,8 +72,23 @@ def register():
     server.create_remote_folder(REMOTE_FOLDER)
 
 def upload():
+    conf = get_config()
     log.debug(f"MECS v{__version__} uploading to server")
-    UNIT_ID = conf.get('MECS', 'unit_id', fallback="unidentified")
-    REMOTE_FOLDER = f"{UNIT_ID}"
+    run_upload(conf)
+
+def run_upload(conf):
+    """shared with mecs-daemon, the day files with new data are built from the aggregation working stores first"""
+    from ..data_management.aggregate import build_days
+    from ..data_management.formats import extensions
+    from .utils import get_aggregated_format
+    ROOT, ARCHIVE_FOLDER, AGGREGATED_FOLDER = get_folders(conf)
+    REMOTE_FOLDER = get_remote_folder(conf)
     server = get_server(conf)
-    server.upload(AGGREGATED_FOLDER, REMOTE_FOLDER, ARCHIVE_FOLDER)
+    with locked(os.path.join(ROOT, DATA_LOCK)):
+        build_days(AGGREGATED_FOLDER, get_aggregated_format(conf))
+        if not conf.getboolean('MECS-SERVER', 'resumable', fallback=True):
+            server.upload(AGGREGATED_FOLDER, REMOTE_FOLDER, ARCHIVE_FOLDER, extensions=extensions)
+            return
+        journal = UploadJournal(os.path.join(ROOT, 'upload_journal.json'))
+        scheduler = get_scheduler(conf, server, journal, ROOT)
+        scheduler.run(AGGREGATED_FOLDER, REMOTE_FOLDER, ARCHIVE_FOLDER, extensions=extensions)
@@ -4,7 +4,7 @@ from datetime import datetime
 from configparser import NoOptionError
 
 from .. import __version__
-from ..config import args, conf
+from ..config import get_args, get_config
 
 from .utils import pretty_print
 
@@ -12,6 +12,7 @@ log = logging.getLogger(__name__)
 
 def status():
     """a simple script to print out some key information"""
+    args, conf = get_args(), get_config()
     UNIT_ID = conf.get('MECS', 'unit_id', fallback="unidentified")
     data = OrderedDict({
         "MECS version": __version__,
@@ -2,7 +2,7 @@ import logging
 import time
 
 from .. import __version__, MECSError
-from ..config import conf
+from ..config import get_config
 
 from .utils import get_board, print_output
 
@@ -11,7 +11,7 @@ log = logging.getLogger(__name__)
 
 def get_readings_function():
     try:
-        board = get_board(conf)
+        board = get_board(get_config())
     except MECSError as exc:
         log.warning("Exiting, could not create MECSBoard")
         log.exception(exc)
@@ -24,12 +24,14 @@ def get_readings_function():
 
 
 def test():
+    conf = get_config()
     log.debug(f"MECS v{__version__} testing data")
     board = get_board(conf)
     print_output(board, clear=False)
 
 
 def test2():
+    conf = get_config()
     log.debug(f"MECS v{__version__} continuously testing data")
     board = get_board(conf)
     try:
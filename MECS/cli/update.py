@@ -5,11 +5,12 @@ import subprocess
 from configparser import NoOptionError
 
 from .. import __version__
-from ..config import conf, args
+from ..config import get_args, get_config
 
 log = logging.getLogger(__name__)
 
 def update():
+    args, conf = get_args(), get_config()
     log.debug(f"MECS v{__version__} updating installation")
     try:
         FULL_INSTALL = conf.getboolean('git', 'install', fallback=False)
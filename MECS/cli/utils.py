@@ -4,8 +4,7 @@ from pathlib import Path
 import json
 from collections import OrderedDict
 
-from .. import MECSError
-from ..data_acquisition.board import MECSBoard
+from .. import MECSError, MECSConfigError
 
 log = logging.getLogger(__name__)
 
@@ -17,10 +16,17 @@ def get_devices_config(conf):
     return devices_config
 
 def get_board(conf):
+    # the hardware drivers are only imported by the commands which need them
+    from ..data_acquisition.board import MECSBoard, DEFAULT_TIMEOUT
     devices_config = get_devices_config(conf)
+    if conf.getboolean('MECS', 'simulate', fallback=False):
+        from ..simulation import Simulator, Faults
+        Simulator(faults=Faults(conf.getfloat('MECS', 'simulated_fault_rate', fallback=0))).install()
     hardware_required = conf.getboolean('MECS', 'hardware_required', fallback=True)
+    concurrent = conf.getboolean('MECS', 'concurrent_read', fallback=False)
+    timeout = conf.getfloat('MECS', 'read_timeout', fallback=DEFAULT_TIMEOUT)
     try:
-        return MECSBoard(hardware_required, **devices_config)
+        return MECSBoard(hardware_required, concurrent, timeout, **devices_config)
     except MECSError as exc:
         log.warning("Exiting, could not create MECSBoard")
         log.exception(exc)
@@ -30,6 +36,27 @@ def get_board(conf):
         log.exception(exc)
         exit(0)
 
+def get_aggregated_format(conf):
+    """The configured aggregated data format, mecz takes its options from the [precision] section"""
+    from ..data_management.formats import get_format
+    from ..data_management import codec
+    name = conf.get('MECS', 'aggregated_format', fallback='json')
+    if name != "mecz":
+        return get_format(name)
+    precision = {}
+    default_precision = codec.DEFAULT_PRECISION
+    if conf.has_section('precision'):
+        precision = dict(conf['precision'])
+        default_precision = precision.pop('default', default_precision)
+    compression = conf.get('MECS', 'compression', fallback='gzip')
+    if compression not in ['gzip', 'zstd']:
+        raise MECSConfigError(f"compression {compression!r} is not supported, try one of [gzip, zstd]")
+    return get_format(name,
+        precision=precision,
+        default_precision=float(default_precision),
+        compression=codec.ZSTD if compression == 'zstd' else codec.GZIP
+    )
+
 def pretty_print(dict, heading=True):
     """
     Utility function for printing data to console
@@ -61,3 +88,5 @@ def print_output(board, clear=False):
     if clear:
         os.system('clear')
     pretty_print(output)
+    for label, metrics in board.metrics().items():
+        print(f"{label}: {', '.join(f'{k}={v}' for k, v in metrics.items())}")
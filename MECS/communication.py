@@ -1,23 +1,108 @@
 """
 Securely registering and communicating with server
+
+Uploads share a single ssh connection (an OpenSSH ControlMaster)
+so the remote folder creation, each file transfer and the verification
+only pay for one TCP and SSH handshake.
+If the master connection can't be established each command connects separately, as before.
+
+With an UploadJournal, files are streamed to a .part file on the server.
+An interrupted transfer is resumed from the end of the .part file (once its hash is checked)
+and the file is only moved into place, and archived locally, when the server's sha256 matches.
+
+The UploadScheduler decides what to send on each run: today's partial data first, then the backlog.
+It can cap the bandwidth used and the bytes sent per run (a file cut short is resumed next run),
+backs off exponentially after failed runs and records the throughput achieved by each run.
 """
 
 import os
+import json
 import logging
 import subprocess
 import glob
+import heapq
+import shlex
 import shutil
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from time import monotonic, sleep
+
+from . import MECSConfigError
+from .journal import sha256
 
 log = logging.getLogger(__name__)
 
 class UploadFailed(Exception): pass
 
 class MECSServer:
-    def __init__(self, username, host, port, data_root):
+    def __init__(self, username, host, port, data_root, multiplex=True, control_folder="~/.ssh"):
         self.username = username
         self.host = host
         self.port = port
         self.data_root = data_root
+        self.multiplex = multiplex
+        self.control_folder = os.path.expanduser(control_folder)
+        self.control_path = None
+
+    @property
+    def target(self):
+        return f"{self.username}@{self.host}"
+
+    def options(self):
+        """options for ssh and scp, including the shared connection if there is one"""
+        options = ["-o", f"Port={self.port}"]
+        if self.control_path:
+            options += ["-o", f"ControlPath={self.control_path}"]
+        return options
+
+    def run(self, args, **kwargs):
+        return subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, **kwargs)
+
+    def ssh(self, command):
+        return self.run(["ssh", *self.options(), self.target, command])
+
+    def send(self, command, chunks):
+        """
+        Stream data to the stdin of a remote command
+        Returns the number of bytes written, raises UploadFailed if the command fails
+        """
+        process = subprocess.Popen(["ssh", "-C", *self.options(), self.target, command], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        sent = 0
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+                sent += len(chunk)
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        _, stderr = process.communicate()
+        if process.returncode:
+            log.error(stderr.decode(errors="replace"))
+            raise UploadFailed(f"transfer failed after {sent} bytes")
+        return sent
+
+    @contextmanager
+    def session(self):
+        """A single ssh connection shared by all the commands run in this context"""
+        if not self.multiplex or self.control_path:
+            yield
+            return
+        os.makedirs(self.control_folder, exist_ok=True)
+        control_path = os.path.join(self.control_folder, f"mecs-{self.username}@{self.host}:{self.port}")
+        result = self.run(["ssh", "-f", "-N", "-o", "ControlMaster=yes", "-o", f"ControlPath={control_path}", "-o", f"Port={self.port}", self.target])
+        if result.returncode:
+            log.warning("Couldn't open a shared ssh connection, connecting for each command instead")
+            log.error(result.stderr)
+            yield
+            return
+        log.debug(f"opened shared ssh connection {control_path}")
+        self.control_path = control_path
+        try:
+            yield
+        finally:
+            self.run(["ssh", "-O", "exit", *self.options(), self.target])
+            self.control_path = None
+            log.debug(f"closed shared ssh connection {control_path}")
 
     def register(self):
         ssh_folder = os.path.expanduser("~/.ssh")
@@ -39,7 +124,7 @@ class MECSServer:
             log.info("registration successful")
 
     def create_remote_folder(self, folder_name):
-        result = subprocess.run(["ssh", f"-p {self.port}", f"{self.username}@{self.host}", f"mkdir -p {self.data_root}/{folder_name}"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        result = self.ssh(f"mkdir -p {self.data_root}/{folder_name}")
         if result.returncode:
             log.warning("A problem occurred when attempting to create a remote folder")
             log.error(result.stderr)
@@ -47,7 +132,7 @@ class MECSServer:
             log.info(f"folder {folder_name} created on server")
 
     def copy_to_server(self, file, destination):
-        result = subprocess.run(["scp", "-C", file, f"{self.username}@{self.host}:{destination}"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        result = self.run(["scp", "-C", *self.options(), file, f"{self.target}:{destination}"])
         if result.returncode:
             log.warning("A problem occurred when attempting to copy a file to server")
             log.error(result.stderr)
@@ -55,21 +140,307 @@ class MECSServer:
         else:
             log.info(f"Copied {file} to {destination} on {self.host}")
 
+    def remote_sizes(self, paths):
+        """The size of each of the given remote files, missing files are omitted"""
+        if not paths:
+            return {}
+        result = self.ssh(f"stat -c '%s %n' {' '.join(paths)}")
+        sizes = {}
+        for line in result.stdout.splitlines():
+            size, _, path = line.partition(" ")
+            if size.isdigit():
+                sizes[path] = int(size)
+        return sizes
 
-    def upload(self, source_folder, destination_folder, archive_folder):
-        """This pushes all the aggregated data up to the server and then archives the data"""
-        self.create_remote_folder(destination_folder)
-        os.makedirs(archive_folder, exist_ok=True)
-        files = sorted(glob.glob(os.path.join(source_folder, "*.json")))
-        if not files:
-            log.info("No files to upload")
+    def remote_part(self, part):
+        """The size and sha256 of a partial upload on the server, or None if there isn't one"""
+        part = shlex.quote(part)
+        result = self.ssh(f"if [ -f {part} ]; then stat -c %s {part}; sha256sum < {part}; fi")
+        lines = result.stdout.split()
+        if result.returncode or len(lines) < 2 or not lines[0].isdigit():
+            return None
+        return int(lines[0]), lines[1]
+
+    def resume_offset(self, file, part, size):
+        """How much of the file is already on the server, checked against the local hash"""
+        remote = self.remote_part(part)
+        if not remote:
+            return 0
+        remote_size, remote_hash = remote
+        if remote_size > size or sha256(file, remote_size) != remote_hash:
+            log.info(f"partial upload {part} doesn't match {file}, starting again")
+            return 0
+        return remote_size
+
+    def resume_to_server(self, file, destination, journal, chunk_size=65536, limit=None, throttle=None):
+        """
+        Send whatever the server doesn't have yet, verify and move into place
+        At most 'limit' bytes are sent, throttle wraps the data stream (e.g. RateLimiter.throttle)
+        Returns the bytes sent and whether the file is complete on the server
+        Raises UploadFailed if the transfer is interrupted or can't be verified
+        """
+        entry = journal.entry(file)
+        part = f"{destination}.part"
+        offset = self.resume_offset(file, part, entry['size'])
+        if offset:
+            log.info(f"resuming {file} from byte {offset} of {entry['size']}")
+        remaining = entry['size'] - offset
+        if limit is not None:
+            remaining = min(remaining, limit)
+
+        def chunks():
+            left = remaining
+            with open(file, "rb") as f:
+                f.seek(offset)
+                while left > 0 and (chunk := f.read(min(chunk_size, left))):
+                    left -= len(chunk)
+                    yield chunk
+        data = throttle(chunks()) if throttle else chunks()
+        redirect = ">>" if offset else ">"
+        sent = self.send(f"cat {redirect} {shlex.quote(part)}", data)
+        if offset + sent < entry['size']:
+            log.info(f"sent {offset + sent} of {entry['size']} bytes of {file}, the rest will be sent next time")
+            return sent, False
+
+        check = f'[ "$(sha256sum < {shlex.quote(part)} | cut -d " " -f 1)" = {entry["sha256"]} ] && mv {shlex.quote(part)} {shlex.quote(destination)}'
+        result = self.ssh(check)
+        if result.returncode:
+            log.warning(f"{destination} on {self.host} failed sha256 verification")
+            raise UploadFailed("verification failed")
+        log.info(f"Sent {sent} bytes of {file} to {destination} on {self.host}, sha256 verified")
+        return sent, True
+
+    def copy_files(self, files, destination_folder):
+        """scp each file, returns the files whose size on the server matches"""
+        copied = {}
         for file in files:
-            path, fname = os.path.split(file)
-            destination_file = os.path.join(self.data_root, destination_folder, fname)
+            destination_file = self.remote_path(destination_folder, file)
             try:
                 self.copy_to_server(file, destination_file)
             except UploadFailed:
                 pass
             else:
-                shutil.move(file, os.path.join(archive_folder, fname))
-                log.info(f"Moved {file} to {archive_folder}")
+                copied[file] = destination_file
+        sizes = self.remote_sizes(list(copied.values()))
+        verified = []
+        for file, destination_file in copied.items():
+            if sizes.get(destination_file) != os.path.getsize(file):
+                log.warning(f"{destination_file} on {self.host} does not match {file}, it will be sent again")
+                continue
+            verified.append(file)
+        return verified
+
+    def resume_files(self, files, destination_folder, journal):
+        """resumable transfer of each file, returns the files which were verified"""
+        verified = []
+        for file in files:
+            try:
+                _, complete = self.resume_to_server(file, self.remote_path(destination_folder, file), journal)
+            except UploadFailed as exc:
+                log.warning(f"A problem occurred when sending {file} to server: {exc}")
+            else:
+                if complete:
+                    verified.append(file)
+        return verified
+
+    def remote_path(self, destination_folder, file):
+        return os.path.join(self.data_root, destination_folder, os.path.basename(file))
+
+    def archive(self, file, archive_folder, journal=None):
+        shutil.move(file, os.path.join(archive_folder, os.path.basename(file)))
+        log.info(f"Moved {file} to {archive_folder}")
+        if journal:
+            journal.remove(file)
+
+    def upload(self, source_folder, destination_folder, archive_folder, extensions=(".json",), journal=None):
+        """
+        This pushes all the aggregated data up to the server and then archives the data
+        With a journal, transfers are resumable and verified by hash
+        """
+        os.makedirs(archive_folder, exist_ok=True)
+        files = sorted(f for ext in extensions for f in glob.glob(os.path.join(source_folder, f"*{ext}")))
+        if not files:
+            log.info("No files to upload")
+            return
+        with self.session():
+            self.create_remote_folder(destination_folder)
+            if journal:
+                verified = self.resume_files(files, destination_folder, journal)
+            else:
+                verified = self.copy_files(files, destination_folder)
+        for file in verified:
+            self.archive(file, archive_folder, journal)
+
+
+def pending_files(source_folder, extensions):
+    return [f for ext in extensions for f in glob.glob(os.path.join(source_folder, f"*{ext}"))]
+
+
+class RateLimiter:
+    """Token bucket limiting the bytes per second passed through throttle()"""
+    def __init__(self, rate, burst=None, clock=monotonic, sleep=sleep):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.last = clock()
+
+    def take(self, n):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= n
+        if self.tokens < 0:
+            self.sleep(-self.tokens / self.rate)
+
+    def throttle(self, chunks):
+        for chunk in chunks:
+            self.take(len(chunk))
+            yield chunk
+
+
+class UploadScheduler:
+    """
+    Decides what each upload run sends, and in which order
+    bandwidth is in bytes per second and budget is bytes per run, None for no limit
+    order is "newest" or "oldest" first for the backlog of past days
+    Today's file is rewritten as it is aggregated, so it is never sent in part:
+    it is sent whole if it fits in what is left of the budget, otherwise it waits for a later run
+    After a failed run, runs are skipped for backoff seconds, doubling up to max_backoff
+    """
+    STATE_FILE = "upload_state.json"
+    RUNS_FILE = "upload_runs.jsonl"
+    orders = ["newest", "oldest"]
+
+    def __init__(self, server, journal, state_folder, bandwidth=None, budget=None, order="newest",
+                 backoff=300, max_backoff=86400, wall_clock=datetime.utcnow, clock=monotonic):
+        if order not in self.orders:
+            raise MECSConfigError(f"backlog_order {order!r} is not supported, try one of [{', '.join(self.orders)}]")
+        self.server = server
+        self.journal = journal
+        self.state_path = os.path.join(state_folder, self.STATE_FILE)
+        self.runs_path = os.path.join(state_folder, self.RUNS_FILE)
+        self.bandwidth = bandwidth
+        self.budget = budget
+        self.order = order
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.wall_clock = wall_clock
+        self.clock = clock
+        self.state = self.load_state()
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {"failures": 0, "next_attempt": None}
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except json.decoder.JSONDecodeError as exc:
+            log.warning(exc)
+            log.warning(f"ignoring corrupted upload state {self.state_path}")
+            return {"failures": 0, "next_attempt": None}
+
+    def save_state(self):
+        with open(f"{self.state_path}.tmp", "w") as f:
+            json.dump(self.state, f)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def queue(self, files, today):
+        """
+        A priority queue of files, today's data first then the backlog in the configured order
+        Files are named for the day they contain, e.g. 20221025.json
+        """
+        heap = []
+        for file in files:
+            day = self.day(file)
+            if not day.isdigit():
+                priority = (2, 0)
+            elif day >= today:
+                priority = (0, 0)
+            else:
+                priority = (1, -int(day) if self.order == "newest" else int(day))
+            heapq.heappush(heap, (priority, file))
+        while heap:
+            yield heapq.heappop(heap)[1]
+
+    @staticmethod
+    def day(file):
+        return os.path.splitext(os.path.basename(file))[0]
+
+    def still_changing(self, file, today):
+        """Today's file (or a later one) is still being aggregated"""
+        day = self.day(file)
+        return day.isdigit() and day >= today
+
+    def backing_off(self, now):
+        next_attempt = self.state.get("next_attempt")
+        return next_attempt is not None and now < datetime.fromisoformat(next_attempt)
+
+    def record(self, now, failed):
+        if failed:
+            self.state["failures"] = self.state.get("failures", 0) + 1
+            delay = min(self.backoff * 2 ** (self.state["failures"] - 1), self.max_backoff)
+            self.state["next_attempt"] = (now + timedelta(seconds=delay)).isoformat()
+            log.warning(f"upload failed {self.state['failures']} times in a row, next attempt after {self.state['next_attempt']}")
+        else:
+            self.state = {"failures": 0, "next_attempt": None}
+        self.save_state()
+
+    def log_run(self, run):
+        with open(self.runs_path, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        log.info(f"uploaded {run['bytes']} bytes in {run['duration']:.1f}s ({run['rate']:.0f} B/s), {run['files']} files completed")
+
+    def run(self, source_folder, destination_folder, archive_folder, extensions=(".json",)):
+        """One upload run, returns the record of the run or None if nothing was attempted"""
+        now = self.wall_clock()
+        if self.backing_off(now):
+            log.info(f"backing off after failed uploads until {self.state['next_attempt']}")
+            return
+        files = pending_files(source_folder, extensions)
+        if not files:
+            log.info("No files to upload")
+            return
+        os.makedirs(archive_folder, exist_ok=True)
+        limiter = RateLimiter(self.bandwidth) if self.bandwidth else None
+        chunk_size = min(65536, int(self.bandwidth)) if self.bandwidth else 65536
+        sent, completed, failed = 0, 0, False
+        start = self.clock()
+        today = now.strftime("%Y%m%d")
+        with self.server.session():
+            self.server.create_remote_folder(destination_folder)
+            for file in self.queue(files, today):
+                limit = None if self.budget is None else self.budget - sent
+                if limit is not None and limit <= 0:
+                    log.info(f"upload budget of {self.budget} bytes used, the remaining files will be sent next time")
+                    break
+                if self.still_changing(file, today) and limit is not None:
+                    if os.path.getsize(file) > limit:
+                        log.info(f"{file} is still being aggregated and doesn't fit in the upload budget left, it will be sent next time")
+                        continue
+                    limit = None
+                try:
+                    n, complete = self.server.resume_to_server(
+                        file, self.server.remote_path(destination_folder, file), self.journal,
+                        chunk_size=chunk_size, limit=limit, throttle=limiter.throttle if limiter else None)
+                except UploadFailed as exc:
+                    log.warning(f"A problem occurred when sending {file} to server: {exc}")
+                    failed = True
+                    break
+                sent += n
+                if complete:
+                    self.server.archive(file, archive_folder, self.journal)
+                    completed += 1
+        duration = self.clock() - start
+        run = {
+            "start": now.isoformat(),
+            "duration": duration,
+            "bytes": sent,
+            "rate": sent / duration if duration > 0 else 0.0,
+            "files": completed,
+            "failed": failed
+        }
+        self.log_run(run)
+        self.record(now, failed)
+        return run
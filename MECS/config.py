@@ -1,11 +1,14 @@
 """
 MECS configuration handling
+Nothing is parsed on import, command line arguments and the configuration file
+are read on the first call to get_args() or get_config()
 """
 
 import os.path
 import logging.config
 import argparse
 from configparser import ConfigParser
+from functools import lru_cache
 
 def load_config(path):
     """load configuration from file"""
@@ -28,5 +31,19 @@ def save_config(path, conf):
 # The parser accepts an optional configuration file argument
 parser = argparse.ArgumentParser(epilog="For more information see https://github.com/IESD/MECS", description='MECS monitoring system command-line tools')
 parser.add_argument('-c', '--conf', default=os.path.expanduser("/home/pi/MECS.ini"), help='configuration file (default ~/.MECS/MECS.ini)')
-args = parser.parse_args()
-conf = load_config(args.conf)
+
+@lru_cache(maxsize=None)
+def get_args():
+    return parser.parse_args()
+
+@lru_cache(maxsize=None)
+def get_config():
+    return load_config(get_args().conf)
+
+def __getattr__(name):
+    """'from MECS.config import conf' still works, loading the configuration when it is first imported"""
+    if name == "args":
+        return get_args()
+    if name == "conf":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,209 @@
+"""
+mecs-daemon, a single long-running process replacing mecs-generate and the hourly cron jobs
+
+Acquisition runs in the main thread, exactly as in mecs-generate.
+Other jobs (aggregation and upload) are Tasks, run one at a time in a worker thread on a fixed period
+aligned to the clock (e.g. on the hour, or five minutes past).
+Each minutely record is handed to the tasks through on_record, so the aggregator can use a RecordFeed
+rather than re-reading the day's segment file.
+
+A unix socket accepts one-line commands (status, run <task>, stop) and replies with a line of json.
+SIGINT and SIGTERM, or the stop command, end acquisition at the next reading,
+the task in progress is given a little time to finish.
+"""
+
+import os
+import json
+import time
+import logging
+import socket
+import socketserver
+import threading
+
+from .locking import locked, DAEMON_LOCK
+from .data_management.minutely import GracefulKiller
+from .data_management.generate import generate
+
+log = logging.getLogger(__name__)
+
+
+class Task:
+    """A job run every 'period' seconds, 'offset' seconds after each multiple of the period"""
+    def __init__(self, name, function, period, offset=0, clock=time.time):
+        self.name = name
+        self.function = function
+        self.period = period
+        self.offset = offset
+        self.clock = clock
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None
+        self.last_duration = None
+        self.last_error = None
+        self.next_run = self.schedule(clock())
+
+    def schedule(self, now):
+        """The first run time after now"""
+        next_run = (now - self.offset) // self.period * self.period + self.offset
+        while next_run <= now:
+            next_run += self.period
+        return next_run
+
+    def due(self, now):
+        return now >= self.next_run
+
+    def run(self):
+        start = self.clock()
+        log.info(f"running {self.name}")
+        try:
+            self.function()
+        except (Exception, SystemExit) as exc:
+            log.exception(exc)
+            self.failures += 1
+            self.last_error = repr(exc)
+        else:
+            self.last_error = None
+        finally:
+            end = self.clock()
+            self.runs += 1
+            self.last_run = start
+            self.last_duration = end - start
+            self.next_run = self.schedule(end)
+            log.info(f"{self.name} took {self.last_duration:.1f}s, next run at {time.ctime(self.next_run)}")
+
+    def status(self):
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+            "last_error": self.last_error,
+            "next_run": self.next_run
+        }
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        command = self.rfile.readline().decode(errors="replace").split()
+        response = self.server.supervisor.command(command)
+        self.wfile.write((json.dumps(response, default=str) + "\n").encode())
+
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, supervisor):
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, ControlHandler)
+        self.supervisor = supervisor
+
+
+class Supervisor:
+    """
+    Runs acquisition and the given tasks in one process
+    Only one supervisor can run for a given lock folder
+    """
+    def __init__(self, tasks, lock_folder, socket_path=None, feed=None, killer=None, clock=time.time):
+        self.tasks = {task.name: task for task in tasks}
+        self.lock_path = os.path.join(lock_folder, DAEMON_LOCK)
+        self.socket_path = socket_path
+        self.feed = feed
+        self.killer = killer or GracefulKiller()
+        self.clock = clock
+        self.wake = threading.Event()
+        self.requested = set()
+        self.started = None
+        self.records = 0
+        self.last_record = None
+
+    def on_record(self, data, position):
+        """Called by the generator with each minutely record and where the store wrote it"""
+        self.records += 1
+        self.last_record = data['dt']
+        if self.feed is not None and position:
+            self.feed.add(data, *position)
+
+    def request(self, name):
+        self.requested.add(name)
+        self.wake.set()
+
+    def stop(self):
+        self.killer.kill_now = True
+        self.wake.set()
+
+    def run_due_tasks(self):
+        now = self.clock()
+        for name, task in self.tasks.items():
+            if self.killer.kill_now:
+                return
+            if task.due(now) or name in self.requested:
+                self.requested.discard(name)
+                task.run()
+
+    def work(self):
+        """The worker thread, runs tasks as they become due until the daemon is stopped"""
+        while not self.killer.kill_now:
+            self.run_due_tasks()
+            self.wake.wait(1)
+            self.wake.clear()
+
+    def status(self):
+        return {
+            "pid": os.getpid(),
+            "started": self.started,
+            "records": self.records,
+            "last_record": self.last_record,
+            "tasks": {name: task.status() for name, task in self.tasks.items()}
+        }
+
+    def command(self, args):
+        if args == ["status"]:
+            return self.status()
+        if len(args) == 2 and args[0] == "run":
+            if args[1] not in self.tasks:
+                return {"error": f"unknown task {args[1]!r}, try one of [{', '.join(self.tasks)}]"}
+            self.request(args[1])
+            return {"requested": args[1]}
+        if args == ["stop"]:
+            log.info("stop requested through the control socket")
+            self.stop()
+            return {"stopping": True}
+        return {"error": f"unknown command {' '.join(args)!r}, try status, run <task> or stop"}
+
+    def run(self, output_folder, get_data, join_timeout=30, **kwargs):
+        """
+        Run until stopped, kwargs are passed on to MECS.data_management.generate.generate
+        Raises LockBusy if another daemon is already running
+        """
+        with locked(self.lock_path, wait=False):
+            self.started = self.clock()
+            server = None
+            if self.socket_path:
+                server = ControlServer(self.socket_path, self)
+                threading.Thread(target=server.serve_forever, name="control", daemon=True).start()
+                log.info(f"listening for commands on {self.socket_path}")
+            worker = threading.Thread(target=self.work, name="tasks", daemon=True)
+            worker.start()
+            try:
+                generate(output_folder, get_data, killer=self.killer, on_record=self.on_record, **kwargs)
+            finally:
+                self.stop()
+                worker.join(join_timeout)
+                if worker.is_alive():
+                    log.warning(f"a task was still running after {join_timeout}s, exiting anyway")
+                if server:
+                    server.shutdown()
+                    server.server_close()
+                    os.remove(self.socket_path)
+                log.info("daemon stopped")
+
+
+def send_command(socket_path, *args, timeout=10):
+    """Send a command to a running daemon, returns the decoded response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(socket_path)
+        s.sendall((" ".join(args) + "\n").encode())
+        with s.makefile("rb") as f:
+            return json.loads(f.readline())
@@ -6,9 +6,65 @@ ABElectronics ADC Pi V2 8-Channel ADC
 Version 1.0 Created 29/02/2015
 Requires python 3 smbus to be installed
 
+read_raw_array and read_voltage_array read a block of samples
+from one channel, or round-robin from several, and decode them with numpy
+
+Rather than polling the ready bit continuously, reads sleep until the conversion
+is expected to be complete (from the sample rate for the bit rate) and then poll
+a few times, raising ConversionTimeout if the result never arrives.
+Block reads keep both chips converting, one is read while the other converts.
+
+Config bytes are looked up from CONFIG_BYTES and only written when they change,
+polls and writes count the i2c transactions made.
 ================================================
 """
 
+import time
+from collections import deque
+
+import numpy as np
+
+# for each bit rate, the mask applied to the first data byte
+# and the index of the byte holding the ready bit
+BIT_RATES = {
+    18: (0b00000011, 3),
+    16: (0b11111111, 2),
+    14: (0b00111111, 2),
+    12: (0b00001111, 2),
+}
+
+# samples per second at each bit rate
+SAMPLE_RATES = {
+    18: 3.75,
+    16: 15,
+    14: 60,
+    12: 240,
+}
+
+# configuration register fields, see the MCP3424 datasheet
+RATE_BITS = {12: 0b00, 14: 0b01, 16: 0b10, 18: 0b11}
+PGA_BITS = {1: 0b00, 2: 0b01, 4: 0b10, 8: 0b11}
+
+# volts per code at each bit rate, and the scaling for each gain
+LSB = {
+    12: 0.0005,
+    14: 0.000125,
+    16: 0.00003125,
+    18: 0.0000078125,
+}
+PGA_SCALE = {1: 0.5, 2: 1, 4: 2, 8: 4}
+
+# the config byte for every (channel on the chip (1 to 4), bit rate, gain, conversion mode)
+# ready bit set, channel in bits 5-6, mode in bit 4, bit rate in bits 2-3, gain in bits 0-1
+CONFIG_BYTES = {
+    (channel, rate, gain, mode): 0x80 | (channel - 1) << 5 | mode << 4 | RATE_BITS[rate] << 2 | PGA_BITS[gain]
+    for channel in range(1, 5)
+    for rate in RATE_BITS
+    for gain in PGA_BITS
+    for mode in (0, 1)
+}
+
+class ConversionTimeout(TimeoutError): pass
 
 class ADCPi:
     # internal variables
@@ -21,6 +77,7 @@ class ADCPi:
     __currentchannel2 = 1  # channel variable for adc2
     __bitrate = 18  # current bitrate
     __conversionmode = 1 # Conversion Mode
+    __gain = 1  # current pga gain
     __pga = float(0.5)  # current pga setting
     __lsb = float(0.0000078125)  # default lsb value for 18 bit
 
@@ -57,53 +114,48 @@ class ADCPi:
             val = val - (1 << bits)
         return val
 
+    def __config_for(self, channel):
+        # internal method for looking up the config byte for a channel (1 to 8)
+        # with the current bit rate, gain and conversion mode
+        return CONFIG_BYTES[((channel - 1) % 4 + 1, self.__bitrate, self.__gain, self.__conversionmode)]
+
     def __setchannel(self, channel):
         # internal method for updating the config to the selected channel
         if channel < 5:
-            if channel != self.__currentchannel1:
-                if channel == 1:
-                    self.__config1 = self.__updatebyte(self.__config1, 5, 0)
-                    self.__config1 = self.__updatebyte(self.__config1, 6, 0)
-                    self.__currentchannel1 = 1
-                if channel == 2:
-                    self.__config1 = self.__updatebyte(self.__config1, 5, 1)
-                    self.__config1 = self.__updatebyte(self.__config1, 6, 0)
-                    self.__currentchannel1 = 2
-                if channel == 3:
-                    self.__config1 = self.__updatebyte(self.__config1, 5, 0)
-                    self.__config1 = self.__updatebyte(self.__config1, 6, 1)
-                    self.__currentchannel1 = 3
-                if channel == 4:
-                    self.__config1 = self.__updatebyte(self.__config1, 5, 1)
-                    self.__config1 = self.__updatebyte(self.__config1, 6, 1)
-                    self.__currentchannel1 = 4
+            self.__config1 = self.__config_for(channel)
+            self.__currentchannel1 = channel
         else:
-            if channel != self.__currentchannel2:
-                if channel == 5:
-                    self.__config2 = self.__updatebyte(self.__config2, 5, 0)
-                    self.__config2 = self.__updatebyte(self.__config2, 6, 0)
-                    self.__currentchannel2 = 5
-                if channel == 6:
-                    self.__config2 = self.__updatebyte(self.__config2, 5, 1)
-                    self.__config2 = self.__updatebyte(self.__config2, 6, 0)
-                    self.__currentchannel2 = 6
-                if channel == 7:
-                    self.__config2 = self.__updatebyte(self.__config2, 5, 0)
-                    self.__config2 = self.__updatebyte(self.__config2, 6, 1)
-                    self.__currentchannel2 = 7
-                if channel == 8:
-                    self.__config2 = self.__updatebyte(self.__config2, 5, 1)
-                    self.__config2 = self.__updatebyte(self.__config2, 6, 1)
-                    self.__currentchannel2 = 8
-        return
+            self.__config2 = self.__config_for(channel)
+            self.__currentchannel2 = channel
+
+    def __write(self, address, config):
+        # internal method for writing a config byte, counted in writes
+        self._bus.write_byte(address, config)
+        self.writes += 1
 
     # init object with i2caddress, default is 0x68, 0x69 for ADCoPi board
-    def __init__(self, bus, address=0x68, address2=0x69, rate=18):
+    # a conversion which isn't ready after 'timeout' conversion times raises ConversionTimeout
+    def __init__(self, bus, address=0x68, address2=0x69, rate=18, timeout=3, sleep=time.sleep, clock=time.monotonic):
         self._bus = bus
         self.__address = address
         self.__address2 = address2
+        self.__timeout = timeout
+        self.__sleep = sleep
+        self.__clock = clock
+        self.__written = {}  # the config last written to each chip
+        self.__ready_at = {}  # when each chip's conversion should be complete
+        self.polls = 0  # i2c reads made, including those which weren't ready
+        self.writes = 0  # i2c config writes
         self.set_bit_rate(rate)
 
+    @property
+    def transactions(self):
+        """i2c transactions (reads and writes) made so far"""
+        return self.polls + self.writes
+
+    def conversion_time(self):
+        return 1 / SAMPLE_RATES[self.__bitrate]
+
     def read_voltage(self, channel):
         # returns the voltage from the selected adc channel - channels 1 to
         # 8
@@ -120,7 +172,6 @@ class ADCPi:
         h = 0
         l = 0
         m = 0
-        s = 0
 
         # get the config and i2c address for the selected channel
         self.__setchannel(channel)
@@ -131,26 +182,12 @@ class ADCPi:
             config = self.__config2
             address = self.__address2
             
-        # if the conversion mode is set to one-shot update the ready bit to 1
-        if (self.__conversionmode == 0):
-                config = self.__updatebyte(config, 7, 1)
-                self._bus.write_byte(address, config)
-                config = self.__updatebyte(config, 7, 0)
-        # keep reading the adc data until the conversion result is ready
-        while True:
-            
-            __adcreading = self._bus.read_i2c_block_data(address, config, 4)
-            if self.__bitrate == 18:
-                h = __adcreading[0]
-                m = __adcreading[1]
-                l = __adcreading[2]
-                s = __adcreading[3]
-            else:
-                h = __adcreading[0]
-                m = __adcreading[1]
-                s = __adcreading[2]
-            if self.__checkbit(s, 7) == 0:
-                break
+        # start a conversion if needed and wait for the result
+        self.__start(address, config)
+        __adcreading = self.__collect(address, config, BIT_RATES[self.__bitrate][1])
+        h = __adcreading[0]
+        m = __adcreading[1]
+        l = __adcreading[2]
 
         self.__signbit = False
         t = 0.0
@@ -181,6 +218,114 @@ class ADCPi:
 
         return t
 
+    def __start(self, address, config):
+        # start a conversion on a chip
+        # in continuous mode a chip already converting the right channel is left alone
+        settings = config & 0x7F
+        if (self.__conversionmode == 0):
+            self.__write(address, config | 0x80)
+        elif self.__written.get(address) != settings:
+            self.__write(address, settings)
+        else:
+            return
+        self.__written[address] = settings
+        self.__ready_at[address] = self.__clock() + self.conversion_time()
+
+    def __collect(self, address, config, status):
+        # sleep until the conversion should be complete then poll for the result
+        # the ready bit is cleared in the command byte so that polling doesn't start another one-shot conversion
+        settings = config & 0x7F
+        period = self.conversion_time()
+        poll_interval = max(period / 10, 0.0005)
+        expected = self.__ready_at.get(address, self.__clock())
+        delay = expected - self.__clock()
+        if delay > 0:
+            self.__sleep(delay)
+        completed = expected
+        deadline = max(expected, self.__clock()) + self.__timeout * period
+        while True:
+            block = self._bus.read_i2c_block_data(address, settings, 4)
+            self.polls += 1
+            now = self.__clock()
+            if not block[status] & 0x80:
+                break
+            if now > deadline:
+                raise ConversionTimeout(f"no conversion from adc 0x{address:02x} after {self.__timeout} conversion times")
+            completed = now
+            self.__sleep(poll_interval)
+        # the read writes the config, in continuous mode the chip carries on converting
+        self.__written[address] = settings
+        self.__ready_at[address] = max(completed, now - period) + period
+        return block
+
+    def decode(self, blocks):
+        """
+        signed raw codes from an array of 4-byte blocks read from the adc
+        (i.e. the last axis of blocks has length 4), at the current bit rate
+        """
+        blocks = np.asarray(blocks, dtype=np.int32)
+        mask, status = BIT_RATES[self.__bitrate]
+        if self.__bitrate == 18:
+            codes = ((blocks[..., 0] & mask) << 16) | (blocks[..., 1] << 8) | blocks[..., 2]
+        else:
+            codes = ((blocks[..., 0] & mask) << 8) | blocks[..., 1]
+        sign = 1 << (self.__bitrate - 1)
+        return np.where(codes & sign, codes - (sign << 1), codes)
+
+    def read_raw_array(self, channels, samples):
+        """
+        read 'samples' conversions from a channel (1 to 8)
+        or from a list of channels in turn
+        The config for each channel is calculated once for the whole block
+        returns an array of signed codes, shaped (samples,) for a single channel
+        or (samples, len(channels)) for a list
+        """
+        single = np.isscalar(channels)
+        channels = [channels] if single else list(channels)
+        targets = [
+            (self.__address if channel < 5 else self.__address2, self.__config_for(channel))
+            for channel in channels
+        ]
+        _, status = BIT_RATES[self.__bitrate]
+        blocks = np.empty((samples, len(targets), 4), dtype=np.uint8)
+        # each chip works through its own queue, so one converts while the other is read
+        queues = {}
+        for i in range(samples):
+            for j, (address, config) in enumerate(targets):
+                queues.setdefault(address, deque()).append((i, j, config))
+        for address, queue in queues.items():
+            self.__start(address, queue[0][2])
+        while queues:
+            address = min(queues, key=lambda a: self.__ready_at.get(a, 0))
+            queue = queues[address]
+            i, j, config = queue.popleft()
+            blocks[i, j] = self.__collect(address, config, status)
+            if queue:
+                self.__start(address, queue[0][2])
+            else:
+                del queues[address]
+        codes = self.decode(blocks)
+        return codes[:, 0] if single else codes
+
+    def read_voltage_array(self, channels, samples):
+        """
+        as read_voltage, for a block of samples (see read_raw_array)
+        negative readings are returned as zero
+        """
+        codes = self.read_raw_array(channels, samples)
+        return np.where(codes < 0, 0.0, codes * (self.__lsb / self.__pga) * 2.471)
+
+    def __configure(self):
+        # internal method for updating both configs after a change of settings
+        # only chips whose config has changed are written to
+        self.__config1 = self.__config_for(self.__currentchannel1)
+        self.__config2 = self.__config_for(self.__currentchannel2)
+        for address, config in ((self.__address, self.__config1), (self.__address2, self.__config2)):
+            if self.__written.get(address) != config & 0x7F:
+                self.__write(address, config)
+                self.__written[address] = config & 0x7F
+                self.__ready_at[address] = self.__clock() + self.conversion_time()
+
     def set_pga(self, gain):
         """
         PGA gain selection
@@ -189,35 +334,10 @@ class ADCPi:
         4 = 4x
         8 = 8x
         """
-
-        if gain == 1:
-            self.__config1 = self.__updatebyte(self.__config1, 0, 0)
-            self.__config1 = self.__updatebyte(self.__config1, 1, 0)
-            self.__config2 = self.__updatebyte(self.__config2, 0, 0)
-            self.__config2 = self.__updatebyte(self.__config2, 1, 0)
-            self.__pga = 0.5
-        if gain == 2:
-            self.__config1 = self.__updatebyte(self.__config1, 0, 1)
-            self.__config1 = self.__updatebyte(self.__config1, 1, 0)
-            self.__config2 = self.__updatebyte(self.__config2, 0, 1)
-            self.__config2 = self.__updatebyte(self.__config2, 1, 0)
-            self.__pga = 1
-        if gain == 4:
-            self.__config1 = self.__updatebyte(self.__config1, 0, 0)
-            self.__config1 = self.__updatebyte(self.__config1, 1, 1)
-            self.__config2 = self.__updatebyte(self.__config2, 0, 0)
-            self.__config2 = self.__updatebyte(self.__config2, 1, 1)
-            self.__pga = 2
-        if gain == 8:
-            self.__config1 = self.__updatebyte(self.__config1, 0, 1)
-            self.__config1 = self.__updatebyte(self.__config1, 1, 1)
-            self.__config2 = self.__updatebyte(self.__config2, 0, 1)
-            self.__config2 = self.__updatebyte(self.__config2, 1, 1)
-            self.__pga = 4
-
-        self._bus.write_byte(self.__address, self.__config1)
-        self._bus.write_byte(self.__address2, self.__config2)
-        return
+        if gain in PGA_BITS:
+            self.__gain = gain
+            self.__pga = PGA_SCALE[gain]
+        self.__configure()
 
     def set_bit_rate(self, rate):
         """
@@ -227,54 +347,19 @@ class ADCPi:
         16 = 16 bit (15SPS max)
         18 = 18 bit (3.75SPS max)
         """
+        if rate in RATE_BITS:
+            self.__bitrate = rate
+            self.__lsb = LSB[rate]
+        self.__configure()
 
-        if rate == 12:
-            self.__config1 = self.__updatebyte(self.__config1, 2, 0)
-            self.__config1 = self.__updatebyte(self.__config1, 3, 0)
-            self.__config2 = self.__updatebyte(self.__config2, 2, 0)
-            self.__config2 = self.__updatebyte(self.__config2, 3, 0)
-            self.__bitrate = 12
-            self.__lsb = 0.0005
-        if rate == 14:
-            self.__config1 = self.__updatebyte(self.__config1, 2, 1)
-            self.__config1 = self.__updatebyte(self.__config1, 3, 0)
-            self.__config2 = self.__updatebyte(self.__config2, 2, 1)
-            self.__config2 = self.__updatebyte(self.__config2, 3, 0)
-            self.__bitrate = 14
-            self.__lsb = 0.000125
-        if rate == 16:
-            self.__config1 = self.__updatebyte(self.__config1, 2, 0)
-            self.__config1 = self.__updatebyte(self.__config1, 3, 1)
-            self.__config2 = self.__updatebyte(self.__config2, 2, 0)
-            self.__config2 = self.__updatebyte(self.__config2, 3, 1)
-            self.__bitrate = 16
-            self.__lsb = 0.00003125
-        if rate == 18:
-            self.__config1 = self.__updatebyte(self.__config1, 2, 1)
-            self.__config1 = self.__updatebyte(self.__config1, 3, 1)
-            self.__config2 = self.__updatebyte(self.__config2, 2, 1)
-            self.__config2 = self.__updatebyte(self.__config2, 3, 1)
-            self.__bitrate = 18
-            self.__lsb = 0.0000078125
-
-        self._bus.write_byte(self.__address, self.__config1)
-        self._bus.write_byte(self.__address2, self.__config2)
-        return
-    
     def set_conversion_mode(self, mode):
         """
         conversion mode for adc
         0 = One shot conversion mode
         1 = Continuous conversion mode
+        The config is written with the next conversion
         """
-        if (mode == 0):
-            self.__config1 = self.__updatebyte(self.__config1, 4, 0)
-            self.__config2 = self.__updatebyte(self.__config2, 4, 0)
-            self.__conversionmode = 0
-        if (mode == 1):
-            self.__config1 = self.__updatebyte(self.__config1, 4, 1)
-            self.__config2 = self.__updatebyte(self.__config2, 4, 1)
-            self.__conversionmode = 1
-        #self._bus.write_byte(self.__address, self.__config1)
-        #self._bus.write_byte(self.__address2, self.__config2)    
-        return
\ No newline at end of file
+        if mode in (0, 1):
+            self.__conversionmode = mode
+        self.__config1 = self.__config_for(self.__currentchannel1)
+        self.__config2 = self.__config_for(self.__currentchannel2)
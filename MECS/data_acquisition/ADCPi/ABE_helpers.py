@@ -19,7 +19,7 @@ https://www.abelectronics.co.uk/i2c-raspbian-wheezy/info.aspx
 
 class ABEHelpers:
     
-    def get_smbus(self):
+    def get_bus_number(self):
         # detect i2C port number and assign to i2c_bus
         i2c_bus = 0
         for line in open('/proc/cpuinfo').readlines():
@@ -32,8 +32,11 @@ class ABEHelpers:
                     else:
                         i2c_bus = 1
                     break
+        return i2c_bus
+
+    def get_smbus(self):
         try:        
-            return smbus.SMBus(i2c_bus)
+            return smbus.SMBus(self.get_bus_number())
         except IOError:
                 print ("Could not open the i2c bus.")
                 print ("Please check that i2c is enabled and python-smbus and i2c-tools are installed.")
@@ -1,4 +1,4 @@
 # __init__.py
-from .ABE_ADCPi import ADCPi
+from .ABE_ADCPi import ADCPi, ConversionTimeout
 from .ABE_helpers import ABEHelpers
 
@@ -8,6 +8,7 @@
 #encoding: utf-8
 
 import smbus
+from contextlib import nullcontext
 
 # constants
 
@@ -61,6 +62,12 @@ INA3221_REG_BUSVOLTAGE_1     =             (0x02)
 
 SHUNT_RESISTOR_VALUE         = (0.1)   # default shunt resistor value of 0.1 Ohm
 
+# samples averaged by the chip (table 3) and the codes for the AVG bits
+INA3221_AVERAGING = {1: 0, 4: 1, 16: 2, 64: 3, 128: 4, 256: 5, 512: 6, 1024: 7}
+# conversion times in microseconds (tables 4 and 5) and the codes for the CT bits
+INA3221_CONVERSION_TIMES = {140: 0, 204: 1, 332: 2, 588: 3, 1100: 4, 2116: 5, 4156: 6, 8244: 7}
+INA3221_CONFIG_ENABLE_CHAN = {1: INA3221_CONFIG_ENABLE_CHAN1, 2: INA3221_CONFIG_ENABLE_CHAN2, 3: INA3221_CONFIG_ENABLE_CHAN3}
+
 
 
 class SDL_Pi_INA3221():
@@ -70,21 +77,20 @@ class SDL_Pi_INA3221():
     ###########################
     # INA3221 Code
     ###########################
-    def __init__(self, twi=1, addr=INA3221_ADDRESS, shunt_resistor = SHUNT_RESISTOR_VALUE  ):
-        self._bus = smbus.SMBus(twi)
+    def __init__(self, twi=1, addr=INA3221_ADDRESS, shunt_resistor = SHUNT_RESISTOR_VALUE,
+                 averaging=16, bus_conversion_time=1100, shunt_conversion_time=1100, channels=(1, 2, 3), bus=None):
+        # each result is the average of 'averaging' conversions, each taking the given time in microseconds
+        # only the given channels are enabled, so the chip doesn't spend time converting the others
+        self._bus = bus if bus is not None else smbus.SMBus(twi)
         self._addr = addr
-        config = INA3221_CONFIG_ENABLE_CHAN1 |    \
-                    INA3221_CONFIG_ENABLE_CHAN2 |  \
-                    INA3221_CONFIG_ENABLE_CHAN3 |  \
-                    INA3221_CONFIG_AVG1 |    \
-                    INA3221_CONFIG_VBUS_CT2 |    \
-                    INA3221_CONFIG_VSH_CT2 |    \
-                    INA3221_CONFIG_MODE_2 |    \
+        config = INA3221_CONFIG_MODE_2 |    \
                     INA3221_CONFIG_MODE_1 |    \
                     INA3221_CONFIG_MODE_0
-
-
-
+        for channel in channels:
+            config |= INA3221_CONFIG_ENABLE_CHAN[channel]
+        config |= INA3221_AVERAGING[averaging] << 9
+        config |= INA3221_CONVERSION_TIMES[bus_conversion_time] << 6
+        config |= INA3221_CONVERSION_TIMES[shunt_conversion_time] << 3
 
         self._write_register_little_endian(INA3221_REG_CONFIG, config)
 
@@ -159,3 +165,15 @@ class SDL_Pi_INA3221():
 
         valueDec = self.getShuntVoltage_mV(channel)/ SHUNT_RESISTOR_VALUE
         return valueDec;
+
+
+    def snapshot(self, shunt_channels=(), bus_channels=()):
+    # Reads each requested register once, back to back
+    # The register pointer doesn't auto-increment so each register is a separate word read
+    # returns the shunt voltages in mV and the bus voltages in V, as dicts keyed by channel
+    # on a shared bus (see buses) the bus is held for all the reads, so no other device's transfers come between them
+
+        with getattr(self._bus, "batch", nullcontext)():
+            shunt = {channel: self._getShuntVoltage_raw(channel) * 0.005 for channel in shunt_channels}
+            bus = {channel: self._getBusVoltage_raw(channel) * 0.001 for channel in bus_channels}
+        return shunt, bus
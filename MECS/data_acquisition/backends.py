@@ -0,0 +1,92 @@
+"""
+The hardware interfaces used by the device drivers
+These are the real thing unless a simulator has been installed (see MECS.simulation)
+The hardware libraries are only imported when they are first needed
+Devices share one ManagedBus for each bus (see buses), from get_i2c_bus or get_managed_bus
+"""
+import threading
+
+from .buses import ManagedBus
+
+simulator = None
+managed = {}  # the ManagedBus for each bus in use, by name
+managed_lock = threading.Lock()
+default_bus_number = None
+
+
+def install(sim):
+    """Use simulated hardware for every device created from now on"""
+    global simulator
+    simulator = sim
+    managed.clear()
+
+def uninstall():
+    global simulator
+    simulator = None
+    managed.clear()
+
+def get_smbus(number=None):
+    """
+    The smbus for an i2c bus, by default the pi's own bus (see ABEHelpers)
+    The default bus is None if it can't be opened, a numbered bus raises OSError
+    """
+    if simulator:
+        return simulator.smbus(number)
+    if number is None:
+        from .ADCPi import ABEHelpers
+        return ABEHelpers().get_smbus()
+    import smbus
+    return smbus.SMBus(number)
+
+def get_default_bus_number():
+    """The number of the pi's own i2c bus, found once (see ABEHelpers)"""
+    global default_bus_number
+    if simulator:
+        return 1
+    if default_bus_number is None:
+        from .ADCPi import ABEHelpers
+        default_bus_number = ABEHelpers().get_bus_number()
+    return default_bus_number
+
+def get_i2c_bus(number=None):
+    """
+    The ManagedBus for an i2c bus, shared by every device on it, by default the pi's own bus
+    As get_smbus, the default bus is None if it can't be opened, a numbered bus raises OSError
+    """
+    name = f"i2c-{get_default_bus_number() if number is None else number}"
+    with managed_lock:
+        if name not in managed:
+            handle = get_smbus(number)
+            if handle is None:
+                return None
+            managed[name] = ManagedBus(name, handle)
+        return managed[name]
+
+def get_managed_bus(name, handle):
+    """The ManagedBus for a bus which the device opened itself (e.g. bit-banged i2c on a pigpio connection)"""
+    with managed_lock:
+        if name not in managed or managed[name].handle is not handle:
+            managed[name] = ManagedBus(name, handle)
+        return managed[name]
+
+def get_pigpio():
+    """A connection to the pigpio daemon"""
+    if simulator:
+        return simulator.pigpio()
+    import pigpio
+    return pigpio.pi()
+
+def open_serial(port, baudrate, **kwargs):
+    """An open serial port, raises SerialException if it can't be opened"""
+    if simulator:
+        return simulator.serial(port, baudrate, **kwargs)
+    from serial import Serial
+    return Serial(port, baudrate, **kwargs)
+
+def get_w1_sensors():
+    """Every one-wire temperature sensor on the bus, raises KernelModuleLoadError if the bus isn't available"""
+    if simulator:
+        return simulator.w1_sensors()
+    from w1thermsensor import W1ThermSensor, load_kernel_modules
+    load_kernel_modules()
+    return W1ThermSensor.get_available_sensors()
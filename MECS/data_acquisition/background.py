@@ -0,0 +1,90 @@
+"""
+Background reading for slow devices
+A daemon thread calls the device's poll function every 'interval' seconds and caches what it returns,
+so the device can answer read() immediately with the latest values
+Values older than max_age are treated as missing
+"""
+
+import logging
+import threading
+from time import monotonic
+
+log = logging.getLogger(__name__)
+
+
+class BackgroundReader:
+    def __init__(self, name, poll, interval, max_age=None, clock=monotonic):
+        """
+        poll returns a dict of values, which are cached with the time they were read
+        interval is measured from the start of one poll to the start of the next
+        """
+        self.name = name
+        self.poll = poll
+        self.interval = interval
+        self.max_age = max_age
+        self.clock = clock
+        self.values = {}
+        self.timestamps = {}
+        self.polls = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def poll_once(self):
+        try:
+            values = self.poll()
+        except Exception as exc:
+            self.errors += 1
+            log.error(f"[{self.name}] background read failed: {exc!r}")
+            return
+        now = self.clock()
+        with self.lock:
+            self.polls += 1
+            for key, value in values.items():
+                self.values[key] = value
+                self.timestamps[key] = now
+
+    def run(self):
+        # if the device has already polled (e.g. at startup) the first poll is an interval later
+        next_poll = self.clock() + (self.interval if self.polls else 0)
+        while not self.stopped.wait(max(next_poll - self.clock(), 0)):
+            self.poll_once()
+            next_poll += self.interval
+            if next_poll < self.clock():
+                # fallen behind, don't try to catch up
+                next_poll = self.clock()
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+        log.debug(f"started background reading for {self.name} every {self.interval}s")
+        return self
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def wait(self, seconds):
+        """For a poll to pause in, returns True (early) if the reader has been stopped"""
+        return self.stopped.wait(seconds)
+
+    def age(self, key):
+        """Seconds since the value was read, None if it never has been"""
+        with self.lock:
+            timestamp = self.timestamps.get(key)
+        return None if timestamp is None else self.clock() - timestamp
+
+    def get(self, key):
+        """The latest value, or None if there isn't one or it's too old"""
+        age = self.age(key)
+        if age is None or (self.max_age is not None and age > self.max_age):
+            return None
+        with self.lock:
+            return self.values.get(key)
+
+    def __repr__(self):
+        return f"BackgroundReader({self.name!r}, every {self.interval}s)"
@@ -5,6 +5,7 @@ This is the entry point for normal usage of the MECS system.
 
 import logging
 from datetime import datetime
+from time import monotonic
 
 from .. import MECSConfigError, MECSHardwareError
 
@@ -13,8 +14,11 @@ from .devices import (
     INA3221Device,
     W1ThermDevice,
     HM3301Device,
-    EP3000Device
+    EP3000Device,
+    SDS011Device
 )
+from . import backends
+from .polling import DevicePoller
 
 log = logging.getLogger(__name__)
 
@@ -24,16 +28,26 @@ known_devices = {
     "INA3221": INA3221Device,
     "W1THERM": W1ThermDevice,
     "HM3301": HM3301Device,
-    "EP3000": EP3000Device
+    "EP3000": EP3000Device,
+    "SDS011": SDS011Device
 }
 
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_INTERVAL = 1.0
+
 class MECSBoard:
-    def __init__(self, hardware_required=True, **kwargs):
+    def __init__(self, hardware_required=True, concurrent=False, timeout=DEFAULT_TIMEOUT, clock=monotonic, **kwargs):
         """
         Ingest configuration data
         Raise a configuration error if anything goes wrong
+        With concurrent=True, devices are read in parallel,
+        each with a deadline of 'timeout' seconds unless its section specifies its own
+        Each device is read every 'sample_interval' seconds (default 1), as measured by clock
         """
+        self.clock = clock
         self.devices = {}
+        self.timeouts = {}
+        self.intervals = {}
         for key, config in kwargs.items():
             if not isinstance(config, dict):
                 raise MECSConfigError(f"section [{key}] must contain a dictionary")
@@ -42,6 +56,16 @@ class MECSBoard:
             device = config.pop('device')
             if device not in known_devices:
                 raise MECSConfigError(f"section [{key}] includes unsupported device '{device}', try one of [{', '.join(known_devices.keys())}]")
+            try:
+                self.timeouts[key] = float(config.pop('timeout', timeout))
+            except ValueError:
+                raise MECSConfigError(f"section [{key}] timeout must be a number of seconds")
+            try:
+                self.intervals[key] = float(config.pop('sample_interval', DEFAULT_INTERVAL))
+            except ValueError:
+                raise MECSConfigError(f"section [{key}] sample_interval must be a number of seconds")
+            if self.intervals[key] <= 0:
+                raise MECSConfigError(f"section [{key}] sample_interval must be positive")
             try:
                 self.devices[key] = known_devices[device](hardware_required, **config)
             except MECSConfigError as e:
@@ -52,11 +76,40 @@ class MECSBoard:
                 log.error(f"[{key}]: {e}")
 
         labels = set()
+        self.labels = {}
         for device_label, device in self.devices.items():
+            self.labels[device_label] = []
             for data_label, _ in device.read():
                 if data_label in labels:
                     raise MECSConfigError(f"[{device_label!r}] produced duplicate label: {data_label!r}")
                 labels.add(data_label)
+                self.labels[device_label].append(data_label)
+
+        self.poller = DevicePoller(self.devices, self.labels, self.timeouts) if concurrent else None
+        self.next_due = {label: 0 for label in self.devices}
+
+    @property
+    def interval(self):
+        """The period at which readings() should be called to keep every device on schedule"""
+        return min([self.intervals[label] for label in self.devices], default=DEFAULT_INTERVAL)
+
+    def due(self):
+        """
+        The devices which should be read now, each on its own cadence
+        Calls may be up to half a board interval early to allow for jitter
+        """
+        now = self.clock()
+        tolerance = self.interval / 2
+        result = []
+        for label in self.devices:
+            if now + tolerance < self.next_due[label]:
+                continue
+            self.next_due[label] += self.intervals[label]
+            if self.next_due[label] < now:
+                # fallen behind, don't try to catch up
+                self.next_due[label] = now + self.intervals[label]
+            result.append(label)
+        return result
 
     def calibrate(self, N):
         for label, device in self.devices.items():
@@ -68,9 +121,13 @@ class MECSBoard:
                 log.debug(f"device {label!r} has no calibrate method")
 
     def read(self):
-        """All the readings"""
-        for _, device in self.devices.items():
-            for label, value in device.read():
+        """The readings from all devices which are due"""
+        due = self.due()
+        if self.poller:
+            yield from self.poller.read(due)
+            return
+        for device_label in due:
+            for label, value in self.devices[device_label].read():
                 yield label, value
 
     def readings(self):
@@ -81,6 +138,21 @@ class MECSBoard:
             "data": data
         }
 
+    def metrics(self):
+        """Diagnostics from the devices which report them, e.g. i2c transactions per read, and for each shared bus"""
+        result = {label: device.metrics() for label, device in self.devices.items() if hasattr(device, "metrics")}
+        for name, bus in list(backends.managed.items()):
+            result[name] = bus.metrics()
+        return result
+
+    def close(self):
+        """Stop the poller and any devices with background threads or open connections"""
+        if self.poller:
+            self.poller.close()
+        for device in self.devices.values():
+            if hasattr(device, "close"):
+                device.close()
+
     def config(self):
         return {label: module.config() for label, module in self.registerables.items()}
 
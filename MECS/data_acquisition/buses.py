@@ -0,0 +1,159 @@
+"""
+Shared buses
+There is one ManagedBus for each physical bus (see backends.get_i2c_bus), whichever devices use it.
+Each device talks to the bus through its own BusClient, which takes the bus lock for every transfer
+and keeps count of the transfers, bytes, errors and latency for that device,
+so devices can be read concurrently and it's clear which device is using the bus time.
+batch() holds the bus lock across several transfers, so other devices' transfers can't come in between them
+(each transfer is still a separate smbus call, it doesn't combine them).
+Bytes are counted on the bus, not including the address bytes
+"""
+
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+log = logging.getLogger(__name__)
+
+# upper bounds of the latency histogram buckets, in microseconds
+LATENCY_BUCKETS = [100, 250, 500, 1000, 2500, 5000, 10000, 25000]
+
+
+class BusStats:
+    def __init__(self):
+        self.transactions = 0
+        self.batches = 0
+        self.bytes = 0
+        self.errors = 0
+        self.busy = 0.0  # seconds spent in transfers
+        self.waiting = 0.0  # seconds spent waiting for other clients to finish
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, nbytes, elapsed, waited, failed):
+        self.transactions += 1
+        self.bytes += nbytes
+        self.busy += elapsed
+        self.waiting += waited
+        self.latency[bisect_left(LATENCY_BUCKETS, elapsed * 1e6)] += 1
+        if failed:
+            self.errors += 1
+
+    def histogram(self):
+        labels = [f"<={bound}us" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}us"]
+        return {label: count for label, count in zip(labels, self.latency) if count}
+
+    def as_dict(self):
+        return {
+            "bus_transactions": self.transactions,
+            "bus_batches": self.batches,
+            "bus_bytes": self.bytes,
+            "bus_errors": self.errors,
+            "bus_error_rate": round(self.errors / self.transactions, 4) if self.transactions else 0.0,
+            "bus_time": round(self.busy, 6),
+            "bus_wait": round(self.waiting, 6),
+            "bus_latency": self.histogram(),
+        }
+
+
+class ManagedBus:
+    def __init__(self, name, handle):
+        """handle is the smbus (or pigpio connection) which all the clients share"""
+        self.name = name
+        self.handle = handle
+        self.lock = threading.RLock()
+        self.clients = {}
+
+    def client(self, name):
+        """The client for a device, the same one each time for the same name"""
+        with self.lock:
+            if name not in self.clients:
+                self.clients[name] = BusClient(self, name)
+            return self.clients[name]
+
+    def metrics(self):
+        """Totals over all the clients, and each client's share of the bus time"""
+        clients = list(self.clients.values())
+        busy = sum(client.stats.busy for client in clients)
+        result = {
+            "bus_transactions": sum(client.stats.transactions for client in clients),
+            "bus_errors": sum(client.stats.errors for client in clients),
+            "bus_time": round(busy, 6),
+            "bus_wait": round(sum(client.stats.waiting for client in clients), 6),
+        }
+        for client in clients:
+            result[f"{client.name}_share"] = round(client.stats.busy / busy, 3) if busy else 0.0
+        return result
+
+    def __repr__(self):
+        return f"ManagedBus({self.name!r}, clients=[{', '.join(self.clients)}])"
+
+
+class BusClient:
+    """
+    One device's view of a ManagedBus
+    The smbus methods used by the drivers are passed on to the shared handle under the bus lock
+    """
+    def __init__(self, bus, name):
+        self.bus = bus
+        self.name = name
+        self.stats = BusStats()
+
+    @contextmanager
+    def transaction(self, nbytes):
+        """Hold the bus for one transfer of nbytes, which is timed and counted (and counted as an error if it raises)"""
+        requested = perf_counter()
+        with self.bus.lock:
+            start = perf_counter()
+            failed = True
+            try:
+                yield self.bus.handle
+                failed = False
+            finally:
+                self.stats.record(nbytes, perf_counter() - start, start - requested, failed)
+
+    @contextmanager
+    def batch(self):
+        """Hold the bus lock across the transfers made inside, which are otherwise made and counted as usual"""
+        with self.bus.lock:
+            self.stats.batches += 1
+            yield self
+
+    def write_byte(self, address, value):
+        with self.transaction(1) as handle:
+            return handle.write_byte(address, value)
+
+    def read_byte(self, address):
+        with self.transaction(1) as handle:
+            return handle.read_byte(address)
+
+    def write_byte_data(self, address, register, value):
+        with self.transaction(2) as handle:
+            return handle.write_byte_data(address, register, value)
+
+    def read_byte_data(self, address, register):
+        with self.transaction(2) as handle:
+            return handle.read_byte_data(address, register)
+
+    def write_word_data(self, address, register, value):
+        with self.transaction(3) as handle:
+            return handle.write_word_data(address, register, value)
+
+    def read_word_data(self, address, register):
+        with self.transaction(3) as handle:
+            return handle.read_word_data(address, register)
+
+    def write_i2c_block_data(self, address, register, data):
+        with self.transaction(1 + len(data)) as handle:
+            return handle.write_i2c_block_data(address, register, data)
+
+    def read_i2c_block_data(self, address, register, length):
+        with self.transaction(1 + length) as handle:
+            return handle.read_i2c_block_data(address, register, length)
+
+    def metrics(self):
+        return self.stats.as_dict()
+
+    def __repr__(self):
+        return f"BusClient({self.bus.name!r}, {self.name!r})"
@@ -3,29 +3,84 @@ For managing a MUST EP 3000 Pro AC Inverter device to read via serial (RS232 via
 Most of the code is error handling
 The key things are to create the sensors and calculate the readings correctly
 
+At 2400 baud a full set of replies takes around half a second, so the inverter is queried
+in a background thread every 'poll_interval' seconds (default 2) and read() returns the latest values
+(the inverter is queried once at startup).
+The Q1, F, X and G? queries are sent together (unless 'pipeline' is false) and each reply is read
+up to its '\r' terminator, waiting at most 'timeout' seconds (default 1).
+Replies are checked for their start and number of fields before being parsed.
+Values older than 'max_age' seconds (default 30) are reported as None
+
 TODO!!! Check the drivers on Pi Zero W - might need https://github.com/juliagoda/CH341SER
 """
 
 import logging
 
 from ... import MECSConfigError, MECSHardwareError
-from serial import Serial, SerialException
+from ..backends import open_serial
+from ..background import BackgroundReader
+from serial import SerialException
 
 log = logging.getLogger(__name__)
 
 
 class EP3000Error(MECSConfigError): pass
 
-
-def try_parse(in_bytes):
-    """
-    Highly resilient bytes object parser, that will swallow any exception and return None
-    """
-    try:
-        return in_bytes.decode('utf-8')
-    except:
-        log.debug('Failed to parse input bytes into string')
-        return None
+class FrameError(ValueError): pass
+
+
+def fields(frame, count, start=b"("):
+    """The space separated fields of a reply, checked for its start, terminator and number of fields"""
+    if not frame.endswith(b"\r"):
+        raise FrameError(f"incomplete reply {frame!r}")
+    body = frame[:-1]
+    if not body.startswith(start):
+        raise FrameError(f"reply {frame!r} doesn't start with {start!r}")
+    values = body[len(start):].split()
+    if len(values) != count:
+        raise FrameError(f"reply {frame!r} has {len(values)} fields, expected {count}")
+    return values
+
+def parse_status(frame):
+    """Q1: (MMM.M NNN.N PPP.P QQQ RR.R S.SS TT.T b7b6b5b4b3b2b1b0"""
+    input_volt, input_fault_volt, output_volt, output_curr, input_freq, battery_volt, temp, status = fields(frame, 8)
+    return {
+        'Input voltage': float(input_volt),
+        'Output voltage': float(output_volt),
+        'Output_current': float(output_curr),
+        'Input frequency': float(input_freq),
+        'Battery voltage': float(battery_volt),
+        # the tens digit is offset from '0', so ':' is 100
+        'Inverter temp': (temp[0] - 48) * 10 + float(temp[1:])
+    }
+
+def parse_frequency(frame):
+    """F: (RR.R"""
+    load_freq, = fields(frame, 1)
+    return {'Load frequency': float(load_freq)}
+
+def parse_charge_current(frame):
+    """X: charge current in hex, then a second field"""
+    current, _ = fields(frame, 2, start=b"")
+    return {'Charge current': float(int(current, 16))}
+
+def parse_errors(frame):
+    """G?: (error code, logged if not zero"""
+    code, = fields(frame, 1)
+    if int(code):
+        log.warning(f"EP3000 reports error code {code.decode()}")
+    return {}
+
+# each query and the parser for its reply, in the order they are sent
+QUERIES = [
+    (b"Q1\r", parse_status),
+    (b"F\r", parse_frequency),
+    (b"X\r", parse_charge_current),
+    (b"G?\r", parse_errors),
+]
+
+LABELS = ['Input voltage', 'Output voltage', 'Output_current', 'Input frequency',
+          'Battery voltage', 'Inverter temp', 'Load frequency', 'Charge current']
 
 
 class EP3000Device:
@@ -34,104 +89,75 @@ class EP3000Device:
         Ingest configuration data
         Raise MECSConfigError if anything is wrong
         """
+        port_name = kwargs.get('serial_port', '/dev/ttyUSB0')
+        baud_rate = kwargs.get('baud_rate', 2400)
+        self.timeout = kwargs.get('timeout', 1.0)
+        self.poll_interval = kwargs.get('poll_interval', 2.0)
+        self.max_age = kwargs.get('max_age', 30)
+        self.pipeline = kwargs.get('pipeline', True)
+        for name in ['timeout', 'poll_interval', 'max_age']:
+            value = getattr(self, name)
+            if not isinstance(value, (int, float)) or value <= 0:
+                raise EP3000Error(f"{name}: {value!r} must be a positive number of seconds")
+
+        self.bus = f"serial:{port_name}"
+        self.frame_errors = 0
+
+        self.serial_port = None
         try:
-            port_name = kwargs.get('serial_port', '/dev/ttyUSB0')
-            baud_rate = kwargs.get('baud_rate', 2400)
-        except KeyError as e:
-            raise MECSConfigError(f"Missing parameter: {e}")
-
-        self.commands = {'main_readings': b"Q1\r",
-                         'load_frequency': b"F\r",
-                         'error_query': b"G?\r",
-                         'charge_current': b"X\r"}
-
-        try:
-            self.serial_port = Serial(port_name, baud_rate)
+            self.serial_port = open_serial(port_name, baud_rate, timeout=self.timeout)
         except ValueError:
             log.info("Parameter out of range - is your baud rate right?")
-            pass
         except SerialException as e:
             log.warning("Can't open EP3000 on specified serial port - is it right?")
             if hardware_required:
                 raise (MECSHardwareError('No EP3000 on serial interface : '+str(e)))
 
-        self.read_vars = {}
+        self.reader = BackgroundReader(f"EP3000:{port_name}", self.query, self.poll_interval, max_age=self.max_age)
+        if self.serial_port:
+            # the first round is made now so there are values from the first read
+            self.reader.poll_once()
+            self.reader.start()
 
         log.debug(f"{self} created")
 
-    def get_command(self, command):
+    def query(self):
         """
-        Sends a command string via the serial port
-        NB This function is deliberately highly fault tolerant, returning None rather than propagating Exceptions
-        This is due serial comms having potential for upstream errors e.g. in Serial to USB converter
-
-        returns: string response or None if empty or on error
+        Send the queries and parse the replies, in order
+        A bad or late reply ends the round, as any later replies can't be matched up to their queries
         """
         if not self.serial_port.is_open:
+            self.serial_port.open()
+        self.serial_port.reset_input_buffer()
+        if self.pipeline:
+            self.serial_port.write(b"".join(command for command, _ in QUERIES))
+        values = {}
+        for command, parse in QUERIES:
+            if not self.pipeline:
+                self.serial_port.write(command)
+            frame = self.serial_port.read_until(b"\r")
             try:
-                self.serial_port.open()
-            except SerialException:
-                log.warning('Serial port cannot be opened right now')
-                return None
-
-        try:
-            self.serial_port.write(command)
-            self.serial_port.flush()
-        except SerialException:
-            log.warning('Cannot write to serial port, is it correctly configured?')
-            return None
-
-        if self.serial_port.in_waiting > 0:
-            return_data = self.serial_port.read_all()
-            return return_data
-        else:
-            return None
-
-    def parse_data(self):
-        main_readings = self.get_command(self.commands['main_readings'])
-        if main_readings:
-            input_volt = try_parse(main_readings[1:6])
-            input_fault_v = try_parse(main_readings[7:12])
-            output_volt = try_parse(main_readings[13:18])
-            output_curr = try_parse(main_readings[19:22])
-            input_f_ = try_parse(main_readings[23:27])
-            battery_volt = try_parse(main_readings[28:32])
-            inverter_temp_raw = main_readings[33:37]
-            temp_bias = int(try_parse(inverter_temp_raw[0]))
-            inverter_temp = str(((temp_bias - 48) * 10) + float(try_parse(inverter_temp_raw[1:])))
-        else:
-            log.warning('No data returned in response to main_reading command')
-            return {'Input voltage': None,
-                    'Output voltage': None,
-                    'Output_current': None,
-                    'Battery voltage': None,
-                    'Inverter temp': None,
-                    'Charge current': None}
-
-        charge_current_raw = self.get_command(self.commands['charge_current'])
-        if charge_current_raw:
-            current_hex = try_parse(charge_current_raw.split(b' ')[0])
-            charge_current = str(int(current_hex, 16))
-        else:
-            log.warning('Charge current not returned')
-            charge_current = None
-
-        return {'Input voltage': input_volt,
-                'Output voltage': output_volt,
-                'Output_current': output_curr,
-                'Battery voltage': battery_volt,
-                'Inverter temp': inverter_temp,
-                'Charge current': charge_current}
+                values.update(parse(frame))
+            except (ValueError, IndexError) as exc:
+                self.frame_errors += 1
+                log.warning(f"bad reply to {command.decode().strip()}: {exc}")
+                break
+        return values
 
     def read(self):
-        return_dict = self.parse_data()
-        for k in return_dict:
-            yield k, return_dict[k]
+        for label in LABELS:
+            yield label, self.reader.get(label)
 
     def readings(self):
         return dict(self.read())
 
+    def metrics(self):
+        return {"frame_errors": self.frame_errors, "age": self.reader.age(LABELS[0])}
+
+    def close(self):
+        self.reader.stop()
+        if self.serial_port:
+            self.serial_port.close()
+
     def __repr__(self):
-        read_vars = ", ".join(
-            ['Input voltage', 'Output voltage', 'Output_current', 'Battery voltage', 'Inverter temp', 'Charge current'])
-        return f"EP3000 Device, configured to read ({read_vars})"
+        return f"EP3000 Device, configured to read ({', '.join(LABELS)})"
@@ -1,13 +1,60 @@
+"""
+For managing a Seeed HM3301 particulate sensor on bit-banged i2c (via pigpio)
+
+The sensor updates its readings about once a second, so it is read in a background thread every
+'poll_interval' seconds (default 1) and read() returns the latest values (the sensor is read once at startup).
+A frame which fails its checksum is read again, up to 'retries' times (default 2).
+'channels' chooses the values to report (default PM2.5 and PM10), any of CHANNELS.
+Values older than 'max_age' seconds (default 10) are reported as None
+"""
 import pigpio
+import struct
 from time import sleep
 import logging
 from ... import MECSConfigError, MECSHardwareError
+from ..backends import get_managed_bus, get_pigpio
+from ..background import BackgroundReader
 
 log = logging.getLogger(__name__)
 
 
+class HM3301Error(MECSConfigError): pass
+
+
+# each value in the data frame, in order
+CHANNELS = [
+    'PM1.0',  # PM1.0 Standard particulate matter concentration Unit:ug/m3
+    'PM2.5',  # PM2.5 Standard particulate matter concentration Unit:ug/m3
+    'PM10',  # PM10  Standard particulate matter concentration Unit:ug/m3
+    'PM_1.0_conctrt_atmosph',  # PM1.0 Atmospheric environment concentration ,unit:ug/m3
+    'PM_2.5_conctrt_atmosph',  # PM2.5 Atmospheric environment concentration ,unit:ug/m3
+    'PM_10_conctrt_atmosph',  # PM10  Atmospheric environment concentration ,unit:ug/m3
+    'Count 0.3um+ in 1l air',  # The number of particles with diameter 0.3um or above in 1 liter of air
+    'Count 0.5um+ in 1l air',  # The number of particles with diameter 0.5um or above in 1 liter of air
+    'Count 1.0um+ in 1l air',  # The number of particles with diameter 1.0um or above in 1 liter of air
+    'Count 2.5um+ in 1l air',  # The number of particles with diameter 2.5um or above in 1 liter of air
+    'Count 5.0um+ in 1l air',  # The number of particles with diameter 5.0um or above in 1 liter of air
+    'Count 10.0um+ in 1l air'  # The number of particles with diameter 10.0um or above in 1 liter of air
+]
+
+# reserved, sensor number, the values (big-endian), checksum
+FRAME = struct.Struct(f">2xH{len(CHANNELS)}HB")
+
+
+def decode(data):
+    """The values in a frame, or None if it is short or fails its checksum"""
+    if len(data) < FRAME.size:
+        # In here if we haven't got enough data (often no data at all) - this cannot be good!
+        return None
+    frame = bytes(data[:FRAME.size])
+    sensor_number, *values, checksum = FRAME.unpack(frame)
+    if sum(frame[:-1]) & 0xFF != checksum:
+        return None
+    return dict(zip(CHANNELS, values))
+
+
 class HM3301Device:
-    DATA_CNT = 29
+    DATA_CNT = FRAME.size
     default_SDA_pin = 20
     default_SCL_pin = 21
     default_baud = 20000
@@ -15,34 +62,35 @@ class HM3301Device:
 
     fully_initialised = False
 
-    offsets = {
-        'PM1.0': 4,  # PM1.0 Standard particulate matter concentration Unit:ug/m3
-        'PM2.5': 6,  # PM2.5 Standard particulate matter concentration Unit:ug/m3
-        'PM10': 8,  # PM10  Standard particulate matter concentration Unit:ug/m3
-        'PM_1.0_conctrt_atmosph': 10,  # PM1.0 Atmospheric environment concentration ,unit:ug/m3
-        'PM_2.5_conctrt_atmosph': 12,  # PM2.5 Atmospheric environment concentration ,unit:ug/m3
-        'PM_10_conctrt_atmosph': 14,  # PM10  Atmospheric environment concentration ,unit:ug/m3
-        'Count 0.3um+ in 1l air': 16,  # The number of particles with diameter 0.3um or above in 1 liter of air
-        'Count 0.5um+ in 1l air': 18,  # The number of particles with diameter 0.5um or above in 1 liter of air
-        'Count 1.0um+ in 1l air': 20,  # The number of particles with diameter 1.0um or above in 1 liter of air
-        'Count 2.5um+ in 1l air': 22,  # The number of particles with diameter 2.5um or above in 1 liter of air
-        'Count 5.0um+ in 1l air': 24,  # The number of particles with diameter 5.0um or above in 1 liter of air
-        'Count 10.0um+ in 1l air': 26  # The number of particles with diameter 10.0um or above in 1 liter of air
-    }
-
-    return_keys = ['PM2.5','PM10']
-
     def __init__(self, hardware_required, **kwargs):
         log.info("Initialising the HM3301")
-        self.pi = pigpio.pi()
-
         self.SDA = kwargs.get('SDA', HM3301Device.default_SDA_pin)
         self.SCL = kwargs.get('SCL', HM3301Device.default_SCL_pin)
         self.i2c_address = kwargs.get('i2c_address', HM3301Device.default_i2c_address)
         self.label = kwargs.get('label', 'HM3301_Sensor')
-
-        # Set up an empty dictionary to hold the latest readings
-        self.latest_data = {}
+        # bit-banged i2c is independent of the hardware i2c bus
+        self.bus = f"pigpio:{self.SDA}"
+
+        self.channels = kwargs.get('channels', ['PM2.5', 'PM10'])
+        if not isinstance(self.channels, list) or not self.channels:
+            raise HM3301Error("'channels' must be a list of the values to read")
+        for channel in self.channels:
+            if channel not in CHANNELS:
+                raise HM3301Error(f"channels: {channel!r} (try one of {CHANNELS})")
+        self.retries = kwargs.get('retries', 2)
+        self.poll_interval = kwargs.get('poll_interval', 1.0)
+        self.max_age = kwargs.get('max_age', 10)
+        for name in ['poll_interval', 'max_age']:
+            value = getattr(self, name)
+            if not isinstance(value, (int, float)) or value <= 0:
+                raise HM3301Error(f"{name}: {value!r} must be a positive number of seconds")
+
+        self.frames = 0
+        self.checksum_errors = 0
+        self.reader = BackgroundReader(f"HM3301:{self.label}", self.sample, self.poll_interval, max_age=self.max_age)
+
+        self.pi = get_pigpio()
+        self.i2c = get_managed_bus(self.bus, self.pi).client(f"HM3301@{self.i2c_address:#x}")
 
         # set pullups - not necessary with Pi2Grover
         # TODO: pigpio can throw a pigpio.error here as well - need to catch this and deal
@@ -69,50 +117,55 @@ class HM3301Device:
         if h < 0:
             log.error('Pigpio cannot open i2c for particulate sensor')
             if hardware_required:
-                raise MECSHardwareError("Couldn't access INA3221 device")
+                raise MECSHardwareError("Couldn't access HM3301 device")
             return
 
         pigpio.exceptions = True
 
-        (count, data) = self.pi.bb_i2c_zip(
-            self.SDA, [4, self.i2c_address, 2, 7, 1, 0x80, 2, 7, 1, 0x88, 3, 0])
+        with self.i2c.transaction(2) as pi:
+            (count, data) = pi.bb_i2c_zip(
+                self.SDA, [4, self.i2c_address, 2, 7, 1, 0x80, 2, 7, 1, 0x88, 3, 0])
         sleep(10.0 / 1000.0)
 
         self.fully_initialised = True
+        # the first frame is read now so there are values from the first read
+        self.reader.poll_once()
+        self.reader.start()
         log.info(f"HM3301 {self.label} fully initialised")
 
     def read_HM3301_data(self):
-        (count, data) = self.pi.bb_i2c_zip(
-            self.SDA, [4, self.i2c_address, 2, 7, 1, 0x81, 3, 2, 6, self.DATA_CNT, 3, 0])
-        return list(data)
-
-    def close(self):
-        self.pi.bb_i2c_close(self.SDA)
-        self.pi.stop()
-
-    def checksum(self, data):
-        chksum = 0
-        if len(data) < self.DATA_CNT:
-            # In here if we haven't got enough data (often no data at all) - this cannot be good!
-            return False
+        with self.i2c.transaction(1 + self.DATA_CNT) as pi:
+            (count, data) = pi.bb_i2c_zip(
+                self.SDA, [4, self.i2c_address, 2, 7, 1, 0x81, 3, 2, 6, self.DATA_CNT, 3, 0])
+        return data
+
+    def sample(self):
+        """Read a frame, reading again if it fails its checksum"""
+        for attempt in range(self.retries + 1):
+            self.frames += 1
+            values = decode(self.read_HM3301_data())
+            if values is not None:
+                return values
+            self.checksum_errors += 1
+        log.warning(f"HM3301 {self.label}: no valid frame in {self.retries + 1} attempts")
+        return {}
 
-        for i in range(self.DATA_CNT - 1):
-            chksum += data[i]
-        chksum = chksum & 0xff
-        return chksum == data[self.DATA_CNT - 1]
+    def read(self):
+        for channel in self.channels:
+            yield channel, self.reader.get(channel)
 
-    def parse_data(self, data):
-        check_ok = self.checksum(data)
+    def readings(self):
+        return dict(self.read())
 
-        for key, val in self.offsets.items():
-            self.latest_data[key] = data[val] << 8 | data[val + 1] if check_ok else None
-        return self.latest_data
+    def metrics(self):
+        return {"frames": self.frames, "checksum_errors": self.checksum_errors, "age": self.reader.age(self.channels[0]),
+                **self.i2c.metrics()}
 
-    def read(self):
-        data = self.read_HM3301_data()
-        all_vals = self.parse_data(data)
-        for k in self.return_keys:
-            yield k, all_vals[k]
+    def close(self):
+        self.reader.stop()
+        if self.fully_initialised:
+            self.pi.bb_i2c_close(self.SDA)
+        self.pi.stop()
 
     def __repr__(self):
         return f"HM3301Device({self.label!r}, i2c on pins {self.SDA!r} and {self.SCL!r}, address {self.i2c_address!r})"
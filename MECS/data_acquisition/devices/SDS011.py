@@ -0,0 +1,121 @@
+"""
+For managing an SDS011 particulate sensor on a serial port (via USB), using the driver in sds011/SDS011.py
+
+The fan and laser draw power and wear out, so the sensor is duty cycled: every 'period' seconds (default 300)
+it is woken, given 'warm_up' seconds (default 30) for the airflow to settle, queried 'burst' times (default 5)
+'burst_interval' seconds apart (default 1) and put back to sleep.
+This runs in a background thread and read() returns the mean of the last burst (None until the first is done).
+If the period is too short to sleep between bursts the sensor is left working.
+The values are labelled '{label}_PM2.5' and '{label}_PM10' ('label' defaults to SDS011),
+so they don't clash with an HM3301 on the same board.
+Values older than 'max_age' seconds (default two periods) are reported as None
+"""
+
+import logging
+from statistics import mean
+
+from serial import SerialException
+
+from ... import MECSConfigError, MECSHardwareError
+from ..background import BackgroundReader
+from ..sds011.SDS011 import SDS011
+
+log = logging.getLogger(__name__)
+
+
+class SDS011Error(MECSConfigError): pass
+
+CHANNELS = ['PM2.5', 'PM10']
+
+
+class SDS011Device:
+    def __init__(self, hardware_required=True, **kwargs):
+        """
+        Ingest configuration data
+        Raise MECSConfigError if anything is wrong
+        """
+        port_name = kwargs.get('serial_port', '/dev/ttyUSB1')
+        self.label = kwargs.get('label', 'SDS011')
+        if not isinstance(self.label, str) or not self.label:
+            raise SDS011Error(f"label: {self.label!r} must be a name for the sensor")
+        self.labels = [f"{self.label}_{channel}" for channel in CHANNELS]
+        self.period = kwargs.get('period', 300)
+        self.warm_up = kwargs.get('warm_up', 30)
+        self.burst = kwargs.get('burst', 5)
+        self.burst_interval = kwargs.get('burst_interval', 1.0)
+        for name in ['period', 'warm_up', 'burst_interval']:
+            value = getattr(self, name)
+            if not isinstance(value, (int, float)) or value < 0 or (name == 'period' and value == 0):
+                raise SDS011Error(f"{name}: {value!r} must be a positive number of seconds")
+        if not isinstance(self.burst, int) or self.burst < 1:
+            raise SDS011Error(f"burst: {self.burst!r} must be a number of readings")
+        self.max_age = kwargs.get('max_age', 2 * self.period)
+
+        self.bus = f"serial:{port_name}"
+        self.duty_cycled = self.period > self.warm_up + (self.burst - 1) * self.burst_interval
+        self.awake = False
+        self.bursts = 0
+        self.failed_queries = 0
+
+        self.sensor = None
+        try:
+            self.sensor = SDS011(port_name, timeout=kwargs.get('timeout', 2))
+        except SerialException as e:
+            log.warning("Can't open SDS011 on specified serial port - is it right?")
+            if hardware_required:
+                raise (MECSHardwareError('No SDS011 on serial interface : '+str(e)))
+
+        self.reader = BackgroundReader(f"SDS011:{port_name}", self.measure, self.period, max_age=self.max_age)
+        if self.sensor:
+            if not self.duty_cycled:
+                log.info(f"SDS011 period of {self.period}s is too short to sleep between bursts, it will be left working")
+            self.reader.start()
+
+        log.debug(f"{self} created")
+
+    def measure(self):
+        """Wake the sensor and let it warm up, take a burst of readings, then put it back to sleep"""
+        if not self.awake:
+            self.sensor.sleep(sleep=False)
+            self.awake = True
+            if self.reader.wait(self.warm_up):
+                return {}
+        samples = []
+        for i in range(self.burst):
+            if i and self.reader.wait(self.burst_interval):
+                break
+            sample = self.sensor.query()
+            if sample is None:
+                self.failed_queries += 1
+            else:
+                samples.append(sample)
+        if self.duty_cycled:
+            self.sensor.sleep()
+            self.awake = False
+        if not samples:
+            log.warning("No reply from the SDS011 in a burst of readings")
+            return {}
+        self.bursts += 1
+        return {label: round(mean(values), 1) for label, values in zip(self.labels, zip(*samples))}
+
+    def read(self):
+        for label in self.labels:
+            yield label, self.reader.get(label)
+
+    def readings(self):
+        return dict(self.read())
+
+    def metrics(self):
+        return {"bursts": self.bursts, "failed_queries": self.failed_queries, "age": self.reader.age(self.labels[0])}
+
+    def close(self):
+        self.reader.stop()
+        if self.sensor:
+            if self.awake:
+                self.sensor.sleep()
+                self.awake = False
+            self.sensor.ser.close()
+
+    def __repr__(self):
+        mode = f"a burst of {self.burst} every {self.period}s" if self.duty_cycled else "working continuously"
+        return f"SDS011 Device {self.label!r} on {self.bus}, {mode}"
@@ -1,55 +1,119 @@
+"""
+For managing DS18B20 temperature sensors on the one-wire bus
+
+A conversion blocks for up to 750ms (at 12 bits), so conversions are made in a background thread
+and read() returns the latest cached values immediately (each sensor is read once at startup).
+All the sensors on the bus are found once, at startup, and converted in turn, one every
+'conversion_interval' seconds (default 1). 'resolution' (9 to 12 bits) trades precision for conversion time.
+A single sensor is labelled 'label', with several each is labelled '{label}_{sensor id}'
+unless 'sensors' maps sensor ids to labels, e.g. "sensors": {"0316a2794c2f": "battery_temperature"}
+Values older than 'max_age' seconds (default 60) are reported as None
+"""
 import os
 import logging
 
 os.environ['W1THERMSENSOR_NO_KERNEL_MODULE'] = '1'
 
 from w1thermsensor.errors import KernelModuleLoadError, NoSensorFoundError, ResetValueError, SensorNotReadyError
-from w1thermsensor import W1ThermSensor, load_kernel_modules
 
 from ... import MECSConfigError, MECSHardwareError
+from ..backends import get_w1_sensors
+from ..background import BackgroundReader
 
 log = logging.getLogger(__name__)
 
 class W1ThermError(MECSConfigError): pass
 
+RESOLUTIONS = [9, 10, 11, 12]
+
 class W1ThermDevice:
+    bus = "w1"
+
     def __init__(self, hardware_required=True, **kwargs):
         self.label = kwargs['label']
+        self.conversion_interval = kwargs.get('conversion_interval', 1.0)
+        if not isinstance(self.conversion_interval, (int, float)) or self.conversion_interval <= 0:
+            raise W1ThermError(f"conversion_interval: {self.conversion_interval!r} must be a positive number of seconds")
+        self.max_age = kwargs.get('max_age', 60)
+        self.resolution = kwargs.get('resolution')
+        if self.resolution is not None and self.resolution not in RESOLUTIONS:
+            raise W1ThermError(f"resolution: {self.resolution!r} (try one of {RESOLUTIONS})")
+        names = kwargs.get('sensors')
+        if names is not None and not isinstance(names, dict):
+            raise W1ThermError("'sensors' must be a dictionary of sensor ids and labels")
+
         try:
-            load_kernel_modules()
-            self.sensor = W1ThermSensor()
+            found = get_w1_sensors()
         except KernelModuleLoadError as exc:
             log.error(exc)
             log.warning(f"Either the kernel does not have the required one wire modules, or they can't be loaded : temp sensor unavailable")
-            self.sensor = None
+            found = []
         except NoSensorFoundError as exc:
             log.error(exc)
             log.warning(f"No temp sensor found on the gpio one-wire interface")
-            self.sensor = None
+            found = []
         except FileNotFoundError as exc:
             log.error(exc)
             log.warning(f"There's something wrong here - possibly run with NO_KERNAL_MODULE?")
-            self.sensor = None
-        if hardware_required and not self.sensor:
+            found = []
+        if hardware_required and not found:
             raise MECSHardwareError("Can't access w1therm sensor")
-        log.debug(f"{self} created")
 
+        # label each sensor
+        if names is not None:
+            self.sensors = {names[sensor.id]: sensor for sensor in found if sensor.id in names}
+            for id, label in names.items():
+                if label not in self.sensors:
+                    log.warning(f"No temp sensor with id {id!r} found for {label!r}")
+            self.labels = list(names.values())
+        elif len(found) > 1:
+            self.sensors = {f"{self.label}_{sensor.id}": sensor for sensor in found}
+            self.labels = list(self.sensors)
+        else:
+            self.sensors = {self.label: sensor for sensor in found}
+            self.labels = [self.label]
 
-    def _read(self):
-        if not self.sensor:
-            return None
+        if self.resolution is not None:
+            for label, sensor in self.sensors.items():
+                try:
+                    sensor.set_resolution(self.resolution)
+                except Exception as exc:
+                    log.warning(f"Couldn't set the resolution of {label!r}: {exc!r}")
+
+        self.queue = list(self.sensors.items())
+        self.next = 0
+        self.reader = BackgroundReader(f"w1:{self.label}", self.convert, self.conversion_interval, max_age=self.max_age)
+        if self.sensors:
+            # the first round is made now so there are values from the first read
+            for _ in self.queue:
+                self.reader.poll_once()
+            self.reader.start()
+        log.debug(f"{self} created")
+
+    def convert(self):
+        """Convert the next sensor in turn"""
+        label, sensor = self.queue[self.next]
+        self.next = (self.next + 1) % len(self.queue)
         try:
-            return round(self.sensor.get_temperature(), 2)
+            return {label: round(sensor.get_temperature(), 2)}
         except (ResetValueError, SensorNotReadyError) as exc:
             log.error(exc)
-            log.warn(f"Sensor is not ready to be read")
-            return None
+            log.warn(f"Sensor {label!r} is not ready to be read")
+            return {}
 
     def read(self):
-        yield self.label, self._read()    
+        for label in self.labels:
+            yield label, self.reader.get(label)
 
     def readings(self):
         return dict(self.read())
 
+    def metrics(self):
+        """Seconds since each sensor was last read"""
+        return {f"{label}_age": self.reader.age(label) for label in self.labels}
+
+    def close(self):
+        self.reader.stop()
+
     def __repr__(self):
-        return f"W1ThermDevice({self.label!r})"
\ No newline at end of file
+        return f"W1ThermDevice({self.label!r}, sensors=[{', '.join(self.labels)}])"
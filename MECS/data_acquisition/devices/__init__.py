@@ -2,4 +2,5 @@ from .adc import ADCDevice
 from .ina3221 import INA3221Device
 from .W1Therm import W1ThermDevice
 from .HM3301 import HM3301Device
-from .EP3000 import EP3000Device
\ No newline at end of file
+from .EP3000 import EP3000Device
+from .SDS011 import SDS011Device
@@ -2,18 +2,32 @@
 For managing an ADC device
 Most of the code is error handling
 The key things are to create the sensors and calculate the readings correctly
+
+For AC measurements, a voltage and a current sensor are paired in the 'ac' section, e.g.
+    "ac": {"mains": {"voltage": "ac_voltage", "current": "ac_current", "samples": 480}}
+each reading captures a burst of samples from the pair (at 12 bits unless 'bit_rate' is given)
+and produces mains_vrms, mains_irms, mains_real_power, mains_apparent_power and mains_power_factor
+in place of the paired sensors' own readings
+A sensor or pair whose chip never finishes a conversion reads None, the rest are read as usual
 """
 
 import logging
 
+import numpy as np
+
 from ... import MECSConfigError, MECSHardwareError
-from ..ADCPi import ABEHelpers, ADCPi
+from ..ADCPi import ADCPi, ConversionTimeout
+from ..backends import get_i2c_bus
+from ..filters import get_filter
+from ..power import ac_power, QUANTITIES
 
 log = logging.getLogger(__name__)
 
 class ADCError(MECSConfigError): pass
 
 class ADCDevice:
+    bus = "i2c"  # shared with other smbus devices for concurrent polling
+
     def __init__(self, hardware_required=True, **kwargs):
         """
         Ingest configuration data
@@ -62,16 +76,31 @@ class ADCDevice:
                 raise ADCError(f"channel '{k}' must be a dictionary, not '{v}'")
 
         self.sensors = {}
+        self.filters = {}
         for label, conf in sensors.items():
             try:
                 self.register(label, conf)
             except ADCError as e:
                 raise ADCError(f"channel ['{label}']: {e}")
 
-        bus = ABEHelpers().get_smbus()
+        ac = kwargs.get('ac', {})
+        if not isinstance(ac, dict):
+            raise ADCError("'ac' must be a dictionary")
+        self.ac = {}
+        for name, conf in ac.items():
+            if not isinstance(conf, dict):
+                raise ADCError(f"ac pair '{name}' must be a dictionary, not '{conf}'")
+            try:
+                self.ac[name] = ACPair(self.sensors, **conf)
+            except ADCError as e:
+                raise ADCError(f"ac ['{name}']: {e}")
+        self.paired = {label for pair in self.ac.values() for label in [pair.voltage, pair.current]}
+
+        bus = get_i2c_bus()
+        self.i2c = bus.client(f"ADCPi@{self.address1:#x}") if bus else None
         if bus:
             try:
-                self.adc = ADCPi(bus, address=self.address1, address2=self.address2, rate=self.bit_rate)
+                self.adc = ADCPi(self.i2c, address=self.address1, address2=self.address2, rate=self.bit_rate)
             except OSError as e:
                 log.warning("Couldn't access ADC, no device detected")
                 self.adc = None
@@ -79,50 +108,89 @@ class ADCDevice:
                     raise MECSHardwareError("No ADC device detected")
         else:
             self.adc = None
-            log.warning(f"ABEHelpers().get_smbus() returned {bus}")
+            log.warning(f"get_i2c_bus() returned {bus}")
             log.error(f"No ADC bus detected")
             if hardware_required:
                 raise MECSHardwareError("No ADC bus detected")
 
+        self.transactions = None
         log.debug(f"{self} created")
 
 
     def register(self, label, conf):
-        self.sensors[label] = ADCSensor(impedance=self.input_impedance, **conf)
+        sensor = ADCSensor(impedance=self.input_impedance, **conf)
+        try:
+            self.filters[label] = get_filter(sensor.filter)
+        except MECSConfigError as e:
+            raise ADCError(e)
+        self.sensors[label] = sensor
 
-    def getSample(self, channel, N):
+    def getSample(self, channels, N):
+        """
+        N voltages from a channel, or from a list of channels in turn, in continuous conversion mode
+        returns an array shaped (N,) or (N, len(channels))
+        """
         if not self.adc:
-            return [0 for _ in range(N)]
+            return np.zeros(N if np.isscalar(channels) else (N, len(channels)))
+        # the adc is left in continuous mode, so nothing is written unless the channel changes
         self.adc.set_conversion_mode(1)
-        readings = [self.adc.read_voltage(channel) for i in range(N)]
-        self.adc.set_conversion_mode(0)
-        return readings
+        return self.adc.read_voltage_array(channels, N)
 
-    def getAverageSample(self, channel, N):
-        return sum(self.getSample(channel, N))/N
+    def getAverageSample(self, channels, N):
+        return self.getSample(channels, N).mean(axis=0)
 
     def calibrate(self, N):
         """
         for calibration, we don't handle anything except our own sensors
         we yield ALL sensors to the caller for processing
         whether we calibrated them or not
+        All the current channels are sampled together, in turn
         """
-        for label, sensor in self.sensors.items():
-            if sensor.type == "current":
-                log.info(f"Calibrating zero_point for [{label}]")
-                sensor.zero_point = self.getAverageSample(sensor.channel, N)
+        current = {label: sensor for label, sensor in self.sensors.items() if sensor.type == "current"}
+        if not current:
+            return
+        log.info(f"Calibrating zero_point for [{', '.join(current)}]")
+        zero_points = self.getAverageSample([sensor.channel for sensor in current.values()], N)
+        for sensor, zero_point in zip(current.values(), zero_points):
+            sensor.zero_point = float(zero_point)
 
     def read(self):
+        start = self.adc.transactions if self.adc else 0
         for label, sensor in self.sensors.items():
-            yield label, sensor.reading(self.adc)
+            if label not in self.paired:
+                try:
+                    value = sensor.reading(self.adc, self.filters[label])
+                except ConversionTimeout as e:
+                    log.warning(f"{label!r}: {e}")
+                    value = None
+                yield label, value
+        for name, pair in self.ac.items():
+            try:
+                values = pair.reading(self.adc, self.bit_rate)
+            except ConversionTimeout as e:
+                log.warning(f"{name!r}: {e}")
+                values = dict.fromkeys(QUANTITIES)
+            for quantity, value in values.items():
+                yield f"{name}_{quantity}", value
+        if self.adc:
+            self.transactions = self.adc.transactions - start
+
+    def metrics(self):
+        """i2c transactions made by the last complete read, and the totals for this device on the shared bus"""
+        result = {"i2c_transactions": self.transactions}
+        if self.i2c:
+            result.update(self.i2c.metrics())
+        return result
 
     def readings(self):
         return dict(self.read())
 
     def config(self):
-        result = {key: value for key, value in vars(self).items() if key not in ['adc', 'sensors']}
+        result = {key: value for key, value in vars(self).items() if key not in ['adc', 'sensors', 'filters', 'ac', 'paired', 'transactions', 'i2c']}
         result["device"] = "ADCPi"
         result['sensors'] = {label: sensor.config() for label, sensor in self.sensors.items()}
+        if self.ac:
+            result['ac'] = {name: pair.config() for name, pair in self.ac.items()}
         return result
 
     def __repr__(self):
@@ -132,6 +200,10 @@ class ADCDevice:
 ALLOWED_TYPES = ["voltage", "current"]
 
 class ADCSensor:
+    # defaults, only stored on the sensor (and so in its config) if they are configured
+    oversample = 1
+    filter = "boxcar"
+
     def __init__(self, impedance, **conf):
         try:
             channel = conf['channel']
@@ -159,6 +231,16 @@ class ADCSensor:
         except ValueError as e:
             raise ADCError(f'ref_channel for channel {self.channel!r}: expected integer')
 
+        if 'oversample' in conf:
+            try:
+                self.oversample = int(conf['oversample'])
+            except (TypeError, ValueError):
+                raise ADCError(f"oversample: {conf['oversample']!r} (expected integer)")
+            if self.oversample < 1:
+                raise ADCError(f"oversample: {self.oversample!r} must be at least 1")
+        if 'filter' in conf:
+            self.filter = conf['filter']
+
         self.type = type
 
         if type == "voltage":
@@ -178,14 +260,26 @@ class ADCSensor:
 
         log.debug(f"{self} created")
 
-    def reading(self, device):
+    def reading(self, device, smoother=None):
+        """
+        With oversampling, or a filter other than the default, a block of samples is read
+        the channel and ref_channel are sampled in turn so each sample has its own zero
+        """
         if not device:
             return None
-        raw = device.read_voltage(self.channel)
-        zero = self.zero_point
+        if self.oversample == 1 and self.filter == ADCSensor.filter:
+            raw = device.read_voltage(self.channel)
+            zero = self.zero_point
+            if self.ref_channel:
+                zero = device.read_voltage(self.ref_channel)
+            return (raw - zero) * self.sensitivity
+        smoother = smoother or get_filter(self.filter)
         if self.ref_channel:
-            zero = device.read_voltage(self.ref_channel)
-        return (raw - zero) * self.sensitivity
+            samples = device.read_voltage_array([self.channel, self.ref_channel], self.oversample)
+            values = samples[:, 0] - samples[:, 1]
+        else:
+            values = device.read_voltage_array(self.channel, self.oversample) - self.zero_point
+        return smoother(values) * self.sensitivity
 
     def config(self):
         """return config data for recreating me"""
@@ -200,3 +294,53 @@ class ADCSensor:
             return f"ADCSensor(channel {self.channel}: {self.type!r}, zero_point: {self.zero_point})"
         else:
             return f"ADCSensor(channel {self.channel}: {self.type!r}, input_resistance: {self.resistance})"
+
+
+ALLOWED_BIT_RATES = [12, 14, 16, 18]
+
+class ACPair:
+    """A voltage and a current sensor sampled together for RMS and power"""
+    def __init__(self, sensors, **conf):
+        try:
+            self.voltage = conf['voltage']
+            self.current = conf['current']
+        except KeyError as e:
+            raise ADCError(f"missing required field {e}")
+        for label, type in [(self.voltage, "voltage"), (self.current, "current")]:
+            if label not in sensors:
+                raise ADCError(f"{type}: {label!r} is not one of the sensors")
+            if sensors[label].type != type:
+                raise ADCError(f"{type}: {label!r} is a {sensors[label].type} sensor")
+        self.voltage_sensor = sensors[self.voltage]
+        self.current_sensor = sensors[self.current]
+        try:
+            self.samples = int(conf.get('samples', 240))
+        except (TypeError, ValueError):
+            raise ADCError(f"samples: {conf['samples']!r} (expected integer)")
+        if self.samples < 2:
+            raise ADCError(f"samples: {self.samples!r} must be at least 2")
+        self.bit_rate = conf.get('bit_rate', 12)
+        if self.bit_rate not in ALLOWED_BIT_RATES:
+            raise ADCError(f"bit_rate: {self.bit_rate!r} (try one of {ALLOWED_BIT_RATES})")
+        if (self.voltage_sensor.channel < 5) == (self.current_sensor.channel < 5):
+            log.warning(f"{self.voltage!r} and {self.current!r} are on the same chip, they can't be sampled together so real power will be inaccurate")
+
+    def reading(self, device, bit_rate):
+        """A burst of samples at this pair's bit rate, the device is returned to its own bit rate"""
+        if not device:
+            return dict.fromkeys(QUANTITIES)
+        if self.bit_rate != bit_rate:
+            device.set_bit_rate(self.bit_rate)
+        device.set_conversion_mode(1)
+        try:
+            samples = device.read_voltage_array([self.voltage_sensor.channel, self.current_sensor.channel], self.samples)
+        finally:
+            if self.bit_rate != bit_rate:
+                device.set_bit_rate(bit_rate)
+        return ac_power(samples[:, 0] * self.voltage_sensor.sensitivity, samples[:, 1] * self.current_sensor.sensitivity)
+
+    def config(self):
+        return {"voltage": self.voltage, "current": self.current, "samples": self.samples, "bit_rate": self.bit_rate}
+
+    def __repr__(self):
+        return f"ACPair({self.voltage!r}, {self.current!r}, {self.samples} samples at {self.bit_rate} bits)"
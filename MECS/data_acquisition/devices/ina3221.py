@@ -1,24 +1,60 @@
 """
 For managing an INA3221 thing
+
+All the registers needed by the data points are read in one pass on each read
+and every data point is calculated from that snapshot
+The chip can average its own conversions, set with e.g.
+    "averaging": 64, "bus_conversion_time": 1100, "shunt_conversion_time": 1100
+(conversion times in microseconds), only the channels with data points are enabled
 """
 
 import logging
 
 from ... import MECSConfigError, MECSHardwareError
-from ..INA3221 import SDL_Pi_INA3221
+from ..backends import get_i2c_bus
+from ..INA3221 import SDL_Pi_INA3221, INA3221_ADDRESS, SHUNT_RESISTOR_VALUE, INA3221_AVERAGING, INA3221_CONVERSION_TIMES
 
 log = logging.getLogger(__name__)
 
 class INA3221Error(MECSConfigError): pass
 
 class INA3221Device:
+    bus = "i2c"  # shared with other smbus devices for concurrent polling
+
     def __init__(self, hardware_required=True, **kwargs):
         """
         Ingest configuration data
         Raise MECSConfigError if anything is wrong
         """
+        data_points = kwargs['data_points']
+
+        self.data_points = {}
+        for key, config in data_points.items():
+            self.register(key, config)
+
+        self.averaging = kwargs.get('averaging', 16)
+        if self.averaging not in INA3221_AVERAGING:
+            raise INA3221Error(f"averaging: {self.averaging!r} (try one of {list(INA3221_AVERAGING)})")
+        self.bus_conversion_time = kwargs.get('bus_conversion_time', 1100)
+        self.shunt_conversion_time = kwargs.get('shunt_conversion_time', 1100)
+        for name in ['bus_conversion_time', 'shunt_conversion_time']:
+            if getattr(self, name) not in INA3221_CONVERSION_TIMES:
+                raise INA3221Error(f"{name}: {getattr(self, name)!r} (try one of {list(INA3221_CONVERSION_TIMES)} microseconds)")
+
+        # the registers needed for the snapshot
+        self.shunt_channels = sorted({dp.channel for dp in self.data_points.values() if dp.type != "busVoltage"})
+        self.bus_channels = sorted({dp.channel for dp in self.data_points.values() if dp.type == "busVoltage"})
+
+        self.i2c = None
         try:
-            self.device = SDL_Pi_INA3221()
+            self.i2c = get_i2c_bus(1).client(f"INA3221@{INA3221_ADDRESS:#x}")
+            self.device = SDL_Pi_INA3221(
+                averaging=self.averaging,
+                bus_conversion_time=self.bus_conversion_time,
+                shunt_conversion_time=self.shunt_conversion_time,
+                channels=sorted(set(self.shunt_channels) | set(self.bus_channels)),
+                bus=self.i2c
+            )
         except PermissionError:
             log.warning("Couldn't access INA3221")
             self.device = None
@@ -30,24 +66,23 @@ class INA3221Device:
             if hardware_required:
                 raise MECSHardwareError("Couldn't establish I/O with INA3221 - is it present?")
 
-        data_points = kwargs['data_points']
-
-        self.data_points = {}
-        for key, config in data_points.items():
-            self.register(key, config)
-
         log.debug(f"{self} created")
 
     def register(self, label, conf):
         self.data_points[label] = INA3221DataPoint(**conf)
 
     def read(self):
+        snapshot = self.device.snapshot(self.shunt_channels, self.bus_channels) if self.device else None
         for label, dp in self.data_points.items():
-            yield label, dp.read(self.device)
+            yield label, dp.read(snapshot)
     
     def readings(self):
         return dict(self.read())
 
+    def metrics(self):
+        """The totals for this device on the shared bus"""
+        return self.i2c.metrics() if self.i2c else {}
+
     def __repr__(self):
         data_points = ", ".join([f"{data_point.type}_{data_point.channel}: {label!r}" for label, data_point in self.data_points.items()])
         return f"INA3221({data_points})"
@@ -57,6 +92,8 @@ VALID_TYPES = ["current", "busVoltage", "shuntVoltage"]
 class INA3221DataPoint:
     def __init__(self, **kwargs):
         self.channel = kwargs['channel']
+        if self.channel not in [1, 2, 3]:
+            raise INA3221Error(f"channel: {self.channel!r} (try one of [1, 2, 3])")
         self.type = kwargs['type']
         if self.type not in VALID_TYPES:
             raise INA3221Error(f"Unknown type {self.type!r} (try one of {VALID_TYPES}")
@@ -69,19 +106,20 @@ class INA3221DataPoint:
         log.debug(f"{self} created")
 
 
-    def _busVoltage(self, sensor):
-        return sensor.getBusVoltage_V(self.channel)
+    def _busVoltage(self, shunt, bus):
+        return bus[self.channel]
 
-    def _shuntVoltage(self, sensor):
-        return sensor.getShuntVoltage_mV(self.channel) / 1000
+    def _shuntVoltage(self, shunt, bus):
+        return shunt[self.channel] / 1000
 
-    def _current(self, sensor):
+    def _current(self, shunt, bus):
         # removing 0.0056 offset based on calibration data
         offset = -0.0056
-        return (sensor.getCurrent_mA(self.channel) / 1000) + offset
+        return (shunt[self.channel] / SHUNT_RESISTOR_VALUE / 1000) + offset
 
-    def read(self, sensor):
-        return self.callables[self.type](sensor) if sensor else None
+    def read(self, snapshot):
+        """The value from a snapshot of the shunt and bus voltages (see SDL_Pi_INA3221.snapshot)"""
+        return self.callables[self.type](*snapshot) if snapshot else None
 
     def __repr__(self):
         return f"INA3221DataPoint(channel={self.channel!r}, type={self.type!r})"
@@ -0,0 +1,63 @@
+"""
+Digital filters for oversampled readings
+Each filter reduces an array of samples to a single value
+
+boxcar is the mean of the samples, median is robust to occasional spikes
+iir is an exponential moving average, carried over from one reading to the next
+"""
+
+import numpy as np
+
+from .. import MECSConfigError
+
+
+class Boxcar:
+    def __call__(self, samples):
+        return float(np.mean(samples))
+
+
+class Median:
+    def __call__(self, samples):
+        return float(np.median(samples))
+
+
+class IIR:
+    def __init__(self, alpha=0.2):
+        try:
+            self.alpha = float(alpha)
+        except (TypeError, ValueError):
+            raise MECSConfigError(f"alpha: {alpha!r} (expected float)")
+        if not 0 < self.alpha <= 1:
+            raise MECSConfigError(f"alpha: {alpha!r} must be greater than 0 and at most 1")
+        self.value = None
+
+    def __call__(self, samples):
+        samples = np.asarray(samples, dtype=float)
+        if self.value is None:
+            self.value = samples[0]
+        n = len(samples)
+        # y[k] = alpha * x[k] + (1 - alpha) * y[k-1], applied to the whole block at once
+        weights = self.alpha * (1 - self.alpha) ** np.arange(n - 1, -1, -1)
+        self.value = (1 - self.alpha) ** n * self.value + weights @ samples
+        return float(self.value)
+
+
+filters = {
+    # These string keys can be specified as the 'filter' for an ADC sensor in the devices config
+    "boxcar": Boxcar,
+    "median": Median,
+    "iir": IIR
+}
+
+def get_filter(spec):
+    """A filter from its config, either a name or a dict with a 'type' and any options"""
+    options = dict(spec) if isinstance(spec, dict) else {"type": spec}
+    name = options.pop("type", None)
+    try:
+        cls = filters[name]
+    except (KeyError, TypeError):
+        raise MECSConfigError(f"unsupported filter: {name!r} (try one of {list(filters)})")
+    try:
+        return cls(**options)
+    except TypeError as exc:
+        raise MECSConfigError(f"filter {name!r}: {exc}")
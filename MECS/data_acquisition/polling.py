@@ -0,0 +1,81 @@
+"""
+Concurrent polling of devices
+Each device is read in its own worker thread
+Devices which share a bus hold a lock for that bus while they are read, so they stay in order
+A device that misses its deadline reports None for its labels and is not polled again until it finishes
+"""
+
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import Lock
+from time import monotonic
+
+log = logging.getLogger(__name__)
+
+
+class DevicePoller:
+    def __init__(self, devices, labels, timeouts):
+        """
+        devices: {device_label: device}
+        labels: {device_label: [data labels produced by the device]}
+        timeouts: {device_label: deadline in seconds}
+        """
+        self.devices = devices
+        self.labels = labels
+        self.timeouts = timeouts
+        self.locks = {}
+        for device_label, device in devices.items():
+            bus = getattr(device, 'bus', device_label)
+            self.locks.setdefault(bus, Lock())
+        self.executor = ThreadPoolExecutor(max_workers=max(len(devices), 1), thread_name_prefix="poll")
+        self.busy = {}
+        self.missed = Counter()
+
+    def _lock(self, device_label):
+        return self.locks[getattr(self.devices[device_label], 'bus', device_label)]
+
+    def _read(self, device_label):
+        with self._lock(device_label):
+            return list(self.devices[device_label].read())
+
+    def _missing(self, device_label):
+        for label in self.labels[device_label]:
+            yield label, None
+
+    def read(self, device_labels=None):
+        """Read the given devices (by default all of them)"""
+        device_labels = list(self.devices) if device_labels is None else device_labels
+        start = monotonic()
+        futures = {}
+        for device_label in device_labels:
+            if device_label in self.busy:
+                if not self.busy[device_label].done():
+                    continue
+                del self.busy[device_label]
+            futures[device_label] = self.executor.submit(self._read, device_label)
+
+        for device_label in device_labels:
+            future = futures.get(device_label)
+            if not future:
+                self.missed[device_label] += 1
+                log.warning(f"[{device_label}] still busy from a previous read ({self.missed[device_label]} missed)")
+                yield from self._missing(device_label)
+                continue
+            remaining = start + self.timeouts[device_label] - monotonic()
+            try:
+                yield from future.result(timeout=max(remaining, 0))
+            except TimeoutError:
+                self.busy[device_label] = future
+                self.missed[device_label] += 1
+                log.warning(f"[{device_label}] missed its {self.timeouts[device_label]}s deadline ({self.missed[device_label]} missed)")
+                yield from self._missing(device_label)
+            except Exception as exc:
+                log.error(f"[{device_label}] read failed: {exc!r}")
+                yield from self._missing(device_label)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    def __repr__(self):
+        return f"DevicePoller({', '.join(self.devices.keys())})"
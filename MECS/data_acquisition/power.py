@@ -0,0 +1,35 @@
+"""
+RMS and power from a burst of simultaneous voltage and current samples
+
+The ADC Pi manages at most 240 samples per second (at 12 bits), a few samples per mains cycle.
+Because the sample rate isn't locked to the mains, samples fall at different points in each cycle
+so a burst spanning many cycles still gives good estimates of RMS and mean power.
+Voltage and current should be on different chips (channels 1-4 and 5-8) so each pair is converted together.
+"""
+
+import numpy as np
+
+QUANTITIES = ["vrms", "irms", "real_power", "apparent_power", "power_factor"]
+
+
+def ac_power(voltage, current):
+    """
+    voltage and current are equal length arrays of samples, in volts and amps
+    the mean of each (i.e. any DC offset) is removed
+    returns a dict of the QUANTITIES, power_factor is None if there is no power
+    """
+    v = np.asarray(voltage, dtype=float)
+    i = np.asarray(current, dtype=float)
+    v = v - v.mean()
+    i = i - i.mean()
+    vrms = float(np.sqrt(np.mean(v * v)))
+    irms = float(np.sqrt(np.mean(i * i)))
+    real_power = float(np.mean(v * i))
+    apparent_power = vrms * irms
+    return {
+        "vrms": vrms,
+        "irms": irms,
+        "real_power": real_power,
+        "apparent_power": apparent_power,
+        "power_factor": real_power / apparent_power if apparent_power else None
+    }
@@ -1,7 +1,8 @@
 """This module provides an abstraction for the SDS011 air partuclate densiry sensor.
 """
 import struct
-import serial
+
+from ..backends import open_serial
 
 #TODO: Commands against the sensor should read the reply and return success status.
 
@@ -37,9 +38,7 @@ class SDS011(object):
                  use_query_mode=True):
         """Initialise and open serial port.
         """
-        self.ser = serial.Serial(port=serial_port,
-                                 baudrate=baudrate,
-                                 timeout=timeout)
+        self.ser = open_serial(serial_port, baudrate, timeout=timeout)
         self.ser.flush()
         self.set_report_mode(active=not use_query_mode)
 
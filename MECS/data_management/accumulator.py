@@ -0,0 +1,109 @@
+"""
+Streaming accumulation of readings
+Each channel keeps a running count, mean, min, max and variance (Welford)
+so memory use depends on the number of channels, not the number of readings
+A reducer turns the accumulated state into the flat dict written each minute
+"""
+
+import logging
+import math
+
+log = logging.getLogger(__name__)
+
+
+def as_float(value):
+    """Convert a reading to a float, returning None for missing or unusable values"""
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(value):
+        return None
+    return value
+
+
+class ChannelAccumulator:
+    """Running statistics for a single channel"""
+    def __init__(self):
+        self.samples = 0  # all readings, including failures
+        self.count = 0    # valid readings only
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.samples += 1
+        value = as_float(value)
+        if value is None:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def std(self):
+        """sample standard deviation, None with fewer than two valid readings"""
+        if self.count < 2:
+            return None
+        return math.sqrt(self.m2 / (self.count - 1))
+
+    def result(self):
+        return self.mean if self.count else None
+
+    def __repr__(self):
+        return f"ChannelAccumulator(count={self.count}, samples={self.samples}, mean={self.result()})"
+
+
+class MinuteAccumulator:
+    """Accumulates reading dicts channel by channel"""
+    def __init__(self):
+        self.channels = {}
+
+    def add(self, data):
+        for label, value in data.items():
+            try:
+                channel = self.channels[label]
+            except KeyError:
+                channel = self.channels[label] = ChannelAccumulator()
+            channel.add(value)
+
+    def reset(self):
+        self.channels = {}
+
+    def __len__(self):
+        return max([c.samples for c in self.channels.values()], default=0)
+
+    def __repr__(self):
+        return f"MinuteAccumulator({', '.join(self.channels.keys())})"
+
+
+def mean(accumulator):
+    """The mean of each channel, None where no valid readings were taken"""
+    return {label: channel.result() for label, channel in accumulator.channels.items()}
+
+
+def stats(accumulator):
+    """The mean of each channel plus min, max, std and valid reading count"""
+    result = {}
+    for label, channel in accumulator.channels.items():
+        result[label] = channel.result()
+        result[f"{label}_min"] = channel.min
+        result[f"{label}_max"] = channel.max
+        result[f"{label}_std"] = channel.std
+        result[f"{label}_count"] = channel.count
+    return result
+
+
+reducers = {
+    # These string keys can be specified as the 'reducer' in the config file
+    "mean": mean,
+    "stats": stats
+}
@@ -3,6 +3,17 @@ This is for preparing data for upload,
 it should be scheduled to run every hour,
 it merges the available files into one file per day
 and saves it in a folder ready for uploading.
+
+Aggregation is incremental, a watermark is kept for each day
+recording the last minutely file and the offset in each segment file already ingested
+so each run only parses new records and appends them to an append-only working store for the day
+(<aggregated>/.incremental/<day>.rows.jsonl), which is kept because uploaded files are moved away.
+The cost of a run depends only on the new records.
+Building a day's file reads the whole of its store, so it is done by build() when the files are needed,
+i.e. before uploading and once more when a past day is archived, rather than on every run.
+
+In the same process as the generator (e.g. mecs-daemon), records can be handed over in a RecordFeed
+and are used instead of re-reading the segment file, as long as they carry on from the watermark.
 """
 from datetime import datetime
 import glob
@@ -11,67 +22,236 @@ import os.path
 import shutil
 import tarfile
 import logging
+import threading
 
 import pandas as pd
 
+from .storage import SEGMENT_SUFFIX, read_segment, recover, serialise
+from .formats import JSONFormat
+
 log = logging.getLogger(__name__)
 
+WORKING_FOLDER = ".incremental"
+STATE_FILE = "state.json"
+STORE_SUFFIX = ".rows.jsonl"
+
 def make_archive_file(output_filename, source_dir):
     """converts a folder full of minutely json files into a single, compressed archive file"""
     with tarfile.open(output_filename, "w:gz") as tar:
         tar.add(source_dir, arcname=os.path.basename(source_dir))
 
-def aggregate(source_folder, destination_folder):
+def load_state(working_folder):
+    path = os.path.join(working_folder, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except json.decoder.JSONDecodeError as exc:
+        log.warning(exc)
+        log.warning(f"ignoring corrupted aggregation state {path}, days will be aggregated in full")
+        return {}
+
+def save_state(working_folder, state):
+    path = os.path.join(working_folder, STATE_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+class RecordFeed:
+    """
+    Records written to segment files, kept in memory until the aggregator takes them
+    For each day we keep the segment name, the offsets it spans and the records
+    """
+    def __init__(self):
+        self.days = {}
+        self.lock = threading.Lock()
+
+    def add(self, data, path, start, end):
+        folder = os.path.basename(os.path.dirname(path))
+        segment = os.path.basename(path)
+        with self.lock:
+            day = self.days.get(folder)
+            if not day or day['segment'] != segment or day['end'] != start:
+                day = self.days[folder] = {'segment': segment, 'start': start, 'end': start, 'records': []}
+            day['records'].append(serialise(data))
+            day['end'] = end
+
+    def take(self, folder):
+        with self.lock:
+            return self.days.pop(folder, None)
+
+
+def aggregate(source_folder, destination_folder, fmt=None, feed=None, build=True):
     """
     Converts minutely files for a day into a single file
-    Creates an aggregated file in the destination directory for each folder in the source directory
+    New records for each folder in the source directory are added to its working store
+    and, with build=True, an aggregated file is written in the destination directory for each folder with new data
+    The aggregated files are written in the given format (default json)
+    Records in the feed are used in place of reading them from disk where possible
     """
-    os.makedirs(destination_folder, exist_ok=True)
+    fmt = fmt or JSONFormat()
+    working_folder = os.path.join(destination_folder, WORKING_FOLDER)
+    os.makedirs(working_folder, exist_ok=True)
+    state = load_state(working_folder)
+    today = datetime.utcnow().strftime("%Y%m%d")
     folders = sorted(next(os.walk(source_folder))[1])
     for folder in folders:
         source_path = os.path.join(source_folder, folder)
-        aggregated_path = os.path.join(destination_folder, f"{folder}.json")
-        df = aggregate_folder(source_path)
-        log.info(f"writing to {aggregated_path}")
-        df.to_json(aggregated_path, orient="split", date_format="iso")
+        store_path = os.path.join(working_folder, f"{folder}{STORE_SUFFIX}")
+
+        watermark = state.get(folder, {})
+        if watermark and not os.path.exists(store_path):
+            log.warning(f"working store {store_path} is missing, aggregating {folder} in full")
+            watermark = {}
+        fed = feed.take(folder) if feed else None
+        if fed and fed_records_are_new(source_path, watermark, fed):
+            log.debug(f"using {len(fed['records'])} records from memory for {source_path}")
+            records = fed['records']
+            new_watermark = {'file': watermark.get('file', ''), 'segments': {**watermark.get('segments', {}), fed['segment']: fed['end']}}
+        else:
+            records, new_watermark = read_new_records(source_path, watermark)
+        if records:
+            log.debug(f"{len(records)} new records found in {source_path}")
+            # starting in full replaces anything already in the store
+            append_records(store_path, records, replace=not watermark)
+            state[folder] = {**new_watermark, 'built': False}
+            save_state(working_folder, state)
+        else:
+            log.debug(f"no new records in {source_path}")
 
         # archiving when the data is from before today
-        today = datetime.utcnow().strftime("%Y%m%d")
         if(folder < today):
+            if not state.get(folder, {}).get('built', True):
+                build_day(working_folder, destination_folder, folder, fmt)
             archive_path = os.path.join(source_folder, f"{folder}.tar.gz")
             log.info(f"archiving {source_path} to {archive_path}")
             make_archive_file(archive_path, source_path)
             log.info(f"deleting original {source_path}")
             shutil.rmtree(source_path)
+            # (and the working copy kept by earlier versions)
+            for path in [store_path, os.path.join(working_folder, f"{folder}{fmt.extension}")]:
+                if os.path.exists(path):
+                    os.remove(path)
+            state.pop(folder, None)
+            save_state(working_folder, state)
 
+    if build:
+        build_days(destination_folder, fmt)
 
-def aggregate_folder(folder):
-    """This does the aggregation job, merging the files into one dataframe"""
-    files = sorted(glob.glob(os.path.join(folder, "*.json")))
-    if not len(files):
-        log.warning(f"No *.json files found in {folder}")
+
+def append_records(store_path, records, replace=False):
+    """Append records to a day's working store, one json line each"""
+    if not replace:
+        # a run interrupted while appending leaves an incomplete line
+        recover(store_path)
+    with open(store_path, "w" if replace else "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+def build_day(working_folder, destination_folder, folder, fmt):
+    """Write the aggregated file for a day from the whole of its working store"""
+    store_path = os.path.join(working_folder, f"{folder}{STORE_SUFFIX}")
+    aggregated_path = os.path.join(destination_folder, f"{folder}{fmt.extension}")
+    records = [record for record, _ in read_segment(store_path)]
+    if not records:
         return
-    log.debug(f"{len(files)} *.json files found in {folder}")
+    temp_path = os.path.join(working_folder, f"{folder}.tmp{fmt.extension}")
+    fmt.write(to_frame(records), temp_path)
+    log.info(f"writing to {aggregated_path}")
+    os.replace(temp_path, aggregated_path)
+
+def build_days(destination_folder, fmt=None):
+    """
+    Write the aggregated file for each day with records added since it was last built
+    This reads each of those days in full, so it is called when the files are needed (e.g. before uploading)
+    """
+    fmt = fmt or JSONFormat()
+    working_folder = os.path.join(destination_folder, WORKING_FOLDER)
+    state = load_state(working_folder)
+    for folder, watermark in state.items():
+        if watermark.get('built', True):
+            continue
+        build_day(working_folder, destination_folder, folder, fmt)
+        watermark['built'] = True
+        save_state(working_folder, state)
 
-    # read them into an array
+
+def read_new_records(folder, watermark):
+    """
+    Reads the records in a folder which are beyond the watermark
+    The watermark holds the name of the last minutely file read
+    and the offset reached in each segment file
+    Returns the new records and the updated watermark
+    """
+    last_file = watermark.get('file', '')
+    offsets = dict(watermark.get('segments', {}))
     result = []
-    for filename in files:
-        try:
-            with open(filename, 'r') as f:
-                data = json.load(f)
-        except json.decoder.JSONDecodeError as exc:
-            log.warning(exc)
-            log.warning(f"skipping {filename}")
+    for segment in sorted(glob.glob(os.path.join(folder, f"*{SEGMENT_SUFFIX}"))):
+        name = os.path.basename(segment)
+        offset = offsets.get(name, 0)
+        if offset > os.path.getsize(segment):
+            log.warning(f"{segment} is shorter than its watermark, reading from the start")
+            offset = 0
+        for record, offset in read_segment(segment, offset):
+            result.append(record)
+        offsets[name] = offset
+    for filename in sorted(glob.glob(os.path.join(folder, "*.json"))):
+        name = os.path.basename(filename)
+        if name <= last_file:
             continue
-        result.append(data)
-        # TODO: move file into temporary folder ready for deletion/archive?
+        data = read_minutely_file(filename)
+        if data is not None:
+            result.append(data)
+        last_file = name
+    return result, {'file': last_file, 'segments': offsets}
+
+def fed_records_are_new(folder, watermark, fed):
+    """
+    Records from a feed can be used if they start at the watermark
+    and run to the end of their segment, with no other new data in the folder
+    """
+    offsets = watermark.get('segments', {})
+    if offsets.get(fed['segment'], 0) != fed['start']:
+        return False
+    for segment in glob.glob(os.path.join(folder, f"*{SEGMENT_SUFFIX}")):
+        name = os.path.basename(segment)
+        expected = fed['end'] if name == fed['segment'] else offsets.get(name, 0)
+        if os.path.getsize(segment) != expected:
+            return False
+    last_file = watermark.get('file', '')
+    return all(os.path.basename(f) <= last_file for f in glob.glob(os.path.join(folder, "*.json")))
 
-    # convert the array into a pandas dataframe
-    df = pd.DataFrame(result)
+def read_minutely_file(filename):
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except json.decoder.JSONDecodeError as exc:
+        log.warning(exc)
+        log.warning(f"skipping {filename}")
 
-    # add the datetime index and sort
+def to_frame(records):
+    """
+    convert an array of records into a pandas dataframe with a sorted datetime index
+    later records replace any earlier ones with the same timestamp
+    """
+    df = pd.DataFrame(records)
     df['dt'] = pd.to_datetime(df['dt'])
     df.set_index("dt", inplace=True)
+    df = df[~df.index.duplicated(keep='last')]
     df.sort_index(inplace=True)
-
     return df
+
+def aggregate_folder(folder):
+    """
+    This does the aggregation job, merging the files into one dataframe
+    Handles both segment files and individual minutely files
+    """
+    segments = sorted(glob.glob(os.path.join(folder, f"*{SEGMENT_SUFFIX}")))
+    files = sorted(glob.glob(os.path.join(folder, "*.json")))
+    if not len(files) and not len(segments):
+        log.warning(f"No *.json or *{SEGMENT_SUFFIX} files found in {folder}")
+        return
+    log.debug(f"{len(segments)} *{SEGMENT_SUFFIX} and {len(files)} *.json files found in {folder}")
+    records, _ = read_new_records(folder, {})
+    return to_frame(records)
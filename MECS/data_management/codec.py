@@ -0,0 +1,173 @@
+"""
+A compact encoding of aggregated time-series for upload over GPRS
+
+Timestamps are stored as a start and a fixed step, with a residual for any row that is off the step
+Each channel is quantised to its configured precision, i.e. stored as round(value / precision)
+Missing values (and infinities, which can't be quantised) are recorded in a bitmap and the remaining integers are delta-of-delta encoded
+so slowly changing channels become runs of small numbers.
+All integers are zigzag varints and the whole payload is compressed with gzip (or zstd, if installed)
+
+The format is self-describing, decode() needs nothing but the bytes
+"""
+
+import gzip
+import json
+import logging
+import struct
+
+import numpy as np
+import pandas as pd
+
+from .. import MECSError
+
+log = logging.getLogger(__name__)
+
+class CodecError(MECSError): pass
+
+MAGIC = b"MECZ"
+VERSION = 1
+DEFAULT_PRECISION = 0.001
+
+GZIP = 0
+ZSTD = 1
+
+
+def zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+def unzigzag(values):
+    values = np.asarray(values, dtype=np.uint64)
+    return ((values >> np.uint64(1)).astype(np.int64)) ^ -((values & np.uint64(1)).astype(np.int64))
+
+def write_varints(values, out):
+    for value in zigzag(values).tolist():
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+def read_varints(buffer, offset, n):
+    result = []
+    for _ in range(n):
+        value, shift = 0, 0
+        while True:
+            byte = buffer[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        result.append(value)
+    return unzigzag(np.array(result, dtype=np.uint64)), offset
+
+def delta_of_delta(values):
+    return np.diff(np.diff(values, prepend=0), prepend=0)
+
+def undo_delta_of_delta(values):
+    return np.cumsum(np.cumsum(values))
+
+
+def compress(payload, compression):
+    if compression == ZSTD:
+        import zstandard
+        return zstandard.ZstdCompressor(level=19).compress(payload)
+    return gzip.compress(payload, compresslevel=9)
+
+def decompress(payload, compression):
+    if compression == ZSTD:
+        try:
+            import zstandard
+        except ImportError:
+            raise CodecError("data is zstd compressed, the zstandard package is required to decode it")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return gzip.decompress(payload)
+
+def get_precision(precision, column, default_precision):
+    """precision for a column, names are also matched in lower case as they come from a config file"""
+    return float(precision.get(column, precision.get(column.lower(), default_precision)))
+
+
+def encode(df, precision=None, default_precision=DEFAULT_PRECISION, compression=GZIP):
+    """
+    Encode a dataframe with a datetime index
+    precision maps column names to the quantisation step for that column
+    """
+    precision = precision or {}
+    timestamps = df.index.values.astype("datetime64[s]").astype(np.int64)
+    steps = np.diff(timestamps)
+    step = int(np.median(steps)) if len(steps) else 0
+    start = int(timestamps[0]) if len(timestamps) else 0
+
+    columns = [str(c) for c in df.columns]
+    precisions = [get_precision(precision, c, default_precision) for c in columns]
+    header = json.dumps({
+        "start": start,
+        "step": step,
+        "rows": len(df),
+        "columns": columns,
+        "precision": precisions
+    }).encode()
+
+    body = bytearray()
+    write_varints(np.diff(timestamps, prepend=start - step) - step, body)
+    values = df.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    for i, p in enumerate(precisions):
+        column = values[:, i]
+        present = np.isfinite(column)
+        body.extend(np.packbits(present).tobytes())
+        write_varints(delta_of_delta(np.round(column[present] / p).astype(np.int64)), body)
+
+    payload = struct.pack("<I", len(header)) + header + bytes(body)
+    return MAGIC + bytes([VERSION, compression]) + compress(payload, compression)
+
+def decode(data):
+    """Decode bytes produced by encode() into a dataframe"""
+    if data[:4] != MAGIC:
+        raise CodecError("not MECS encoded data")
+    version, compression = data[4], data[5]
+    if version != VERSION:
+        raise CodecError(f"unsupported version {version}")
+    payload = decompress(data[6:], compression)
+    header_length, = struct.unpack_from("<I", payload)
+    header = json.loads(payload[4:4 + header_length])
+    offset = 4 + header_length
+    rows = header['rows']
+
+    residuals, offset = read_varints(payload, offset, rows)
+    timestamps = header['start'] - header['step'] + np.cumsum(residuals + header['step'])
+
+    values = np.full((rows, len(header['columns'])), np.nan)
+    bitmap_length = (rows + 7) // 8
+    for i, p in enumerate(header['precision']):
+        present = np.unpackbits(np.frombuffer(payload, dtype=np.uint8, count=bitmap_length, offset=offset), count=rows).astype(bool)
+        offset += bitmap_length
+        quantised, offset = read_varints(payload, offset, int(present.sum()))
+        values[present, i] = undo_delta_of_delta(quantised) * p
+
+    index = pd.DatetimeIndex(pd.to_datetime(timestamps, unit="s"), name="dt")
+    return pd.DataFrame(values, index=index, columns=header['columns'])
+
+def verify(df, data, precision=None, default_precision=DEFAULT_PRECISION):
+    """
+    Check that encoded data decodes to the original within the quantisation error
+    Raises CodecError if not
+    """
+    precision = precision or {}
+    decoded = decode(data)
+    expected = df.index.values.astype("datetime64[s]")
+    if not np.array_equal(decoded.index.values.astype("datetime64[s]"), expected):
+        raise CodecError("timestamps do not match")
+    if list(decoded.columns) != [str(c) for c in df.columns]:
+        raise CodecError("columns do not match")
+    original = df.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    for i, column in enumerate(decoded.columns):
+        tolerance = get_precision(precision, column, default_precision) * (0.5 + 1e-6)
+        a, b = original[:, i], decoded[column].to_numpy()
+        if not np.array_equal(~np.isfinite(a), np.isnan(b)):
+            raise CodecError(f"missing values do not match in {column!r}")
+        present = np.isfinite(a)
+        error = np.abs(a[present] - b[present])
+        if len(error) and error.max() > tolerance + 1e-9 * np.abs(a[present]).max():
+            raise CodecError(f"{column!r} differs by {error.max()}, more than half its precision")
+    return decoded
@@ -0,0 +1,167 @@
+"""
+File formats for aggregated data
+Each format can write a dataframe (with a datetime index) to a file and read it back
+
+json is the original, verbose format
+The binary formats store channels as float32 and timestamps as int64 seconds since the epoch
+npz uses only numpy, parquet and feather require pyarrow to be installed
+mecz is the quantised, compressed encoding from MECS.data_management.codec, the smallest for upload
+"""
+
+import logging
+import os.path
+
+import numpy as np
+import pandas as pd
+
+from .. import MECSConfigError
+from . import codec
+
+log = logging.getLogger(__name__)
+
+
+def to_columns(df):
+    """int64 epoch seconds and float32 values from a dataframe"""
+    dt = df.index.values.astype("datetime64[s]").astype(np.int64)
+    values = df.apply(pd.to_numeric, errors="coerce").astype(np.float32)
+    return dt, values
+
+def from_columns(dt, values, columns):
+    index = pd.DatetimeIndex(pd.to_datetime(dt, unit="s"), name="dt")
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+class JSONFormat:
+    name = "json"
+    extension = ".json"
+
+    def write(self, df, path):
+        df.to_json(path, orient="split", date_format="iso")
+
+    def read(self, path):
+        return pd.read_json(path, orient="split")
+
+
+class NumpyFormat:
+    name = "npz"
+    extension = ".npz"
+
+    def write(self, df, path):
+        dt, values = to_columns(df)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, dt=dt, values=values.to_numpy(), columns=np.array(df.columns, dtype=str))
+
+    def read(self, path):
+        with np.load(path) as data:
+            return from_columns(data['dt'], data['values'], list(data['columns']))
+
+
+class ArrowFormat:
+    """Common code for the pyarrow-based formats"""
+    def __init__(self):
+        try:
+            import pyarrow
+        except ImportError:
+            raise MECSConfigError(f"aggregated_format {self.name!r} requires pyarrow, install it or choose another format")
+
+    def to_table(self, df):
+        dt, values = to_columns(df)
+        values.insert(0, "dt", dt)
+        return values.reset_index(drop=True)
+
+    def from_table(self, table):
+        dt = table.pop("dt").to_numpy()
+        return from_columns(dt, table.to_numpy(), list(table.columns))
+
+
+class ParquetFormat(ArrowFormat):
+    name = "parquet"
+    extension = ".parquet"
+
+    def write(self, df, path):
+        self.to_table(df).to_parquet(path, engine="pyarrow", index=False)
+
+    def read(self, path):
+        return self.from_table(pd.read_parquet(path, engine="pyarrow"))
+
+
+class FeatherFormat(ArrowFormat):
+    name = "feather"
+    extension = ".feather"
+
+    def write(self, df, path):
+        self.to_table(df).to_feather(path)
+
+    def read(self, path):
+        return self.from_table(pd.read_feather(path))
+
+
+class CodecFormat:
+    name = "mecz"
+    extension = ".mecz"
+
+    def __init__(self, precision=None, default_precision=codec.DEFAULT_PRECISION, compression=codec.GZIP):
+        self.precision = precision or {}
+        self.default_precision = default_precision
+        self.compression = compression
+
+    def write(self, df, path):
+        data = codec.encode(df, self.precision, self.default_precision, self.compression)
+        codec.verify(df, data, self.precision, self.default_precision)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return codec.decode(f.read())
+
+
+formats = {
+    # These string keys can be specified as the 'aggregated_format' in the config file
+    "json": JSONFormat,
+    "npz": NumpyFormat,
+    "parquet": ParquetFormat,
+    "feather": FeatherFormat,
+    "mecz": CodecFormat
+}
+
+extensions = [f.extension for f in formats.values()]
+
+
+def get_format(name, **options):
+    try:
+        return formats[name](**options)
+    except KeyError:
+        raise MECSConfigError(f"aggregated_format {name!r} is not supported, try one of [{', '.join(formats.keys())}]")
+
+def format_for_path(path):
+    _, ext = os.path.splitext(path)
+    for fmt in formats.values():
+        if fmt.extension == ext:
+            return fmt()
+    raise MECSConfigError(f"{path} is not a known aggregated data format")
+
+def read_aggregated(path):
+    """Read any aggregated data file, the format is chosen by the file extension"""
+    return format_for_path(path).read(path)
+
+def convert(path, fmt, remove=False):
+    """
+    Convert an aggregated file into the given format
+    The original is only removed once the new file has been read back successfully
+    Returns the path of the new file
+    """
+    name, _ = os.path.splitext(path)
+    new_path = f"{name}{fmt.extension}"
+    if new_path == path:
+        return path
+    df = read_aggregated(path)
+    fmt.write(df, new_path)
+    check = fmt.read(new_path)
+    if check.shape != df.shape or not check.index.equals(df.index):
+        raise MECSConfigError(f"conversion of {path} to {fmt.name} could not be verified")
+    log.info(f"converted {path} to {new_path}")
+    if remove:
+        os.remove(path)
+        log.debug(f"removed {path}")
+    return new_path
@@ -1,31 +1,31 @@
 """
 This is the high level source of data,
 a long-running process
-It generates a file on disk every minute
-Files are saved into folders generated in the specified location
+It writes a record to disk every minute
+Records are saved into folders generated in the specified location
 Each new day is given a new folder
+By default each day's records are appended to a single segment file
 """
 
-import os.path
-import json
 import logging
 
 from .minutely import aggregated_minutely_readings
+from .accumulator import mean
+from .storage import SegmentStore
 
 log = logging.getLogger(__name__)
 
-def generate(output_folder, get_data):
-    """A long-running process, infinitely generating data until it is stopped"""
-    log.info(f"Writing data files to {output_folder}")
-    for data in aggregated_minutely_readings(get_data, delay=1):
-        folder = data['dt'].strftime("%Y%m%d")
-        os.makedirs(os.path.join(output_folder, folder), exist_ok=True)
-        filename = data['dt'].strftime("%Y%m%d%H%M.json")
-        path = os.path.join(output_folder, folder, filename)
-        if data['dt'].minute == 0:
-            log.info(f"writing {path}")
-        else:
-            log.debug(f"writing {path}")
-        data['dt'] = data['dt'].isoformat()
-        with open(path, "x") as f:
-            json.dump(data, f)
+def generate(output_folder, get_data, reducer=mean, delay=1, store=None, killer=None, on_record=None):
+    """
+    A long-running process, infinitely generating data until it is stopped
+    on_record is called with each record and the value returned by store.write
+    """
+    store = store or SegmentStore(output_folder)
+    log.info(f"Writing data to {output_folder} using {store}")
+    try:
+        for data in aggregated_minutely_readings(get_data, delay=delay, reducer=reducer, killer=killer):
+            position = store.write(data)
+            if on_record:
+                on_record(data, position)
+    finally:
+        store.close()
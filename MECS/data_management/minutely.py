@@ -1,15 +1,16 @@
 """
 A generator function with an infinite loop.
-We grab data continuously, with the given delay
+We grab data continuously, on a fixed schedule with the given delay
 Accumulate readings for a minute
-Yield the average data at the end of each minute
+Yield the reduced data (by default the average) at the end of each minute
+along with statistics on how well the schedule was kept
 """
 
 import logging
 import signal
-from time import sleep
 
-import pandas as pd
+from .accumulator import MinuteAccumulator, mean
+from .schedule import DeadlineScheduler
 
 log = logging.getLogger(__name__)
 
@@ -30,21 +31,31 @@ class GracefulKiller:
         self.kill_now = True
 
 
-def aggregated_minutely_readings(get_readings, delay=1):
-    killer = GracefulKiller()
-    data = []
-    last_minute = get_readings()['dt'].replace(second=0, microsecond=0)
-    log.info(f"Initialising data collection at {last_minute}")
+def aggregated_minutely_readings(get_readings, delay=1, reducer=mean, scheduler=None, killer=None):
+    """
+    Readings are allocated to the minute in which they were scheduled
+    so a minute is closed at the first slot after the boundary, however long the previous read took
+    A killer can be shared with other parts of a process so they all stop together
+    """
+    killer = killer or GracefulKiller()
+    accumulator = MinuteAccumulator()
+    scheduler = scheduler or DeadlineScheduler(delay)
+    last_minute = None
     while not killer.kill_now:
-        readings = get_readings()
-        log.debug(f"reading taken at {readings['dt']}")
-        if last_minute != readings['dt'].replace(second=0, microsecond=0):
-            result = pd.DataFrame(data).mean().to_dict()
+        minute = scheduler.wait().replace(second=0, microsecond=0)
+        if last_minute is None:
+            log.info(f"Initialising data collection at {minute}")
+            last_minute = minute
+        if last_minute != minute:
+            result = reducer(accumulator)
+            result.update(scheduler.stats())
             result['dt'] = last_minute
             log.debug(f"minutely output: {result}")
             yield result
-            data = []
-            last_minute = readings['dt'].replace(second=0, microsecond=0)
-        data.append(readings['data'])
-        sleep(delay)
+            accumulator.reset()
+            scheduler.reset()
+            last_minute = minute
+        readings = get_readings()
+        log.debug(f"reading taken at {readings['dt']}")
+        accumulator.add(readings['data'])
     log.info("Infinite loop was ended gracefully :)")
@@ -0,0 +1,90 @@
+"""
+Deadline-based pacing for the sampling loop
+Sample times are fixed on a grid of the monotonic clock
+so time spent reading the sensors doesn't accumulate as drift
+Slots which are missed entirely (a very slow read) are skipped and counted
+"""
+
+import logging
+from datetime import datetime
+from time import monotonic, sleep
+
+from .accumulator import ChannelAccumulator
+
+log = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    def __init__(self, period=1, clock=monotonic, sleep=sleep, wall_clock=datetime.utcnow):
+        if period <= 0:
+            raise ValueError(f"period must be positive, not {period!r}")
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+        self.wall_clock = wall_clock
+        self.next_deadline = None
+        self.pending = None
+        self.reset()
+
+    def reset(self):
+        """Start a new window of statistics"""
+        self.window_start = self.clock()
+        self.samples = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.lateness = ChannelAccumulator()
+
+    def commit(self):
+        """
+        Add the previous slot to the window statistics
+        This is deferred until the next call to wait so that the slot which
+        crosses a window boundary is counted in the window it starts
+        """
+        if self.pending is None:
+            return
+        lateness, overran, missed = self.pending
+        self.lateness.add(lateness)
+        self.samples += 1
+        self.overruns += overran
+        self.skipped += missed
+        self.pending = None
+
+    def wait(self):
+        """
+        Block until the next sample deadline
+        Returns the wall-clock time of the slot
+        """
+        now = self.clock()
+        overran, missed = False, 0
+        if self.next_deadline is None:
+            self.next_deadline = now
+        elif now <= self.next_deadline:
+            self.sleep(self.next_deadline - now)
+            now = self.clock()
+        else:
+            # the previous sample overran its slot
+            overran = True
+            missed = int((now - self.next_deadline) // self.period)
+            if missed:
+                log.debug(f"sampling overran, skipping {missed} slot(s)")
+                self.next_deadline += missed * self.period
+        self.commit()
+        self.pending = (now - self.next_deadline, overran, missed)
+        self.next_deadline += self.period
+        return self.wall_clock()
+
+    def stats(self):
+        """Summary of the current window, suitable for adding to the minutely output"""
+        elapsed = self.clock() - self.window_start
+        std = self.lateness.std
+        return {
+            "sched_samples": self.samples,
+            "sched_rate": self.samples / elapsed if elapsed > 0 else None,
+            "sched_jitter_ms": std * 1000 if std is not None else None,
+            "sched_max_late_ms": self.lateness.max * 1000 if self.lateness.max is not None else None,
+            "sched_overruns": self.overruns,
+            "sched_skipped": self.skipped
+        }
+
+    def __repr__(self):
+        return f"DeadlineScheduler(period={self.period!r})"
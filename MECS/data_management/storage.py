@@ -0,0 +1,142 @@
+"""
+Storage backends for the minutely data
+Each day is given a new folder in the output folder
+
+SegmentStore appends each minute as a line of json to a single file per day
+Data are flushed to the OS on every write and fsync'd in batches
+A partial line left at the end of a segment (e.g. by a power cut) is removed before appending
+
+MinuteFileStore is the original layout, with one json file per minute
+"""
+
+import os
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl"
+
+
+def day_folder(output_folder, dt):
+    return os.path.join(output_folder, dt.strftime("%Y%m%d"))
+
+def serialise(data):
+    data = dict(data)
+    data['dt'] = data['dt'].isoformat()
+    return data
+
+
+class MinuteFileStore:
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+
+    def write(self, data):
+        folder = day_folder(self.output_folder, data['dt'])
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, data['dt'].strftime("%Y%m%d%H%M.json"))
+        if data['dt'].minute == 0:
+            log.info(f"writing {path}")
+        else:
+            log.debug(f"writing {path}")
+        with open(path, "x") as f:
+            json.dump(serialise(data), f)
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return f"MinuteFileStore({self.output_folder!r})"
+
+
+class SegmentStore:
+    def __init__(self, output_folder, fsync_every=10):
+        self.output_folder = output_folder
+        self.fsync_every = fsync_every
+        self.day = None
+        self.file = None
+        self.unsynced = 0
+
+    def path(self, dt):
+        return os.path.join(day_folder(self.output_folder, dt), dt.strftime(f"%Y%m%d{SEGMENT_SUFFIX}"))
+
+    def open(self, dt):
+        path = self.path(dt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        recover(path)
+        log.info(f"appending to {path}")
+        self.file = open(path, "ab")
+        self.day = dt.date()
+
+    def write(self, data):
+        """Returns the path of the segment and the offsets of the start and end of the record"""
+        if data['dt'].date() != self.day:
+            self.close()
+            self.open(data['dt'])
+        line = (json.dumps(serialise(data)) + "\n").encode()
+        start = self.file.tell()
+        self.file.write(line)
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            self.sync()
+        if data['dt'].minute == 0:
+            log.info(f"appended {data['dt']} to {self.file.name}")
+        else:
+            log.debug(f"appended {data['dt']} to {self.file.name}")
+        return self.file.name, start, start + len(line)
+
+    def sync(self):
+        if self.file:
+            os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def close(self):
+        if self.file:
+            self.sync()
+            self.file.close()
+        self.file = None
+        self.day = None
+
+    def __repr__(self):
+        return f"SegmentStore({self.output_folder!r}, fsync_every={self.fsync_every!r})"
+
+
+def recover(path, chunk_size=4096):
+    """Truncate any incomplete record from the end of a segment file"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(position - chunk_size, 0)
+            f.seek(start)
+            chunk = f.read(position - start)
+            index = chunk.rfind(b"\n")
+            if index >= 0:
+                position = start + index + 1
+                break
+            position = start
+        if position < end:
+            log.warning(f"truncating {end - position} bytes of incomplete data from {path}")
+            f.truncate(position)
+
+def read_segment(path, offset=0):
+    """
+    Yields each complete record in a segment file, from the given byte offset
+    with the offset of the end of the record
+    Incomplete or corrupted lines are skipped
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                log.warning(f"skipping corrupted record in {path}: {exc}")
+                continue
+            yield record, offset
@@ -0,0 +1,69 @@
+"""
+A persistent record of uploads in progress
+For each local file we keep its size, mtime and sha256 hash
+How much of a file the server has is always asked of the server (see MECSServer.resume_offset)
+If a file changes (e.g. it is re-aggregated) its entry is started again
+"""
+
+import os
+import json
+import hashlib
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def sha256(path, length=None, chunk_size=65536):
+    """hash of a file, or of its first 'length' bytes"""
+    digest = hashlib.sha256()
+    remaining = os.path.getsize(path) if length is None else length
+    with open(path, "rb") as f:
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+class UploadJournal:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.entries = json.load(f)
+            except json.decoder.JSONDecodeError as exc:
+                log.warning(exc)
+                log.warning(f"ignoring corrupted upload journal {path}")
+
+    def save(self):
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def entry(self, file):
+        """The journal entry for a file, started again if the file has changed"""
+        name = os.path.basename(file)
+        size = os.path.getsize(file)
+        mtime = os.path.getmtime(file)
+        entry = self.entries.get(name)
+        if not entry or entry['size'] != size or entry['mtime'] != mtime:
+            if entry:
+                log.info(f"{name} has changed since it was last sent, starting again")
+            entry = self.entries[name] = {
+                "size": size,
+                "mtime": mtime,
+                "sha256": sha256(file)
+            }
+            self.save()
+        return entry
+
+    def remove(self, file):
+        if self.entries.pop(os.path.basename(file), None) is not None:
+            self.save()
+
+    def __repr__(self):
+        return f"UploadJournal({self.path!r}, {len(self.entries)} entries)"
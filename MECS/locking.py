@@ -0,0 +1,39 @@
+"""
+Advisory file locks shared between the MECS processes
+mecs-aggregate, mecs-upload and mecs-daemon all take the data lock before touching
+the aggregated and archive folders so they don't collide
+"""
+
+import os
+import fcntl
+import logging
+from contextlib import contextmanager
+
+from . import MECSError
+
+log = logging.getLogger(__name__)
+
+class LockBusy(MECSError): pass
+
+DATA_LOCK = "data.lock"
+DAEMON_LOCK = "daemon.lock"
+
+
+@contextmanager
+def locked(path, wait=True):
+    """
+    Hold an exclusive lock on the given file for the duration of the context
+    Raises LockBusy if wait is False and another process holds the lock
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            raise LockBusy(f"{path} is locked by another process")
+        log.debug(f"acquired lock {path}")
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+            log.debug(f"released lock {path}")
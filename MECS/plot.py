@@ -10,11 +10,13 @@ import pandas as pd
 from matplotlib import pyplot as plt
 import matplotlib.dates as mdates
 
+from .data_management.formats import extensions, read_aggregated
+
 log = logging.getLogger(__name__)
 
 def plot_file(data_path, image_path):
     log.debug(f"Loading data from {data_path}")
-    df = pd.read_json(data_path, orient="split")
+    df = read_aggregated(data_path)
     title = f"MECS data for file {data_path}"
     plot_frame(df, title, image_path)
 
@@ -34,9 +36,12 @@ def plot_frame(df, title, image_path):
     log.info(f"Creating {image_path}")
     plt.savefig(image_path, dpi=300)
 
+def aggregated_files(folder):
+    return sorted(f for ext in extensions for f in glob.glob(os.path.join(folder, f"*{ext}")))
+
 def plot_all(source_folder, dest_folder):
     os.makedirs(dest_folder, exist_ok=True)
-    files = sorted(glob.glob(os.path.join(source_folder, "*.json")))
+    files = aggregated_files(source_folder)
     if not files:
         log.info("No files to plot")
     for source_file in files:
@@ -47,8 +52,8 @@ def plot_all(source_folder, dest_folder):
 
 def plot_as_one(source_folder, destination_file):
     dfs = []
-    files = sorted(glob.glob(os.path.join(source_folder, "*.json")))
+    files = aggregated_files(source_folder)
     for source_file in files:
-        dfs.append(pd.read_json(source_file, orient="split"))
+        dfs.append(read_aggregated(source_file))
     df = pd.concat(dfs)
     plot_frame(df, "ALL MECS data so far", destination_file)
@@ -0,0 +1,16 @@
+"""
+Simulated hardware for developing and benchmarking off the pi
+
+The simulated smbus, pigpio, serial and one-wire backends take as long as the real hardware:
+i2c transfers at the bus speed, ADC conversions at the rate for the bit rate,
+the DS18B20 conversion time and EP3000 and SDS011 replies at the serial baud rate.
+Faults can be injected at random (see Faults).
+A SimulatedServer stands in for the upload server.
+
+    with Simulator(faults=Faults(0.01)):
+        board = MECSBoard(**devices_config)
+"""
+from .faults import Faults
+from .signals import constant, sine
+from .simulator import Simulator
+from .server import SimulatedServer
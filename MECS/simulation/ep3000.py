@@ -0,0 +1,164 @@
+"""
+A simulated serial port with an EP3000 inverter (or another serial device) on the other end
+
+Bytes take 10 bit times each way at the baud rate, the device starts replying
+'response_time' seconds after it has received a complete command (for the EP3000, one ending in '\r')
+A fault drops the reply
+"""
+import threading
+import time
+from collections import deque
+
+from serial import SerialException
+
+from .signals import as_signal
+
+
+class EP3000:
+    """Replies to the Q1, F, X and G? commands, with values from signals"""
+    defaults = {
+        "input_voltage": 230.0,
+        "output_voltage": 230.0,
+        "load": 12,
+        "frequency": 50.0,
+        "battery_voltage": 2.25,
+        "temperature": 25.0,
+        "charge_current": 10,
+    }
+
+    def __init__(self, clock=time.monotonic, **signals):
+        self.signals = {key: as_signal(signals.get(key, value)) for key, value in self.defaults.items()}
+        self.clock = clock
+
+    def respond(self, command):
+        now = self.clock()
+        value = {key: signal(now) for key, signal in self.signals.items()}
+        if command == b"Q1\r":
+            return (
+                f"({value['input_voltage']:05.1f} 000.0 {value['output_voltage']:05.1f} {int(value['load']):03d} "
+                f"{value['frequency']:04.1f} {value['battery_voltage']:4.2f} {value['temperature']:04.1f} 00001001\r"
+            ).encode()
+        if command == b"F\r":
+            return f"({value['frequency']:04.1f}\r".encode()
+        if command == b"X\r":
+            return f"{int(value['charge_current']):04X} 0000\r".encode()
+        if command == b"G?\r":
+            return b"(00000000\r"
+        return b"(NAK\r"
+
+    def complete(self, command):
+        return command.endswith(b"\r")
+
+
+class SimulatedSerial:
+    def __init__(self, device, port, baudrate=2400, timeout=None, response_time=0.05, faults=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.device = device
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.response_time = response_time
+        self.faults = faults
+        self.clock = clock
+        self.sleep = sleep
+        self.is_open = True
+        self.lock = threading.Lock()
+        self.command = bytearray()
+        self.sending_until = 0.0  # when the last byte written has been transmitted
+        self.incoming = deque()  # (arrival time, byte)
+        self.buffer = bytearray()
+
+    @property
+    def byte_time(self):
+        return 10 / self.baudrate
+
+    def check_open(self):
+        if not self.is_open:
+            raise SerialException("Attempting to use a port that is not open")
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def write(self, data):
+        self.check_open()
+        with self.lock:
+            start = max(self.clock(), self.sending_until)
+            self.sending_until = start + len(data) * self.byte_time
+            for byte in data:
+                self.command.append(byte)
+                if self.device.complete(self.command):
+                    self.reply(bytes(self.command))
+                    self.command.clear()
+        return len(data)
+
+    def reply(self, command):
+        response = self.device.respond(command)
+        if not response or self.faults and self.faults("serial"):
+            return
+        start = max(self.sending_until + self.response_time, self.incoming[-1][0] if self.incoming else 0)
+        for i, byte in enumerate(response):
+            self.incoming.append((start + (i + 1) * self.byte_time, byte))
+
+    def flush(self):
+        """Wait until everything written has been sent"""
+        delay = self.sending_until - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+
+    def arrived(self):
+        now = self.clock()
+        with self.lock:
+            while self.incoming and self.incoming[0][0] <= now:
+                self.buffer.append(self.incoming.popleft()[1])
+        return self.buffer
+
+    @property
+    def in_waiting(self):
+        self.check_open()
+        return len(self.arrived())
+
+    def take(self, n):
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        return data
+
+    def read(self, size=1):
+        """Blocks until 'size' bytes arrive, or the timeout"""
+        return self.read_until(None, size)
+
+    def read_until(self, expected=b"\n", size=None):
+        self.check_open()
+        deadline = None if self.timeout is None else self.clock() + self.timeout
+        while True:
+            buffer = self.arrived()
+            if expected is not None and expected in buffer:
+                end = buffer.index(expected) + len(expected)
+                return self.take(end if size is None else min(end, size))
+            if size is not None and len(buffer) >= size:
+                return self.take(size)
+            with self.lock:
+                next_byte = self.incoming[0][0] if self.incoming else None
+            now = self.clock()
+            if deadline is not None and now >= deadline:
+                return self.take(len(buffer))
+            if next_byte is None:
+                if deadline is None:
+                    raise SerialException("read would block forever, nothing is coming")
+                self.sleep(deadline - now)
+            else:
+                self.sleep(max(0, min(next_byte, deadline or next_byte) - now))
+
+    def read_all(self):
+        self.check_open()
+        return self.take(len(self.arrived()))
+
+    def reset_input_buffer(self):
+        with self.lock:
+            self.incoming.clear()
+        self.buffer.clear()
+
+    def __repr__(self):
+        return f"SimulatedSerial({self.port!r}, {self.baudrate!r})"
@@ -0,0 +1,28 @@
+"""
+Random fault injection for the simulated hardware
+"""
+import random
+from collections import Counter
+
+
+class Faults:
+    """
+    Each transaction fails with probability 'rate', or the rate given for its kind
+    e.g. Faults(0.01, serial=0.1), injected faults are counted by kind
+    """
+    def __init__(self, rate=0.0, seed=None, **rates):
+        self.rate = rate
+        self.rates = rates
+        self.random = random.Random(seed)
+        self.injected = Counter()
+
+    def __call__(self, kind):
+        rate = self.rates.get(kind, self.rate)
+        if rate and self.random.random() < rate:
+            self.injected[kind] += 1
+            return True
+        return False
+
+    def __repr__(self):
+        rates = "".join(f", {kind}={rate!r}" for kind, rate in self.rates.items())
+        return f"Faults({self.rate!r}{rates})"
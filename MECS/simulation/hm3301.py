@@ -0,0 +1,85 @@
+"""
+A simulated pigpio connection with an HM3301 particulate sensor on bit-banged i2c
+
+bb_i2c_zip takes the time to clock the bytes it sends and receives at the bit-bang baud rate
+A fault corrupts the frame, so it fails its checksum
+"""
+import time
+
+from .signals import as_signal
+
+PI_GPIO_IN_USE = -50  # as pigpio.PI_GPIO_IN_USE
+
+# offsets of each value in the HM3301 data frame
+OFFSETS = {
+    'PM1.0': 4,
+    'PM2.5': 6,
+    'PM10': 8,
+    'PM_1.0_conctrt_atmosph': 10,
+    'PM_2.5_conctrt_atmosph': 12,
+    'PM_10_conctrt_atmosph': 14,
+    'Count 0.3um+ in 1l air': 16,
+    'Count 0.5um+ in 1l air': 18,
+    'Count 1.0um+ in 1l air': 20,
+    'Count 2.5um+ in 1l air': 22,
+    'Count 5.0um+ in 1l air': 24,
+    'Count 10.0um+ in 1l air': 26,
+}
+FRAME_LENGTH = 29
+
+
+class HM3301:
+    """Signals for any of the values in the frame, others are zero"""
+    def __init__(self, clock=time.monotonic, **signals):
+        self.signals = {key: as_signal(signal) for key, signal in signals.items()}
+        self.clock = clock
+
+    def frame(self):
+        data = bytearray(FRAME_LENGTH)
+        now = self.clock()
+        for key, offset in OFFSETS.items():
+            value = max(0, min(0xFFFF, int(round(self.signals[key](now))))) if key in self.signals else 0
+            data[offset:offset + 2] = value.to_bytes(2, "big")
+        data[FRAME_LENGTH - 1] = sum(data[:FRAME_LENGTH - 1]) & 0xFF
+        return data
+
+
+class SimulatedPi:
+    connected = True
+
+    def __init__(self, sensor, faults=None, sleep=time.sleep):
+        self.sensor = sensor
+        self.faults = faults
+        self.sleep = sleep
+        self.open = {}
+
+    def set_pull_up_down(self, gpio, pud):
+        return 0
+
+    def bb_i2c_open(self, SDA, SCL, baud):
+        if SDA in self.open:
+            return PI_GPIO_IN_USE
+        self.open[SDA] = baud
+        return 0
+
+    def bb_i2c_close(self, SDA):
+        self.open.pop(SDA, None)
+        return 0
+
+    def bb_i2c_zip(self, SDA, data):
+        """
+        Only the commands used by the HM3301 driver are understood
+        a read (6, n) returns the sensor's frame, anything else returns nothing
+        """
+        baud = self.open[SDA]
+        read = data[data.index(6) + 1] if 6 in data else 0
+        self.sleep((len(data) + read) * 9 / baud)
+        if not read:
+            return 0, bytearray()
+        frame = self.sensor.frame()[:read]
+        if self.faults and self.faults("pigpio"):
+            frame[-1] ^= 0xFF
+        return len(frame), frame
+
+    def stop(self):
+        self.open.clear()
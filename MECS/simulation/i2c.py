@@ -0,0 +1,144 @@
+"""
+A simulated smbus with MCP3424 (ADC Pi) and INA3221 chips attached
+
+Each transfer takes the time to clock its bytes at the bus speed (9 clocks per byte)
+and only one transfer happens at a time, as on the real bus.
+The MCP3424 converts in real time at the rate for its bit rate,
+the INA3221 updates its registers at the end of each conversion cycle.
+"""
+import errno
+import threading
+import time
+
+from ..data_acquisition.ADCPi.ABE_ADCPi import SAMPLE_RATES, LSB, PGA_SCALE
+from ..data_acquisition.INA3221 import INA3221_AVERAGING, INA3221_CONVERSION_TIMES, SHUNT_RESISTOR_VALUE
+from .signals import as_signal
+
+I2C_CLOCK = 100000
+
+
+class SimulatedSMBus:
+    def __init__(self, chips, clock_hz=I2C_CLOCK, faults=None, sleep=time.sleep):
+        self.chips = chips
+        self.clock_hz = clock_hz
+        self.faults = faults
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.transactions = 0
+
+    def transfer(self, address, n_bytes):
+        """The chip at the address, after the time taken to send the address and n bytes"""
+        with self.lock:
+            self.sleep((n_bytes + 1) * 9 / self.clock_hz)
+            self.transactions += 1
+        if address not in self.chips or (self.faults and self.faults("i2c")):
+            raise OSError(errno.EREMOTEIO, "Remote I/O error")
+        return self.chips[address]
+
+    def write_byte(self, address, value):
+        self.transfer(address, 1).write_byte(value)
+
+    def read_i2c_block_data(self, address, command, length):
+        return self.transfer(address, length + 1).read_i2c_block_data(command, length)
+
+    def write_word_data(self, address, register, value):
+        self.transfer(address, 3).write_word_data(register, value)
+
+    def read_word_data(self, address, register):
+        return self.transfer(address, 4).read_word_data(register)
+
+    def __repr__(self):
+        return f"SimulatedSMBus({', '.join(f'0x{a:02x}: {c!r}' for a, c in self.chips.items())})"
+
+
+def twos_complement(value, bits):
+    limit = (1 << (bits - 1)) - 1
+    value = max(-limit - 1, min(limit, int(round(value))))
+    return value & ((1 << bits) - 1)
+
+
+class MCP3424:
+    """
+    Four channels, numbered 1 to 4, each with a signal giving the voltage read by ADCPi.read_voltage
+    A stalled chip never finishes a conversion, its ready bit stays set
+    """
+    def __init__(self, signals, clock=time.monotonic, stalled=False):
+        self.signals = {channel: as_signal(signal) for channel, signal in signals.items()}
+        self.clock = clock
+        self.stalled = stalled
+        self.config = None
+        self.start = 0.0
+        self.read = 0
+
+    def configure(self, config):
+        # a conversion restarts when the config changes or a one-shot conversion is requested
+        one_shot = not config & 0x10 and config & 0x80
+        if (config & 0x7F) != self.config or one_shot:
+            self.config, self.start, self.read = config & 0x7F, self.clock(), 0
+
+    def write_byte(self, value):
+        self.configure(value)
+
+    def read_i2c_block_data(self, config, length):
+        self.configure(config)
+        bits = {0: 12, 1: 14, 2: 16, 3: 18}[(config >> 2) & 0b11]
+        gain = {0: 1, 1: 2, 2: 4, 3: 8}[config & 0b11]
+        channel = ((config >> 5) & 0b11) + 1
+        now = self.clock()
+        completed = int((now - self.start) * SAMPLE_RATES[bits])
+        if not config & 0x10:
+            completed = min(completed, 1)
+        ready = completed > self.read and not self.stalled
+        if ready:
+            self.read = completed
+        signal = self.signals.get(channel)
+        voltage = signal(now) if signal else 0.0
+        code = twos_complement(voltage / 2.471 * PGA_SCALE[gain] / LSB[bits], bits)
+        status = (config & 0x7F) | (0 if ready else 0x80)
+        if bits == 18:
+            return [code >> 16, (code >> 8) & 0xFF, code & 0xFF, status]
+        return [code >> 8, code & 0xFF, status, status]
+
+    def __repr__(self):
+        return f"MCP3424(channels={sorted(self.signals)})"
+
+
+class INA3221:
+    """
+    Three channels, numbered 1 to 3, each with a current (A) and a bus voltage (V) signal
+    Readings are those of the last completed conversion cycle
+    """
+    def __init__(self, currents, voltages, shunt_resistor=SHUNT_RESISTOR_VALUE, clock=time.monotonic):
+        self.currents = {channel: as_signal(signal) for channel, signal in currents.items()}
+        self.voltages = {channel: as_signal(signal) for channel, signal in voltages.items()}
+        self.shunt_resistor = shunt_resistor
+        self.clock = clock
+        self.cycle = 0.0
+        self.write_word_data(0x00, 0x2771)  # the power on config, byte swapped
+
+    def write_word_data(self, register, value):
+        if register != 0x00:
+            return
+        config = ((value & 0xFF) << 8) | (value >> 8)
+        averaging = {code: n for n, code in INA3221_AVERAGING.items()}[(config >> 9) & 0b111]
+        times = {code: t for t, code in INA3221_CONVERSION_TIMES.items()}
+        enabled = bin(config >> 12 & 0b111).count("1")
+        conversion = (times[(config >> 6) & 0b111] + times[(config >> 3) & 0b111]) / 1e6
+        self.cycle = averaging * enabled * conversion
+
+    def read_word_data(self, register):
+        channel = (register - 1) // 2 + 1
+        t = self.clock() // self.cycle * self.cycle if self.cycle else self.clock()
+        if register % 2:
+            current = self.currents.get(channel)
+            # shunt voltage in units of 5uV
+            raw = (current(t) if current else 0.0) * self.shunt_resistor / 5e-6
+        else:
+            voltage = self.voltages.get(channel)
+            # bus voltage in mV
+            raw = (voltage(t) if voltage else 0.0) * 1000
+        value = twos_complement(raw, 16)
+        return ((value & 0xFF) << 8) | (value >> 8)
+
+    def __repr__(self):
+        return f"INA3221(channels={sorted(set(self.currents) | set(self.voltages))})"
@@ -0,0 +1,55 @@
+"""
+A simulated SDS011 particulate sensor, in query mode, for a SimulatedSerial port
+
+Commands are 19 byte frames and replies 10 bytes, as the real sensor
+While it sleeps the sensor only answers the sleep/work command
+"""
+import struct
+import time
+
+from .signals import as_signal
+
+COMMAND_LENGTH = 19
+QUERY_CMD = 0x04
+SLEEP_CMD = 0x06
+SENSOR_ID = b"\x12\x34"
+
+
+def reply(kind, data):
+    data = bytes(data) + SENSOR_ID
+    return b"\xaa" + bytes([kind]) + data + bytes([sum(data) & 0xFF]) + b"\xab"
+
+
+class SDS011:
+    """Signals for 'PM2.5' and 'PM10' in ug/m3, the time spent awake is kept for the fan and laser"""
+    def __init__(self, clock=time.monotonic, **signals):
+        self.signals = {key: as_signal(signals.get(key, 0)) for key in ['PM2.5', 'PM10']}
+        self.clock = clock
+        self.awake = True
+        self.woken = self.clock()
+        self.awake_time = 0.0
+
+    def complete(self, command):
+        return len(command) == COMMAND_LENGTH
+
+    def respond(self, command):
+        cmd, write, value = command[2], command[3], command[4]
+        if cmd == SLEEP_CMD:
+            if write:
+                self.set_awake(value == 1)
+            return reply(0xC5, [cmd, write, int(self.awake), 0])
+        if not self.awake:
+            return None
+        if cmd == QUERY_CMD:
+            now = self.clock()
+            pm25, pm10 = (max(0, min(0xFFFF, int(round(self.signals[key](now) * 10)))) for key in ['PM2.5', 'PM10'])
+            return reply(0xC0, struct.pack("<HH", pm25, pm10))
+        return reply(0xC5, [cmd, write, value, 0])
+
+    def set_awake(self, awake):
+        now = self.clock()
+        if self.awake and not awake:
+            self.awake_time += now - self.woken
+        elif awake and not self.awake:
+            self.woken = now
+        self.awake = awake
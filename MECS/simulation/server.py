@@ -0,0 +1,71 @@
+"""
+A simulated server in a local folder, for running uploads without a network
+Remote commands are run by bash in the folder, each taking 'latency' seconds for the round trip
+and data are sent at 'bandwidth' bytes per second
+A fault breaks the connection part way through a transfer, or fails a command
+"""
+import os
+import shutil
+import subprocess
+import time
+
+from ..communication import MECSServer, UploadFailed
+
+
+class SimulatedServer(MECSServer):
+    def __init__(self, remote_folder, latency=0.5, bandwidth=None, faults=None, data_root="data", sleep=time.sleep):
+        super().__init__("mecs", "simulated", 22, data_root, multiplex=False)
+        self.remote_folder = remote_folder
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.faults = faults
+        self.sleep = sleep
+        self.bytes_sent = 0
+        os.makedirs(remote_folder, exist_ok=True)
+
+    def transfer_time(self, size):
+        return size / self.bandwidth if self.bandwidth else 0
+
+    def failed(self, args):
+        return subprocess.CompletedProcess(args, 255, "", "simulated connection failure")
+
+    def run(self, args, **kwargs):
+        if args[0] not in ["ssh", "scp"]:
+            return super().run(args, **kwargs)
+        self.sleep(self.latency)
+        if self.faults and self.faults("server"):
+            return self.failed(args)
+        if args[0] == "scp":
+            source, destination = args[-2], args[-1].split(":", 1)[1]
+            size = os.path.getsize(source)
+            self.sleep(self.transfer_time(size))
+            shutil.copyfile(source, os.path.join(self.remote_folder, destination))
+            self.bytes_sent += size
+            return subprocess.CompletedProcess(args, 0, "", "")
+        return subprocess.run(["bash", "-c", args[-1]], cwd=self.remote_folder,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    def send(self, command, chunks):
+        self.sleep(self.latency)
+        process = subprocess.Popen(["bash", "-c", command], cwd=self.remote_folder, stdin=subprocess.PIPE,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        sent = 0
+        broken = False
+        for chunk in chunks:
+            if self.faults and self.faults("server"):
+                chunk = chunk[:len(chunk) // 2]
+                broken = True
+            self.sleep(self.transfer_time(len(chunk)))
+            process.stdin.write(chunk)
+            sent += len(chunk)
+            if broken:
+                break
+        process.stdin.close()
+        process.wait()
+        self.bytes_sent += sent
+        if broken or process.returncode:
+            raise UploadFailed(f"transfer failed after {sent} bytes")
+        return sent
+
+    def __repr__(self):
+        return f"SimulatedServer({self.remote_folder!r}, latency={self.latency!r}, bandwidth={self.bandwidth!r})"
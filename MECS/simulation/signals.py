@@ -0,0 +1,24 @@
+"""
+Signals are functions of time (in seconds) giving the value a simulated sensor measures
+"""
+import math
+import random
+
+
+def constant(value, noise=0.0):
+    return lambda t: value + random.gauss(0, noise) if noise else value
+
+def sine(amplitude, frequency=50, offset=0.0, noise=0.0):
+    """e.g. an ac waveform through a biased sensor"""
+    def signal(t):
+        value = offset + amplitude * math.sin(2 * math.pi * frequency * t)
+        return value + random.gauss(0, noise) if noise else value
+    return signal
+
+def as_signal(spec):
+    """A number is a constant, anything else should already be a signal"""
+    if isinstance(spec, (int, float)):
+        return constant(spec)
+    if not callable(spec):
+        raise TypeError(f"{spec!r} is not a number or a function of time")
+    return spec
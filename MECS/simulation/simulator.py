@@ -0,0 +1,83 @@
+"""
+Simulated hardware for all the devices, so the whole system can run (and be benchmarked) without a pi
+"""
+import logging
+
+from ..data_acquisition import backends
+from .ep3000 import EP3000, SimulatedSerial
+from .hm3301 import HM3301, SimulatedPi
+from .sds011 import SDS011
+from .i2c import SimulatedSMBus, MCP3424, INA3221, I2C_CLOCK
+from .signals import constant
+from .w1 import SimulatedDS18B20
+
+log = logging.getLogger(__name__)
+
+# every address an ADC Pi can be set to, in pairs
+ADC_ADDRESSES = [(0x68, 0x69), (0x6A, 0x6B), (0x6C, 0x6D), (0x6E, 0x6F)]
+INA3221_ADDRESS = 0x40
+# the serial port the SDS011 is on, the EP3000 is on any other
+SDS011_PORT = "/dev/ttyUSB1"
+
+
+class Simulator:
+    """
+    adc gives the signal for each ADC Pi channel (1 to 8), the voltage as returned by read_voltage
+    currents and voltages give the signals for the INA3221 channels (1 to 3)
+    particulates are signals for the HM3301 frame (e.g. 'PM2.5') and inverter for the EP3000 (see EP3000.defaults)
+    dust are signals for the SDS011 ('PM2.5' and 'PM10'), which is on SDS011_PORT
+    temperature is the signal for a DS18B20, or a dict of signals for several keyed by sensor id
+    Anything not given is a steady, slightly noisy value
+    """
+    def __init__(self, adc=None, currents=None, voltages=None, particulates=None, inverter=None, dust=None, temperature=None,
+                 faults=None, i2c_clock=I2C_CLOCK, response_time=0.05):
+        adc = adc or {channel: constant(1.25, noise=0.001) for channel in range(1, 9)}
+        chips = {}
+        for address1, address2 in ADC_ADDRESSES:
+            chips[address1] = MCP3424({channel: adc[channel] for channel in range(1, 5) if channel in adc})
+            chips[address2] = MCP3424({channel - 4: adc[channel] for channel in range(5, 9) if channel in adc})
+        chips[INA3221_ADDRESS] = INA3221(
+            currents or {1: constant(0.5, noise=0.005), 2: constant(0.2, noise=0.005)},
+            voltages or {1: constant(12.0, noise=0.01), 2: constant(5.0, noise=0.01)}
+        )
+        self.faults = faults
+        self.i2c = SimulatedSMBus(chips, clock_hz=i2c_clock, faults=faults)
+        self.particulate = HM3301(**(particulates or {'PM2.5': constant(12, noise=1), 'PM10': constant(20, noise=1)}))
+        self.inverter = EP3000(**(inverter or {}))
+        self.dust = SDS011(**(dust or {'PM2.5': constant(10, noise=0.5), 'PM10': constant(18, noise=0.5)}))
+        if not isinstance(temperature, dict):
+            temperature = {"00000000000a": temperature if temperature is not None else constant(25.0, noise=0.1)}
+        self.thermometers = [SimulatedDS18B20(signal, id=id, faults=faults) for id, signal in temperature.items()]
+        self.response_time = response_time
+
+    def smbus(self, number=None):
+        return self.i2c
+
+    def pigpio(self):
+        return SimulatedPi(self.particulate, faults=self.faults)
+
+    def serial(self, port, baudrate, **kwargs):
+        device = self.dust if port == SDS011_PORT else self.inverter
+        return SimulatedSerial(device, port, baudrate, timeout=kwargs.get('timeout'),
+                               response_time=self.response_time, faults=self.faults)
+
+    def w1_sensors(self):
+        return list(self.thermometers)
+
+    def install(self):
+        """Devices created from now on use the simulated hardware"""
+        log.warning("using simulated hardware")
+        backends.install(self)
+        return self
+
+    def uninstall(self):
+        backends.uninstall()
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+    def __repr__(self):
+        return f"Simulator({self.i2c!r}, faults={self.faults!r})"
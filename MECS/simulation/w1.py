@@ -0,0 +1,44 @@
+"""
+A simulated DS18B20 one-wire temperature sensor
+Each read waits for a conversion (750ms at 12 bits), a fault makes the sensor not ready
+"""
+import os
+import time
+
+os.environ['W1THERMSENSOR_NO_KERNEL_MODULE'] = '1'
+
+from w1thermsensor.errors import SensorNotReadyError
+
+from .signals import as_signal
+
+CONVERSION_TIMES = {9: 0.09375, 10: 0.1875, 11: 0.375, 12: 0.75}
+
+
+class SimulatedDS18B20:
+    name = "DS18B20"
+
+    def __init__(self, temperature=25.0, id="00000000000a", resolution=12, faults=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.temperature = as_signal(temperature)
+        self.id = id
+        self.resolution = resolution
+        self.faults = faults
+        self.clock = clock
+        self.sleep = sleep
+
+    def get_resolution(self):
+        return self.resolution
+
+    def set_resolution(self, resolution, persist=False):
+        self.resolution = resolution
+
+    def get_temperature(self):
+        self.sleep(CONVERSION_TIMES[self.resolution])
+        if self.faults and self.faults("w1"):
+            raise SensorNotReadyError(self)
+        # the sensor's resolution is 1/16 degree at 12 bits
+        step = 0.0625 * 2 ** (12 - self.resolution)
+        return round(self.temperature(self.clock()) / step) * step
+
+    def __repr__(self):
+        return f"SimulatedDS18B20({self.id!r})"
@@ -0,0 +1,51 @@
+"""
+Readings per second, i2c polls and config writes per reading and CPU use of ADCPi for each bit rate
+Compares polling the ready bit continuously (the old behaviour, emulated by not sleeping)
+with sleeping for the conversion time, and reading one chip with reading both in turn
+
+usage:
+    python benchmarks/adc_rate.py [seconds per test]
+
+With no ADC Pi attached, a simulated pair of MCP3424 chips is used (see MECS.simulation),
+with i2c transfers taking as long as they would at 100 kHz
+"""
+import sys
+import time
+
+from MECS.data_acquisition.ADCPi import ADCPi
+from MECS.simulation.i2c import SimulatedSMBus, MCP3424
+
+
+def get_bus():
+    try:
+        from MECS.data_acquisition.ADCPi import ABEHelpers
+        bus = ABEHelpers().get_smbus()
+        if bus:
+            ADCPi(bus)
+            return bus, "ADC Pi"
+    except (ImportError, OSError):
+        pass
+    return SimulatedSMBus({0x68: MCP3424({1: 1.0}), 0x69: MCP3424({1: 1.0})}), "simulated MCP3424"
+
+def measure(adc, channels, duration):
+    adc.polls = adc.writes = 0
+    readings = 0
+    wall, cpu = time.perf_counter(), time.process_time()
+    while time.perf_counter() - wall < duration:
+        readings += adc.read_raw_array(channels, 1).size
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return readings / wall, adc.polls / readings, adc.writes / readings, 100 * cpu / wall
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    bus, name = get_bus()
+    print(f"{name}, {duration}s per test")
+    print(f"{'bits':>4} {'mode':<8} {'channels':<8} {'readings/s':>10} {'polls/reading':>14} {'writes/reading':>15} {'cpu %':>6}")
+    for rate in [12, 14, 16, 18]:
+        for mode, sleep in [("busy", lambda s: None), ("timed", time.sleep)]:
+            for channels in [[1], [1, 5]]:
+                adc = ADCPi(bus, rate=rate, sleep=sleep)
+                adc.set_conversion_mode(1)
+                result = measure(adc, channels, duration)
+                print(f"{rate:>4} {mode:<8} {','.join(map(str, channels)):<8} {result[0]:>10.1f} {result[1]:>14.1f} {result[2]:>15.2f} {result[3]:>6.1f}")
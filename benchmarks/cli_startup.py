@@ -0,0 +1,49 @@
+"""
+Startup time of each mecs-* command on this machine
+Measures a fresh interpreter importing the console script and the module the command runs,
+i.e. everything which happens before the command starts its work,
+and reports whether pandas or the hardware drivers were imported on the way
+
+usage:
+    python benchmarks/cli_startup.py [repeats]
+"""
+import sys
+import subprocess
+import statistics
+import time
+
+from MECS.cli import commands
+
+SCRIPT = """
+import sys
+from importlib import import_module
+import MECS.cli
+getattr(MECS.cli, {name!r})
+import_module("MECS.cli.{module}")
+print(",".join(m for m in ["pandas", "numpy", "smbus", "serial", "pigpio"] if m in sys.modules))
+"""
+
+
+def startup(module, name, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", SCRIPT.format(module=module, name=name)], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result.stdout.strip()
+
+def baseline(repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'python -c pass':<16} {baseline(repeats) * 1000:>7.0f} ms")
+    for script, (module, name) in commands.items():
+        t, heavy = startup(module, name, repeats)
+        print(f"{script:<16} {t * 1000:>7.0f} ms  {heavy}")
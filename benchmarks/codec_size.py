@@ -0,0 +1,78 @@
+"""
+Bytes per day per unit for the aggregated data formats
+Compares the current json (and json as compressed by scp -C) with the mecz codec
+
+usage:
+    python benchmarks/codec_size.py [aggregated files...]
+
+Without arguments, a synthetic day of minutely data resembling a DC unit is used
+"""
+import sys
+import gzip
+import io
+import tempfile
+import os.path
+
+import numpy as np
+import pandas as pd
+
+from MECS.data_management import codec
+from MECS.data_management.formats import read_aggregated, get_format
+
+
+def synthetic_day(seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.DatetimeIndex(pd.date_range("2022-10-24", periods=1440, freq="min"), name="dt")
+    t = np.arange(1440) / 1440
+    sun = np.clip(np.sin((t - 0.25) * 2 * np.pi), 0, None)
+    df = pd.DataFrame({
+        "battery_voltage": 12.4 + 0.8 * sun + rng.normal(0, 0.01, 1440),
+        "pv_voltage": 18 * sun + rng.normal(0, 0.05, 1440),
+        "load_voltage": 12.2 + rng.normal(0, 0.01, 1440),
+        "battery_current": 3 * sun - 0.5 + rng.normal(0, 0.02, 1440),
+        "main_load_current": 0.5 + rng.normal(0, 0.02, 1440),
+        "pv_current": 4 * sun + rng.normal(0, 0.02, 1440),
+        "usb_load_current": 0.2 + rng.normal(0, 0.005, 1440),
+        "load_bus_voltage": 5.1 + rng.normal(0, 0.002, 1440),
+        "temperature": 25 + 5 * sun + rng.normal(0, 0.05, 1440),
+        "PM2.5": rng.poisson(12, 1440).astype(float),
+        "PM10": rng.poisson(20, 1440).astype(float),
+    }, index=index)
+    df.iloc[100:110, 9:] = np.nan
+    return df
+
+def sizes(df):
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "day.json")
+        get_format("json").write(df, path)
+        with open(path, "rb") as f:
+            raw_json = f.read()
+    result = {
+        "json": len(raw_json),
+        "json + gzip (scp -C)": len(gzip.compress(raw_json)),
+        "npz": None,
+        "mecz gzip": len(codec.encode(df, compression=codec.GZIP)),
+    }
+    with io.BytesIO() as f:
+        np.savez_compressed(f, values=df.to_numpy(dtype=np.float32), dt=df.index.values.astype("datetime64[s]").astype(np.int64))
+        result["npz"] = f.tell()
+    try:
+        result["mecz zstd"] = len(codec.encode(df, compression=codec.ZSTD))
+    except ImportError:
+        pass
+    codec.verify(df, codec.encode(df))
+    return result
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        days = [read_aggregated(path) for path in sys.argv[1:]]
+    else:
+        days = [synthetic_day()]
+    totals = {}
+    for df in days:
+        for name, size in sizes(df).items():
+            totals[name] = totals.get(name, 0) + size
+    baseline = totals["json"]
+    print(f"{len(days)} day(s), {sum(len(df) for df in days)} rows, {len(days[0].columns)} channels")
+    for name, size in totals.items():
+        print(f"{name:>22}: {size / len(days):>10.0f} bytes/day ({100 * size / baseline:5.1f}% of json)")
@@ -0,0 +1,127 @@
+"""
+The whole acquisition -> aggregate -> upload pipeline on simulated hardware
+
+usage:
+    python benchmarks/pipeline.py [devices.json] [minutes] [fault rate]
+
+The devices (default devices/ac.json) are read from a MECS.simulation.Simulator,
+with each device taking as long as the real hardware.
+Time in the sampling loop is virtual, it only passes while the scheduler is waiting,
+so the minutes are generated as fast as the devices can be read.
+The board runs on the same virtual clock, so every read finds its devices due.
+The minutely records are stored, aggregated in each format and uploaded
+to a SimulatedServer over a slow link (0.5s round trip, 2 kB/s).
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from MECS.simulation import Simulator, Faults, SimulatedServer
+from MECS.data_acquisition.board import MECSBoard
+from MECS.data_management.minutely import aggregated_minutely_readings
+from MECS.data_management.schedule import DeadlineScheduler
+from MECS.data_management.storage import SegmentStore
+from MECS.data_management.aggregate import aggregate
+from MECS.data_management.formats import get_format
+from MECS.communication import UploadScheduler
+from MECS.journal import UploadJournal
+
+
+class VirtualClock:
+    def __init__(self, start):
+        self.start = start
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+    def sleep(self, seconds):
+        self.t += seconds
+
+    def now(self):
+        return self.start + timedelta(seconds=self.t)
+
+
+class Running:
+    kill_now = False
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def checked(readings):
+    """board.readings, raising if a read comes back empty (which would time nothing)"""
+    def read():
+        reading = readings()
+        if not reading["data"]:
+            raise RuntimeError("a board read returned no data, no devices were due")
+        return reading
+    return read
+
+def read_board(board, clock, reads):
+    """Read the board 'reads' times, one board interval apart on its virtual clock"""
+    read = checked(board.readings)
+    result = []
+    for _ in range(reads):
+        clock.sleep(board.interval)
+        result.append(read())
+    return result
+
+def acquisition(devices_config, reads):
+    for concurrent in [False, True]:
+        clock = VirtualClock(datetime.utcnow())
+        board = MECSBoard(True, concurrent, clock=clock, **json.loads(json.dumps(devices_config)))
+        board.readings()
+        _, duration = timed(read_board, board, clock, reads)
+        print(f"{'concurrent' if concurrent else 'sequential':>10} read: {1000 * duration / reads:8.1f} ms per reading")
+        board.close()
+
+def generate(board, clock, output_folder, minutes):
+    scheduler = DeadlineScheduler(board.interval, clock=clock, sleep=clock.sleep, wall_clock=clock.now)
+    store = SegmentStore(output_folder)
+    records = 0
+    for data in aggregated_minutely_readings(checked(board.readings), delay=board.interval, scheduler=scheduler, killer=Running()):
+        store.write(data)
+        records += 1
+        if records == minutes:
+            break
+    store.close()
+    return records
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "devices", "ac.json")
+    minutes = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    with open(path) as f:
+        devices_config = json.load(f)
+    faults = Faults(rate, seed=1)
+    simulator = Simulator(faults=faults)
+    print(f"{path}, {minutes} minutes, fault rate {rate}")
+    with simulator, tempfile.TemporaryDirectory() as root:
+        acquisition(devices_config, reads=5)
+        clock = VirtualClock(datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0))
+        board = MECSBoard(True, True, clock=clock, **devices_config)
+        transactions = simulator.i2c.transactions
+        records, duration = timed(generate, board, clock, os.path.join(root, "raw"), minutes)
+        board.close()
+        samples = records * 60 / board.interval
+        print(f"  generate: {records} minutes in {duration:.1f}s, {1000 * duration / samples:.1f} ms and "
+              f"{(simulator.i2c.transactions - transactions) / samples:.1f} i2c transactions per sample")
+        for name in ["json", "npz", "mecz"]:
+            aggregated = os.path.join(root, f"aggregated_{name}")
+            _, duration = timed(aggregate, os.path.join(root, "raw"), aggregated, fmt=get_format(name))
+            files = [f for f in os.listdir(aggregated) if os.path.isfile(os.path.join(aggregated, f))]
+            size = sum(os.path.getsize(os.path.join(aggregated, f)) for f in files)
+            server = SimulatedServer(os.path.join(root, f"remote_{name}"), latency=0.5, bandwidth=2000, faults=faults)
+            journal = UploadJournal(os.path.join(root, f"journal_{name}.json"))
+            scheduler = UploadScheduler(server, journal, root)
+            _, upload_duration = timed(scheduler.run, aggregated, "unit", os.path.join(root, f"uploaded_{name}"), extensions=[get_format(name).extension])
+            print(f"{name:>10}: aggregate {1000 * duration:6.1f} ms, {size:6d} bytes uploaded in {upload_duration:5.1f}s")
+        if faults.injected:
+            print(f"    faults: {dict(faults.injected)}")
@@ -12,6 +12,10 @@ setup(
     'pyserial',
     'w1thermsensor',
   ],
+  extras_require={
+    'arrow': ['pyarrow'],
+    'zstd': ['zstandard'],
+  },
   entry_points = """
     [console_scripts]
     mecs-test = MECS.cli:test
@@ -25,5 +29,8 @@ setup(
     mecs-test-connection = MECS.cli:test_connection
     mecs-update = MECS.cli:update
     mecs-calibrate = MECS.cli:calibrate
+    mecs-convert = MECS.cli:convert
+    mecs-daemon = MECS.cli:daemon
+    mecs-ctl = MECS.cli:ctl
     """
 )
@@ -0,0 +1,91 @@
+"""
+Testing the streaming accumulator and reducers
+"""
+import math
+import statistics
+from datetime import datetime, timedelta
+from itertools import islice
+
+import pytest
+
+from MECS.data_management.accumulator import ChannelAccumulator, MinuteAccumulator, mean, stats, reducers
+from MECS.data_management.minutely import aggregated_minutely_readings
+from MECS.data_management.schedule import DeadlineScheduler
+
+
+def test_channel_matches_statistics():
+    values = [1.5, 2.0, 7.25, -3.0, 4.0]
+    channel = ChannelAccumulator()
+    for v in values:
+        channel.add(v)
+    assert channel.count == 5
+    assert channel.result() == pytest.approx(statistics.mean(values))
+    assert channel.std == pytest.approx(statistics.stdev(values))
+    assert channel.min == -3.0
+    assert channel.max == 7.25
+
+def test_channel_ignores_invalid_readings():
+    channel = ChannelAccumulator()
+    for v in [None, 1.0, "not a number", float('nan'), "3.0"]:
+        channel.add(v)
+    assert channel.samples == 5
+    assert channel.count == 2
+    assert channel.result() == 2.0
+
+def test_channel_with_no_valid_readings():
+    channel = ChannelAccumulator()
+    channel.add(None)
+    assert channel.result() is None
+    assert channel.std is None
+    assert channel.min is None
+
+def test_single_reading_has_no_std():
+    channel = ChannelAccumulator()
+    channel.add(1.0)
+    assert channel.std is None
+
+def test_mean_reducer():
+    acc = MinuteAccumulator()
+    acc.add({"a": 1, "b": None})
+    acc.add({"a": 3, "b": None})
+    assert len(acc) == 2
+    assert mean(acc) == {"a": 2.0, "b": None}
+
+def test_stats_reducer():
+    acc = MinuteAccumulator()
+    acc.add({"a": 1})
+    acc.add({"a": None})
+    acc.add({"a": 3})
+    result = stats(acc)
+    assert result["a"] == 2.0
+    assert result["a_min"] == 1.0
+    assert result["a_max"] == 3.0
+    assert result["a_std"] == pytest.approx(math.sqrt(2))
+    assert result["a_count"] == 2
+
+def test_reducers_are_registered():
+    assert reducers["mean"] is mean
+    assert reducers["stats"] is stats
+
+def test_minutely_readings():
+    start = datetime(2022, 10, 24, 13, 35, 0)
+    clock = {"now": 0.0}
+    def sleep(t):
+        clock["now"] += t
+    def wall_clock():
+        return start + timedelta(seconds=clock["now"])
+    scheduler = DeadlineScheduler(20, clock=lambda: clock["now"], sleep=sleep, wall_clock=wall_clock)
+    def get_readings():
+        dt = wall_clock()
+        return {"dt": dt, "data": {"a": dt.second, "b": None}}
+    first, second = islice(aggregated_minutely_readings(get_readings, reducer=stats, scheduler=scheduler), 2)
+    assert first['dt'] == datetime(2022, 10, 24, 13, 35)
+    assert first['a_count'] == 3
+    assert first['a'] == 20.0
+    assert first['b'] is None
+    assert first['b_count'] == 0
+    assert first['sched_samples'] == 3
+    assert first['sched_rate'] == pytest.approx(0.05)
+    assert second['dt'] == datetime(2022, 10, 24, 13, 36)
+    assert second['a_count'] == 3
+    assert second['sched_skipped'] == 0
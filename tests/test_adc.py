@@ -1,8 +1,11 @@
 """
 Testing the ADCDevice and ADCSensor
 """
+import numpy as np
 import pytest
 
+from MECS.simulation import Simulator
+from MECS.data_acquisition.board import MECSBoard
 from MECS.data_acquisition.devices.adc import ADCDevice, ADCSensor, ADCError
 
 # Happy tests - this is how it should work
@@ -241,3 +244,134 @@ def test_with_invalid_current_channel():
         })
     assert "channel ['your label']: current sensors require 'milliVoltPerAmp' field to be set" in str(e)
 
+
+def test_sample_without_hardware():
+    adc = ADCDevice(hardware_required=False, **{
+        "input_impedance": 10,
+        "bit_rate": 12,
+        "sensors": {}
+    })
+    assert adc.getSample(1, 5).shape == (5,)
+    assert adc.getSample([1, 2], 5).shape == (5, 2)
+    assert list(adc.getAverageSample([1, 2], 5)) == [0, 0]
+
+
+class FakeADCPi:
+    """Returns a sequence of voltages for each channel"""
+    transactions = 0
+
+    def __init__(self, **voltages):
+        self.voltages = {int(k[2:]): np.array(v, dtype=float) for k, v in voltages.items()}
+        self.requests = []
+
+    def read_voltage(self, channel):
+        self.requests.append(channel)
+        return self.voltages[channel][0]
+
+    def read_voltage_array(self, channels, samples):
+        self.requests.append((channels, samples))
+        if np.isscalar(channels):
+            return self.voltages[channels][:samples]
+        return np.column_stack([self.voltages[c][:samples] for c in channels])
+
+def oversampled_adc(**sensor):
+    return ADCDevice(hardware_required=False, **{
+        "input_impedance": 10,
+        "bit_rate": 12,
+        "sensors": {
+            "current": {"type": "current", "channel": 1, "zero_point": 1.0, "milliVoltPerAmp": 100, **sensor}
+        }
+    })
+
+def test_oversampled_reading():
+    adc = oversampled_adc(oversample=4, filter="median")
+    adc.adc = FakeADCPi(ch1=[1.1, 1.2, 9.0, 1.3])
+    assert adc.readings()['current'] == pytest.approx(2.5)
+    assert adc.adc.requests == [(1, 4)]
+    sensor = adc.sensors['current']
+    assert sensor.config()['oversample'] == 4
+    assert sensor.config()['filter'] == "median"
+
+def test_oversampled_reading_with_interleaved_reference():
+    adc = oversampled_adc(oversample=3, ref_channel=2)
+    adc.adc = FakeADCPi(ch1=[2.0, 2.1, 2.2], ch2=[1.0, 1.1, 1.1])
+    assert adc.readings()['current'] == pytest.approx(10 * (1.0 + 1.0 + 1.1) / 3)
+    assert adc.adc.requests == [([1, 2], 3)]
+
+def test_default_reading_is_a_single_sample():
+    adc = oversampled_adc()
+    adc.adc = FakeADCPi(ch1=[1.5])
+    assert adc.readings()['current'] == pytest.approx(5)
+    assert adc.adc.requests == [1]
+    assert 'oversample' not in adc.sensors['current'].config()
+
+def test_with_invalid_oversample():
+    with pytest.raises(ADCError) as e:
+        oversampled_adc(oversample=0)
+    assert "channel ['current']: oversample: 0 must be at least 1" in str(e)
+
+def test_with_invalid_filter():
+    with pytest.raises(ADCError) as e:
+        oversampled_adc(oversample=2, filter="mode")
+    assert "channel ['current']: unsupported filter: 'mode'" in str(e)
+
+
+def ac_config(**pair):
+    return {
+        "input_impedance": 10,
+        "bit_rate": 16,
+        "sensors": {
+            "ac_voltage": {"type": "voltage", "channel": 1, "zero_point": 0, "resistance": 990},
+            "ac_current": {"type": "current", "channel": 5, "zero_point": 0, "milliVoltPerAmp": 100},
+            "battery": {"type": "voltage", "channel": 2, "zero_point": 0, "resistance": 40},
+        },
+        "ac": {"mains": {"voltage": "ac_voltage", "current": "ac_current", **pair}}
+    }
+
+class FakeBurstADCPi(FakeADCPi):
+    def __init__(self, **voltages):
+        super().__init__(**voltages)
+        self.bit_rates = []
+
+    def set_bit_rate(self, rate):
+        self.bit_rates.append(rate)
+
+    def set_conversion_mode(self, mode):
+        pass
+
+def test_ac_pair_readings():
+    adc = ADCDevice(hardware_required=False, **ac_config(samples=480))
+    assert [label for label, _ in adc.read()] == ["battery", "mains_vrms", "mains_irms", "mains_real_power", "mains_apparent_power", "mains_power_factor"]
+    t = np.arange(480) / 240
+    wave = 1 + 0.5 * np.sin(2 * np.pi * 50 * t)
+    adc.adc = FakeBurstADCPi(ch1=wave, ch2=[1.0], ch5=wave)
+    readings = adc.readings()
+    assert readings['mains_vrms'] == pytest.approx(100 * 0.5 / np.sqrt(2), rel=0.01)
+    assert readings['mains_irms'] == pytest.approx(10 * 0.5 / np.sqrt(2), rel=0.01)
+    assert readings['mains_power_factor'] == pytest.approx(1)
+    assert ([1, 5], 480) in adc.adc.requests
+    assert adc.adc.bit_rates == [12, 16]
+    assert adc.config()['ac'] == {"mains": {"voltage": "ac_voltage", "current": "ac_current", "samples": 480, "bit_rate": 12}}
+
+@pytest.mark.parametrize("pair, message", [
+    ({"voltage": "battery", "current": "nothing"}, "current: 'nothing' is not one of the sensors"),
+    ({"voltage": "ac_current"}, "voltage: 'ac_current' is a current sensor"),
+    ({"samples": 1}, "samples: 1 must be at least 2"),
+    ({"bit_rate": 13}, "bit_rate: 13 (try one of [12, 14, 16, 18])"),
+])
+def test_invalid_ac_pair(pair, message):
+    with pytest.raises(ADCError) as e:
+        ADCDevice(hardware_required=False, **ac_config(**pair))
+    assert f"ac ['mains']: {message}" in str(e)
+
+def test_stalled_chip_reads_none():
+    with Simulator() as simulator:
+        # the second chip, channels 5 to 8, never finishes a conversion
+        simulator.i2c.chips[0x69].stalled = True
+        config = ac_config()
+        config["sensors"]["load"] = {"type": "current", "channel": 6, "zero_point": 0, "milliVoltPerAmp": 100}
+        board = MECSBoard(True, adc={"device": "ADCPi", **config})
+        data = board.readings()['data']
+    assert data['battery'] == pytest.approx(1.25 * 5, abs=0.05)
+    assert data['load'] is None
+    assert data['mains_vrms'] is None and data['mains_power_factor'] is None
@@ -0,0 +1,184 @@
+"""
+Testing the ADCPi block reads against a fake i2c bus
+"""
+import numpy as np
+import pytest
+
+from MECS.data_acquisition.ADCPi import ADCPi
+from MECS.data_acquisition.ADCPi.ABE_ADCPi import ConversionTimeout, CONFIG_BYTES
+
+
+class FakeBus:
+    """
+    Returns a fixed code for each channel, encoded as the MCP3424 would at the configured bit rate
+    Every other read reports the conversion isn't ready yet
+    """
+    def __init__(self, codes):
+        self.codes = codes
+        self.reads = []
+        self.writes = []
+        self.commands = []
+        self.busy = False
+
+    def write_byte(self, address, value):
+        self.writes.append((address, value))
+
+    def read_i2c_block_data(self, address, config, n):
+        self.busy = not self.busy
+        self.commands.append(config)
+        channel = ((config >> 5) & 0b11) + (1 if address == 0x68 else 5)
+        bits = {0: 12, 1: 14, 2: 16, 3: 18}[(config >> 2) & 0b11]
+        code = self.codes[channel] & ((1 << bits) - 1)
+        ready = 0x80 if self.busy else 0x00
+        self.reads.append(channel)
+        if bits == 18:
+            return [code >> 16, (code >> 8) & 0xFF, code & 0xFF, config & 0x7F | ready]
+        return [code >> 8, code & 0xFF, config & 0x7F | ready, 0]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def make_adc(bus, rate, clock=None):
+    clock = clock or FakeClock()
+    return ADCPi(bus, rate=rate, sleep=clock.sleep, clock=clock)
+
+
+@pytest.mark.parametrize("rate", [12, 14, 16, 18])
+def test_block_read_matches_read_raw(rate):
+    codes = {channel: 100 * channel + 7 for channel in range(1, 9)}
+    adc = make_adc(FakeBus(codes), rate)
+    for channel in [1, 4, 5, 8]:
+        raw = adc.read_raw_array(channel, 5)
+        assert raw.shape == (5,)
+        assert list(raw) == [adc.read_raw(channel)] * 5
+        voltages = adc.read_voltage_array(channel, 3)
+        assert voltages == pytest.approx([adc.read_voltage(channel)] * 3)
+
+def test_negative_codes():
+    adc = make_adc(FakeBus({1: -5, 2: 5}), 16)
+    assert list(adc.read_raw_array([1, 2], 1)[0]) == [-5, 5]
+    assert list(adc.read_voltage_array([1, 2], 1)[0] > 0) == [False, True]
+
+def test_round_robin():
+    codes = {channel: channel for channel in range(1, 9)}
+    bus = FakeBus(codes)
+    adc = make_adc(bus, 12)
+    raw = adc.read_raw_array([2, 6, 3], 4)
+    assert raw.shape == (4, 3)
+    assert (raw == np.array([2, 6, 3])).all()
+    # the two chips are read alternately, each in its own order
+    assert [c for c in bus.reads if c < 5][::2] == [2, 3] * 4
+    assert [c for c in bus.reads if c > 4][::2] == [6] * 4
+
+def test_calibrate_reads_current_channels_together():
+    from MECS.data_acquisition.devices.adc import ADCDevice
+    adc = ADCDevice(hardware_required=False, **{
+        "input_impedance": 10,
+        "bit_rate": 12,
+        "sensors": {
+            "a": {"type": "current", "channel": 1, "zero_point": 0, "milliVoltPerAmp": 100},
+            "b": {"type": "voltage", "channel": 2, "zero_point": 0, "resistance": 10},
+            "c": {"type": "current", "channel": 3, "zero_point": 0, "milliVoltPerAmp": 100},
+        }
+    })
+    bus = FakeBus({1: 1000, 2: 0, 3: 2000})
+    adc.adc = make_adc(bus, 12)
+    adc.calibrate(3)
+    assert set(bus.reads) == {1, 3}
+    assert adc.sensors['a'].zero_point == pytest.approx(adc.adc.read_voltage(1))
+    assert adc.sensors['c'].zero_point == pytest.approx(adc.adc.read_voltage(3))
+
+class SlowBus(FakeBus):
+    """Never ready"""
+    def read_i2c_block_data(self, address, config, n):
+        block = super().read_i2c_block_data(address, config, n)
+        block[3 if (config >> 2) & 0b11 == 3 else 2] |= 0x80
+        return block
+
+def test_sleeps_for_the_conversion_time():
+    clock = FakeClock()
+    bus = FakeBus({1: 10})
+    adc = make_adc(bus, 18, clock)
+    adc.read_raw(1)
+    assert clock.sleeps[0] == pytest.approx(1 / 3.75)
+    # a busy chip is polled a few times a conversion, not continuously
+    assert adc.polls == 2
+    assert clock.sleeps[1] == pytest.approx(1 / 37.5)
+
+def test_conversion_timeout():
+    clock = FakeClock()
+    adc = make_adc(SlowBus({1: 10}), 16, clock)
+    with pytest.raises(ConversionTimeout):
+        adc.read_raw(1)
+    assert clock.now == pytest.approx(4 / 15, abs=0.01)
+    assert adc.polls < 40
+
+def test_chips_convert_together():
+    clock = FakeClock()
+    adc = make_adc(FakeBus({1: 1, 5: 5}), 16, clock)
+    adc.read_raw_array([1, 5], 10)
+    one_chip = FakeClock()
+    make_adc(FakeBus({1: 1, 5: 5}), 16, one_chip).read_raw_array([1, 1], 10)
+    assert clock.now < 0.6 * one_chip.now
+
+def test_config_bytes():
+    assert CONFIG_BYTES[(1, 18, 1, 1)] == 0x9C
+    assert CONFIG_BYTES[(4, 12, 8, 0)] == 0b11100011
+    assert len(set(CONFIG_BYTES.values())) == len(CONFIG_BYTES) == 4 * 4 * 4 * 2
+
+def test_config_written_only_on_change():
+    bus = FakeBus({1: 1, 2: 2, 5: 5})
+    adc = make_adc(bus, 16)
+    assert len(bus.writes) == 2
+    adc.set_bit_rate(16)
+    adc.set_pga(1)
+    adc.set_conversion_mode(1)
+    for _ in range(3):
+        adc.read_raw(1)
+        adc.read_raw_array([1, 5], 4)
+    assert len(bus.writes) == 2
+    adc.read_raw(2)
+    assert bus.writes[2:] == [(0x68, CONFIG_BYTES[(2, 16, 1, 1)] & 0x7F)]
+    adc.set_pga(2)
+    assert len(bus.writes) == 5
+    assert adc.transactions == adc.polls + len(bus.writes)
+
+def test_one_shot():
+    bus = FakeBus({1: 1})
+    adc = make_adc(bus, 12)
+    adc.set_conversion_mode(0)
+    assert adc.read_raw(1) == 1
+    assert adc.read_raw(1) == 1
+    # each conversion is started by a write with the ready bit set, polls don't start another
+    assert [value for _, value in bus.writes[2:]] == [CONFIG_BYTES[(1, 12, 1, 0)]] * 2
+    assert not any(config & 0x80 for config in bus.commands)
+
+def test_transactions_per_reading():
+    from MECS.data_acquisition.devices.adc import ADCDevice
+    adc = ADCDevice(hardware_required=False, **{
+        "input_impedance": 10,
+        "bit_rate": 12,
+        "sensors": {
+            "a": {"type": "voltage", "channel": 1, "zero_point": 0, "resistance": 10},
+            "b": {"type": "voltage", "channel": 5, "zero_point": 0, "resistance": 10},
+        }
+    })
+    assert adc.metrics() == {"i2c_transactions": None}
+    bus = FakeBus({1: 1, 5: 5})
+    adc.adc = make_adc(bus, 12)
+    adc.getAverageSample(1, 4)
+    adc.readings()
+    # the adc stays in continuous mode after the block read
+    # both chips are already converting the right channel, so only the initial config is written
+    assert adc.metrics() == {"i2c_transactions": 4}
+    assert len(bus.writes) == 2
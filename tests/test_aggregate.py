@@ -0,0 +1,139 @@
+"""
+Testing incremental aggregation
+"""
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from MECS.data_management.aggregate import aggregate, build_days, read_new_records, RecordFeed, STORE_SUFFIX, WORKING_FOLDER
+from MECS.data_management.storage import SegmentStore, MinuteFileStore
+from MECS.data_management.formats import NumpyFormat, read_aggregated
+
+
+def write(store, start, n):
+    for i in range(n):
+        dt = start + timedelta(minutes=i)
+        store.write({"dt": dt, "a": float(dt.minute)})
+
+def today():
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+def test_read_new_records_watermark(tmp_path):
+    start = datetime(2022, 10, 24, 12, 0)
+    segments = SegmentStore(str(tmp_path))
+    write(segments, start, 2)
+    segments.close()
+    write(MinuteFileStore(str(tmp_path)), start + timedelta(minutes=2), 2)
+    folder = str(tmp_path / "20221024")
+    records, watermark = read_new_records(folder, {})
+    assert [r['a'] for r in records] == [0.0, 1.0, 2.0, 3.0]
+    assert watermark['file'] == "202210241203.json"
+    assert watermark['segments'] == {"20221024.jsonl": os.path.getsize(tmp_path / "20221024" / "20221024.jsonl")}
+    assert read_new_records(folder, watermark) == ([], watermark)
+    segments = SegmentStore(str(tmp_path))
+    write(segments, start + timedelta(minutes=4), 1)
+    segments.close()
+    write(MinuteFileStore(str(tmp_path)), start + timedelta(minutes=5), 1)
+    records, _ = read_new_records(folder, watermark)
+    assert [r['a'] for r in records] == [4.0, 5.0]
+
+def test_incremental_aggregate(tmp_path):
+    source = tmp_path / "raw"
+    destination = tmp_path / "aggregated"
+    output = destination / f"{today():%Y%m%d}.json"
+    write(MinuteFileStore(str(source)), today(), 3)
+    aggregate(str(source), str(destination))
+    assert len(pd.read_json(output, orient="split")) == 3
+
+    # uploading moves the output away, the next run must still produce the whole day
+    os.remove(output)
+    aggregate(str(source), str(destination))
+    assert not output.exists()
+    write(MinuteFileStore(str(source)), today() + timedelta(minutes=3), 2)
+    aggregate(str(source), str(destination))
+    df = pd.read_json(output, orient="split")
+    assert list(df['a']) == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+def test_past_days_are_archived(tmp_path):
+    source = tmp_path / "raw"
+    destination = tmp_path / "aggregated"
+    store = SegmentStore(str(source))
+    write(store, datetime(2022, 10, 24, 12, 0), 2)
+    store.close()
+    aggregate(str(source), str(destination))
+    assert (destination / "20221024.json").exists()
+    assert (source / "20221024.tar.gz").exists()
+    assert not (source / "20221024").exists()
+    assert os.listdir(destination / WORKING_FOLDER) == ["state.json"]
+
+def test_runs_append_and_build_when_needed(tmp_path):
+    source = tmp_path / "raw"
+    destination = tmp_path / "aggregated"
+    output = destination / f"{today():%Y%m%d}.json"
+    store = destination / WORKING_FOLDER / f"{today():%Y%m%d}{STORE_SUFFIX}"
+    write(MinuteFileStore(str(source)), today(), 3)
+    aggregate(str(source), str(destination), build=False)
+    assert not output.exists()
+    assert len(store.read_text().splitlines()) == 3
+
+    # each run only appends the new records
+    write(MinuteFileStore(str(source)), today() + timedelta(minutes=3), 2)
+    aggregate(str(source), str(destination), build=False)
+    assert len(store.read_text().splitlines()) == 5
+    assert not output.exists()
+
+    build_days(str(destination))
+    assert list(pd.read_json(output, orient="split")['a']) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    os.remove(output)
+    build_days(str(destination))
+    assert not output.exists()
+
+def test_past_days_are_built_before_archiving(tmp_path):
+    source = tmp_path / "raw"
+    destination = tmp_path / "aggregated"
+    store = SegmentStore(str(source))
+    write(store, datetime(2022, 10, 24, 12, 0), 2)
+    store.close()
+    aggregate(str(source), str(destination), build=False)
+    assert list(pd.read_json(destination / "20221024.json", orient="split")['a']) == [0.0, 1.0]
+    assert os.listdir(destination / WORKING_FOLDER) == ["state.json"]
+
+def test_aggregate_binary_format(tmp_path):
+    source = tmp_path / "raw"
+    destination = tmp_path / "aggregated"
+    write(MinuteFileStore(str(source)), today(), 3)
+    aggregate(str(source), str(destination), fmt=NumpyFormat())
+    write(MinuteFileStore(str(source)), today() + timedelta(minutes=3), 1)
+    aggregate(str(source), str(destination), fmt=NumpyFormat())
+    df = read_aggregated(str(destination / f"{today():%Y%m%d}.npz"))
+    assert list(df['a']) == [0.0, 1.0, 2.0, 3.0]
+
+def test_aggregate_from_feed(tmp_path, monkeypatch):
+    source = tmp_path / "raw"
+    destination = tmp_path / "aggregated"
+    output = destination / f"{today():%Y%m%d}.json"
+    store, feed = SegmentStore(str(source)), RecordFeed()
+    def write_fed(start, n):
+        for i in range(n):
+            dt = start + timedelta(minutes=i)
+            data = {"dt": dt, "a": float(dt.minute)}
+            feed.add(data, *store.write(data))
+    write_fed(today(), 3)
+    aggregate(str(source), str(destination), feed=feed)
+    write_fed(today() + timedelta(minutes=3), 2)
+
+    import MECS.data_management.aggregate as module
+    def no_disk(*args):
+        raise AssertionError("records should come from the feed")
+    monkeypatch.setattr(module, "read_new_records", no_disk)
+    aggregate(str(source), str(destination), feed=feed)
+    monkeypatch.undo()
+    assert list(pd.read_json(output, orient="split")['a']) == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+    # records the feed missed are read from disk
+    write(store, today() + timedelta(minutes=5), 1)
+    write_fed(today() + timedelta(minutes=6), 1)
+    aggregate(str(source), str(destination), feed=feed)
+    store.close()
+    assert list(pd.read_json(output, orient="split")['a']) == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
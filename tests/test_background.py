@@ -0,0 +1,55 @@
+"""
+Testing the background reader used by slow devices
+"""
+import time
+
+import pytest
+
+from MECS.data_acquisition.background import BackgroundReader
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_cached_values_and_age():
+    clock = FakeClock()
+    values = iter([{"a": 1}, {"a": 2, "b": 3}])
+    reader = BackgroundReader("test", lambda: next(values), 1, max_age=5, clock=clock)
+    assert reader.get("a") is None and reader.age("a") is None
+    reader.poll_once()
+    clock.now = 2
+    reader.poll_once()
+    clock.now = 4
+    assert reader.get("a") == 2
+    assert reader.age("b") == 2
+    clock.now = 8
+    assert reader.get("a") is None
+    assert reader.polls == 2
+
+def test_failed_polls_keep_the_last_value():
+    clock = FakeClock()
+    def poll():
+        if reader.polls:
+            raise OSError("gone")
+        return {"a": 1}
+    reader = BackgroundReader("test", poll, 1, clock=clock)
+    reader.poll_once()
+    reader.poll_once()
+    assert reader.errors == 1
+    assert reader.get("a") == 1
+
+def test_thread_polls_until_stopped():
+    count = iter(range(1000))
+    reader = BackgroundReader("test", lambda: {"n": next(count)}, 0.01).start()
+    deadline = time.monotonic() + 2
+    while reader.polls < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    reader.stop(timeout=1)
+    polls = reader.polls
+    assert polls >= 3
+    time.sleep(0.05)
+    assert reader.polls == polls
@@ -66,3 +66,35 @@ def test_dc_config():
     readings = board.readings()
     assert isinstance(readings, dict)
     log.debug(readings)
+
+def adc_section(label, **kwargs):
+    section = {
+        "device": "ADCPi",
+        "bit_rate": 16,
+        "input_impedance": 16800,
+        "sensors": {
+            label: {"channel": 1, "type": "voltage", "zero_point": 0, "resistance": 10}
+        }
+    }
+    section.update(kwargs)
+    return section
+
+def test_invalid_sample_interval():
+    with pytest.raises(MECSConfigError) as e:
+        board = MECSBoard(hardware_required=False, **{"test": adc_section("v", sample_interval="often")})
+    assert "sample_interval must be a number" in str(e)
+
+def test_sample_intervals():
+    now = [100.0]
+    board = MECSBoard(hardware_required=False, clock=lambda: now[0], **{
+        "fast": adc_section("fast", sample_interval=0.5),
+        "default": adc_section("default"),
+        "slow": adc_section("slow", sample_interval=2)
+    })
+    assert board.interval == 0.5
+    counts = {"fast": 0, "default": 0, "slow": 0}
+    for i in range(8):
+        for label in board.readings()['data']:
+            counts[label] += 1
+        now[0] += 0.5
+    assert counts == {"fast": 8, "default": 4, "slow": 2}
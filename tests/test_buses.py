@@ -0,0 +1,74 @@
+"""
+Testing the shared bus manager
+"""
+import threading
+
+import pytest
+
+from MECS.simulation import Simulator
+from MECS.data_acquisition import backends
+from MECS.data_acquisition.board import MECSBoard
+from MECS.data_acquisition.buses import ManagedBus
+
+
+class FakeSMBus:
+    def __init__(self):
+        self.fail = False
+
+    def read_word_data(self, address, register):
+        if self.fail:
+            raise OSError(121, "Remote I/O error")
+        return 0x1234
+
+    def read_i2c_block_data(self, address, register, length):
+        return [0] * length
+
+
+def test_client_stats():
+    handle = FakeSMBus()
+    bus = ManagedBus("i2c-1", handle)
+    client = bus.client("INA3221@0x40")
+    assert bus.client("INA3221@0x40") is client
+    assert client.read_word_data(0x40, 1) == 0x1234
+    client.read_i2c_block_data(0x68, 0x9C, 4)
+    handle.fail = True
+    with pytest.raises(OSError):
+        client.read_word_data(0x40, 1)
+    metrics = client.metrics()
+    assert metrics["bus_transactions"] == 3
+    assert metrics["bus_bytes"] == 3 + 5 + 3
+    assert metrics["bus_errors"] == 1
+    assert metrics["bus_error_rate"] == pytest.approx(1 / 3, abs=1e-4)
+    assert sum(metrics["bus_latency"].values()) == 3
+
+def test_batch_holds_the_bus():
+    bus = ManagedBus("i2c-1", FakeSMBus())
+    first, second = bus.client("first"), bus.client("second")
+    done = threading.Event()
+    with first.batch():
+        first.read_word_data(0x40, 1)
+        thread = threading.Thread(target=lambda: (second.read_word_data(0x40, 2), done.set()))
+        thread.start()
+        assert not done.wait(0.05)
+        first.read_word_data(0x40, 3)
+    thread.join()
+    assert done.is_set()
+    assert second.stats.waiting >= 0.04
+    assert first.stats.batches == 1
+    assert set(bus.metrics()) >= {"first_share", "second_share"}
+
+def test_one_bus_for_all_devices():
+    with Simulator():
+        assert backends.get_i2c_bus() is backends.get_i2c_bus(1)
+        board = MECSBoard(
+            ADC={"device": "ADCPi", "input_impedance": 10000, "bit_rate": 12,
+                 "sensors": {"voltage": {"channel": 1, "type": "voltage", "zero_point": 0, "resistance": 10}}},
+            INA={"device": "INA3221", "data_points": {"current": {"channel": 1, "type": "current"}}},
+        )
+        board.readings()
+        metrics = board.metrics()
+        assert metrics["ADC"]["bus_transactions"] > 0
+        assert metrics["INA"]["bus_transactions"] > 0
+        assert set(metrics["i2c-1"]) >= {"ADCPi@0x68_share", "INA3221@0x40_share"}
+        board.close()
+    assert backends.managed == {}
@@ -0,0 +1,28 @@
+"""
+The cli package must be cheap to import, commands load their own dependencies
+"""
+import subprocess
+import sys
+
+from MECS.cli import commands
+import MECS.cli
+
+
+def imported_modules(code):
+    script = f"import sys\n{code}\nprint(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, "-c", script], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return set(result.stdout.split())
+
+def test_import_does_not_load_config_or_pandas():
+    modules = imported_modules("import MECS.cli\nfrom MECS.cli import status, upload, generate")
+    assert "pandas" not in modules
+    assert "MECS.cli.status" not in modules
+    assert "MECS.data_acquisition.board" not in modules
+
+def test_status_and_upload_do_not_need_pandas():
+    modules = imported_modules("import MECS.cli.status, MECS.cli.server")
+    assert "pandas" not in modules
+
+def test_every_command_is_exported():
+    for module, name in commands.values():
+        assert callable(getattr(MECS.cli, name))
@@ -0,0 +1,73 @@
+"""
+Testing the time-series codec
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from MECS.data_management import codec
+from MECS.data_management.codec import encode, decode, verify, CodecError
+
+
+def frame(index, **columns):
+    return pd.DataFrame(columns, index=pd.DatetimeIndex(index, name="dt"))
+
+def minutes(n):
+    return pd.date_range("2022-10-24 12:00", periods=n, freq="min")
+
+def test_zigzag_round_trip():
+    values = np.array([0, -1, 1, -2**40, 2**40])
+    assert list(codec.unzigzag(codec.zigzag(values))) == list(values)
+
+def test_delta_of_delta_round_trip():
+    values = np.array([5, 7, 9, 12, 2, -4])
+    assert list(codec.undo_delta_of_delta(codec.delta_of_delta(values))) == list(values)
+
+def test_round_trip():
+    df = frame(minutes(5), a=[1.0, 1.001, 1.002, 1.5, -3.25], b=[10, 20, 30, 40, 50])
+    result = verify(df, encode(df))
+    assert result.index.equals(df.index)
+    assert np.allclose(result['a'], df['a'])
+    assert list(result.columns) == ["a", "b"]
+
+def test_missing_values_and_gaps():
+    index = list(minutes(3)) + [pd.Timestamp("2022-10-24 13:00")]
+    df = frame(index, a=[1.0, None, 3.0, None], b=[None, None, None, None])
+    result = verify(df, encode(df))
+    assert result.index.equals(pd.DatetimeIndex(index))
+    assert np.isnan(result['a'].iloc[1])
+    assert result['b'].isna().all()
+
+def test_infinities_are_stored_as_missing():
+    df = frame(minutes(4), a=[1.0, np.inf, 2.0, -np.inf])
+    result = verify(df, encode(df))
+    assert list(result['a'].isna()) == [False, True, False, True]
+    assert list(result['a'].dropna()) == pytest.approx([1.0, 2.0])
+
+def test_precision_per_channel():
+    df = frame(minutes(3), Voltage=[12.345, 12.36, 12.31], current=[0.1234, 0.1235, 0.1236])
+    data = encode(df, precision={"voltage": 0.1}, default_precision=0.0001)
+    result = verify(df, data, precision={"voltage": 0.1}, default_precision=0.0001)
+    assert list(result['Voltage']) == pytest.approx([12.3, 12.4, 12.3])
+    with pytest.raises(CodecError):
+        verify(df, data, default_precision=0.0001)
+
+def test_quantised_data_is_smaller():
+    df = frame(minutes(1440), a=np.linspace(0, 10, 1440))
+    assert len(encode(df, default_precision=0.01)) < len(df.to_json(orient="split", date_format="iso")) / 20
+
+def test_empty_frame():
+    df = frame([], a=[])
+    result = decode(encode(df))
+    assert len(result) == 0
+    assert list(result.columns) == ["a"]
+
+def test_zstd_round_trip():
+    pytest.importorskip("zstandard")
+    df = frame(minutes(3), a=[1.0, 2.0, 3.0])
+    verify(df, encode(df, compression=codec.ZSTD))
+
+def test_bad_data():
+    with pytest.raises(CodecError) as e:
+        decode(b"not encoded")
+    assert "not MECS encoded data" in str(e)
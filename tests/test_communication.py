@@ -0,0 +1,222 @@
+"""
+Testing MECSServer with a fake subprocess runner
+"""
+import os
+import subprocess
+from datetime import datetime, timedelta
+
+import pytest
+
+from MECS.communication import MECSServer, UploadFailed, UploadScheduler, RateLimiter
+from MECS.journal import UploadJournal
+
+
+class FakeServer(MECSServer):
+    """Records commands, copies 'scp' transfers into a local folder"""
+    def __init__(self, remote, master_fails=False, **kwargs):
+        super().__init__("user", "host", 22, "data", control_folder=str(remote / "control"), **kwargs)
+        self.remote = remote
+        self.master_fails = master_fails
+        self.commands = []
+
+    def run(self, args, **kwargs):
+        self.commands.append(args)
+        stdout = ""
+        returncode = 0
+        if args[0] == "ssh" and "ControlMaster=yes" in args:
+            returncode = 1 if self.master_fails else 0
+        elif args[0] == "scp":
+            source, destination = args[-2], args[-1].split(":", 1)[1]
+            with open(source, "rb") as f:
+                (self.remote / os.path.basename(destination)).write_bytes(f.read())
+        elif args[0] == "ssh" and args[-1].startswith("stat"):
+            for path in args[-1].split()[3:]:
+                local = self.remote / os.path.basename(path)
+                if local.exists():
+                    stdout += f"{local.stat().st_size} {path}\n"
+        return subprocess.CompletedProcess(args, returncode, stdout, "")
+
+
+@pytest.fixture
+def folders(tmp_path):
+    source, archive, remote = tmp_path / "aggregated", tmp_path / "archive", tmp_path / "remote"
+    for folder in [source, archive, remote]:
+        folder.mkdir()
+    (source / "20221024.json").write_text("{}")
+    (source / "20221025.json").write_text("{\"a\": 1}")
+    return source, archive, remote
+
+def test_upload_uses_one_connection(folders):
+    source, archive, remote = folders
+    server = FakeServer(remote)
+    server.upload(str(source), "unit", str(archive))
+    masters = [c for c in server.commands if "ControlMaster=yes" in c]
+    assert len(masters) == 1
+    control_path = [o for o in masters[0] if o.startswith("ControlPath=")][0]
+    for command in server.commands[1:]:
+        assert control_path in command
+    assert server.commands[-1][:3] == ["ssh", "-O", "exit"]
+    assert sorted(os.listdir(archive)) == ["20221024.json", "20221025.json"]
+    assert os.listdir(source) == []
+
+def test_upload_falls_back_without_master(folders):
+    source, archive, remote = folders
+    server = FakeServer(remote, master_fails=True)
+    server.upload(str(source), "unit", str(archive))
+    assert not any("-O" in c for c in server.commands)
+    assert not any(o.startswith("ControlPath=") for c in server.commands[1:] for o in c)
+    assert sorted(os.listdir(archive)) == ["20221024.json", "20221025.json"]
+
+def test_unverified_files_are_not_archived(folders):
+    source, archive, remote = folders
+    class Truncating(FakeServer):
+        def run(self, args, **kwargs):
+            result = super().run(args, **kwargs)
+            if args[0] == "scp" and args[-2].endswith("20221025.json"):
+                (self.remote / "20221025.json").write_text("{")
+            return result
+    server = Truncating(remote, multiplex=False)
+    server.upload(str(source), "unit", str(archive))
+    assert os.listdir(archive) == ["20221024.json"]
+    assert os.listdir(source) == ["20221025.json"]
+
+
+class ShellServer(FakeServer):
+    """Runs the remote commands in a local shell, with the remote folder as the home directory"""
+    def __init__(self, remote, fail_after=None, **kwargs):
+        super().__init__(remote, multiplex=False, **kwargs)
+        self.fail_after = fail_after
+
+    def run(self, args, **kwargs):
+        if args[0] != "ssh":
+            return super().run(args, **kwargs)
+        self.commands.append(args)
+        return subprocess.run(["bash", "-c", args[-1]], cwd=self.remote, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    def send(self, command, chunks):
+        data = b"".join(chunks)
+        interrupted = self.fail_after is not None and len(data) > self.fail_after
+        if interrupted:
+            data = data[:self.fail_after]
+        subprocess.run(["bash", "-c", command], cwd=self.remote, input=data, check=True)
+        self.commands.append(["send", command, len(data)])
+        if interrupted:
+            raise UploadFailed(f"transfer failed after {len(data)} bytes")
+        return len(data)
+
+
+def test_resumable_upload_resumes_the_tail(folders, tmp_path):
+    source, archive, remote = folders
+    content = os.urandom(10000)
+    (source / "20221025.json").write_bytes(content)
+    journal = UploadJournal(str(tmp_path / "journal.json"))
+
+    ShellServer(remote, fail_after=4000).upload(str(source), "unit", str(archive), journal=journal)
+    assert os.listdir(archive) == ["20221024.json"]
+    assert (remote / "data" / "unit" / "20221025.json.part").stat().st_size == 4000
+
+    server = ShellServer(remote)
+    server.upload(str(source), "unit", str(archive), journal=journal)
+    assert [c[2] for c in server.commands if c[0] == "send"] == [6000]
+    assert (remote / "data" / "unit" / "20221025.json").read_bytes() == content
+    assert not (remote / "data" / "unit" / "20221025.json.part").exists()
+    assert sorted(os.listdir(archive)) == ["20221024.json", "20221025.json"]
+    assert UploadJournal(journal.path).entries == {}
+
+def test_resumable_upload_restarts_a_mismatched_part(folders, tmp_path):
+    source, archive, remote = folders
+    (remote / "data" / "unit").mkdir(parents=True)
+    (remote / "data" / "unit" / "20221025.json.part").write_text("{\"b\"")
+    journal = UploadJournal(str(tmp_path / "journal.json"))
+    server = ShellServer(remote)
+    server.upload(str(source), "unit", str(archive), journal=journal)
+    assert (remote / "data" / "unit" / "20221025.json").read_text() == "{\"a\": 1}"
+    assert sorted(os.listdir(archive)) == ["20221024.json", "20221025.json"]
+
+def test_resumable_upload_is_not_archived_if_hash_differs(folders, tmp_path):
+    source, archive, remote = folders
+    class Corrupting(ShellServer):
+        def send(self, command, chunks):
+            return super().send(command, (chunk.replace(b"1", b"2") for chunk in chunks))
+    journal = UploadJournal(str(tmp_path / "journal.json"))
+    Corrupting(remote).upload(str(source), "unit", str(archive), journal=journal)
+    assert os.listdir(archive) == ["20221024.json"]
+    assert os.listdir(source) == ["20221025.json"]
+    assert not (remote / "data" / "unit" / "20221025.json").exists()
+
+
+def test_rate_limiter_sleeps_to_cap_the_rate():
+    clock = {"now": 0.0}
+    def sleep(seconds):
+        clock["now"] += seconds
+    limiter = RateLimiter(1000, clock=lambda: clock["now"], sleep=sleep)
+    data = b"".join(limiter.throttle(b"x" * 500 for _ in range(10)))
+    assert len(data) == 5000
+    # the first 1000 bytes are the initial burst
+    assert clock["now"] == pytest.approx(4.0)
+
+def test_scheduler_queue_order(tmp_path):
+    files = [f"{day}.json" for day in ["20221023", "20221025", "20221021", "20221026"]]
+    newest = UploadScheduler(None, None, str(tmp_path), order="newest")
+    assert list(newest.queue(files, "20221026")) == ["20221026.json", "20221025.json", "20221023.json", "20221021.json"]
+    oldest = UploadScheduler(None, None, str(tmp_path), order="oldest")
+    assert list(oldest.queue(files, "20221026")) == ["20221026.json", "20221021.json", "20221023.json", "20221025.json"]
+
+def test_scheduler_budget_resumes_next_run(folders, tmp_path):
+    source, archive, remote = folders
+    content = os.urandom(3000)
+    (source / "20221025.json").write_bytes(content)
+    journal = UploadJournal(str(tmp_path / "journal.json"))
+    now = datetime(2022, 10, 26, 12)
+    scheduler = UploadScheduler(ShellServer(remote), journal, str(tmp_path), budget=2000, wall_clock=lambda: now)
+
+    run = scheduler.run(str(source), "unit", str(archive))
+    assert run["bytes"] == 2000 and run["files"] == 0
+    assert os.listdir(archive) == []
+
+    run = scheduler.run(str(source), "unit", str(archive))
+    assert run["bytes"] == 1002 and run["files"] == 2
+    assert (remote / "data" / "unit" / "20221025.json").read_bytes() == content
+    runs = (tmp_path / UploadScheduler.RUNS_FILE).read_text().splitlines()
+    assert len(runs) == 2
+
+def test_scheduler_sends_todays_file_whole_or_not_at_all(folders, tmp_path):
+    source, archive, remote = folders
+    (source / "20221025.json").write_bytes(os.urandom(3000))
+    (source / "20221024.json").write_bytes(os.urandom(500))
+    journal = UploadJournal(str(tmp_path / "journal.json"))
+    now = datetime(2022, 10, 25, 12)
+    scheduler = UploadScheduler(ShellServer(remote), journal, str(tmp_path), budget=2000, wall_clock=lambda: now)
+
+    # today's file doesn't fit, so the budget goes to the backlog and nothing of today's is sent
+    run = scheduler.run(str(source), "unit", str(archive))
+    assert run["bytes"] == 500 and run["files"] == 1
+    assert os.listdir(archive) == ["20221024.json"]
+    assert not (remote / "data" / "unit" / "20221025.json.part").exists()
+
+    scheduler.budget = 4000
+    run = scheduler.run(str(source), "unit", str(archive))
+    assert run["bytes"] == 3000 and run["files"] == 1
+
+def test_scheduler_backs_off_after_failure(folders, tmp_path):
+    source, archive, remote = folders
+    now = {"t": datetime(2022, 10, 25, 12)}
+    journal = UploadJournal(str(tmp_path / "journal.json"))
+    failing = UploadScheduler(ShellServer(remote, fail_after=0), journal, str(tmp_path), backoff=60, wall_clock=lambda: now["t"])
+    assert failing.run(str(source), "unit", str(archive))["failed"]
+    assert failing.state["failures"] == 1
+
+    now["t"] += timedelta(seconds=30)
+    assert failing.run(str(source), "unit", str(archive)) is None
+    now["t"] += timedelta(seconds=31)
+    failing.run(str(source), "unit", str(archive))
+    assert failing.state["failures"] == 2
+    assert failing.state["next_attempt"] == (now["t"] + timedelta(seconds=120)).isoformat()
+
+    # the state persists across runs
+    scheduler = UploadScheduler(ShellServer(remote), journal, str(tmp_path), backoff=60, wall_clock=lambda: now["t"])
+    assert scheduler.run(str(source), "unit", str(archive)) is None
+    now["t"] += timedelta(seconds=121)
+    assert not scheduler.run(str(source), "unit", str(archive))["failed"]
+    assert scheduler.state["failures"] == 0
+    assert sorted(os.listdir(archive)) == ["20221024.json", "20221025.json"]
@@ -0,0 +1,84 @@
+"""
+Testing the mecs-daemon supervisor without acquisition
+"""
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from MECS.daemon import Task, Supervisor, ControlServer, send_command
+from MECS.locking import locked, LockBusy
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_task_schedule_is_aligned():
+    clock = FakeClock(1000)
+    task = Task("upload", lambda: None, 3600, offset=300, clock=clock)
+    assert task.next_run == 3900
+    assert not task.due(3899)
+    clock.now = 3900
+    task.run()
+    assert task.next_run == 7500
+    assert task.runs == 1
+
+def test_task_failure_is_recorded():
+    def fail():
+        raise ValueError("no data")
+    task = Task("aggregate", fail, 60, clock=FakeClock(0))
+    task.run()
+    assert task.failures == 1
+    assert "no data" in task.last_error
+    assert task.next_run == 60
+
+def make_supervisor(tmp_path, ran, clock):
+    tasks = [Task(name, lambda name=name: ran.append(name), 3600, clock=clock) for name in ["aggregate", "upload"]]
+    return Supervisor(tasks, str(tmp_path), killer=SimpleNamespace(kill_now=False), clock=clock)
+
+def test_supervisor_runs_due_and_requested_tasks(tmp_path):
+    ran, clock = [], FakeClock(10)
+    supervisor = make_supervisor(tmp_path, ran, clock)
+    supervisor.run_due_tasks()
+    assert ran == []
+    assert supervisor.command(["run", "upload"]) == {"requested": "upload"}
+    supervisor.run_due_tasks()
+    assert ran == ["upload"]
+    clock.now = 3600
+    supervisor.run_due_tasks()
+    assert ran == ["upload", "aggregate", "upload"]
+    assert "error" in supervisor.command(["run", "nothing"])
+    supervisor.command(["stop"])
+    assert supervisor.killer.kill_now
+
+def test_control_socket(tmp_path):
+    ran = []
+    supervisor = make_supervisor(tmp_path, ran, FakeClock(10))
+    supervisor.on_record({"dt": datetime(2022, 10, 25, 12)}, None)
+    path = str(tmp_path / "mecs.sock")
+    server = ControlServer(path, supervisor)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        status = send_command(path, "status")
+        assert status["records"] == 1
+        assert status["last_record"] == "2022-10-25 12:00:00"
+        assert set(status["tasks"]) == {"aggregate", "upload"}
+        assert send_command(path, "run", "aggregate") == {"requested": "aggregate"}
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert supervisor.requested == {"aggregate"}
+
+def test_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / "data.lock")
+    with locked(path):
+        with pytest.raises(LockBusy):
+            with locked(path, wait=False):
+                pass
+    with locked(path, wait=False):
+        pass
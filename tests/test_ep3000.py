@@ -0,0 +1,70 @@
+"""
+Testing the EP3000Device reply parsing and its reader against a simulated inverter
+"""
+import time
+
+import pytest
+
+from MECS.simulation import Faults, Simulator
+from MECS.data_acquisition.devices.EP3000 import EP3000Device, EP3000Error, FrameError, fields, parse_status
+
+
+INVERTER = {"input_voltage": 231.5, "output_voltage": 229.8, "load": 12, "frequency": 50.1,
+            "battery_voltage": 2.25, "temperature": 31.0, "charge_current": 10}
+
+EXPECTED = {
+    'Input voltage': 231.5,
+    'Output voltage': 229.8,
+    'Output_current': 12.0,
+    'Input frequency': 50.1,
+    'Battery voltage': 2.25,
+    'Inverter temp': 31.0,
+    'Load frequency': 50.1,
+    'Charge current': 10.0,
+}
+
+
+def test_status_frame():
+    frame = b"(230.0 000.0 229.0 012 50.0 2.25 25.0 00001001\r"
+    assert parse_status(frame) == {
+        'Input voltage': 230.0, 'Output voltage': 229.0, 'Output_current': 12.0,
+        'Input frequency': 50.0, 'Battery voltage': 2.25, 'Inverter temp': 25.0
+    }
+    assert parse_status(frame.replace(b"25.0", b":2.0"))['Inverter temp'] == 102.0
+
+@pytest.mark.parametrize("frame", [
+    b"(230.0 000.0 229.0 012 50.0 2.25 25.0 00001001",
+    b"230.0 000.0 229.0 012 50.0 2.25 25.0 00001001\r",
+    b"(230.0 000.0 229.0 012 50.0 2.25\r",
+    b"",
+])
+def test_bad_frames(frame):
+    with pytest.raises(FrameError):
+        fields(frame, 8)
+
+@pytest.mark.parametrize("pipeline", [True, False])
+def test_readings(pipeline):
+    with Simulator(inverter=INVERTER, response_time=0):
+        device = EP3000Device(True, baud_rate=115200, poll_interval=60, pipeline=pipeline)
+        assert device.readings() == pytest.approx(EXPECTED)
+        assert device.metrics()["frame_errors"] == 0
+        device.close()
+
+def test_read_does_not_wait_for_the_inverter():
+    with Simulator(inverter=INVERTER, response_time=0.5):
+        device = EP3000Device(True, poll_interval=60)
+        start = time.monotonic()
+        assert device.readings() == pytest.approx(EXPECTED)
+        assert time.monotonic() - start < 0.1
+        device.close()
+
+def test_lost_replies_end_the_round():
+    with Simulator(inverter=INVERTER, response_time=0, faults=Faults(serial=1.0)):
+        device = EP3000Device(True, baud_rate=115200, timeout=0.05, poll_interval=60)
+        assert device.readings() == dict.fromkeys(EXPECTED)
+        assert device.frame_errors == 1
+        device.close()
+
+def test_invalid_config():
+    with pytest.raises(EP3000Error):
+        EP3000Device(False, poll_interval=0)
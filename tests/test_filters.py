@@ -0,0 +1,36 @@
+"""
+Testing the filters for oversampled readings
+"""
+import numpy as np
+import pytest
+
+from MECS import MECSConfigError
+from MECS.data_acquisition.filters import get_filter, IIR
+
+
+def test_boxcar_and_median():
+    samples = np.array([1.0, 2.0, 3.0, 100.0])
+    assert get_filter("boxcar")(samples) == 26.5
+    assert get_filter("median")(samples) == 2.5
+
+def test_iir_matches_the_recurrence():
+    samples = np.random.default_rng(0).normal(size=20)
+    fast, slow = IIR(0.3), IIR(0.3)
+    fast(samples[:8])
+    result = fast(samples[8:])
+    y = samples[0]
+    for x in samples:
+        y = 0.3 * x + 0.7 * y
+    assert result == pytest.approx(y)
+    assert get_filter({"type": "iir", "alpha": 0.3}).alpha == 0.3
+
+@pytest.mark.parametrize("spec, message", [
+    ("mode", "unsupported filter: 'mode'"),
+    ({"alpha": 0.3}, "unsupported filter: None"),
+    ({"type": "iir", "alpha": 2}, "alpha: 2 must be greater than 0"),
+    ({"type": "median", "width": 2}, "filter 'median'"),
+])
+def test_invalid_filters(spec, message):
+    with pytest.raises(MECSConfigError) as e:
+        get_filter(spec)
+    assert message in str(e)
@@ -0,0 +1,55 @@
+"""
+Testing the aggregated data formats
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from MECS import MECSConfigError
+from MECS.data_management.formats import JSONFormat, NumpyFormat, ParquetFormat, FeatherFormat, get_format, read_aggregated, convert
+
+
+@pytest.fixture
+def df():
+    index = pd.DatetimeIndex(pd.date_range("2022-10-24 12:00", periods=4, freq="min"), name="dt")
+    return pd.DataFrame({"a": [1.5, None, 3.25, 4.0], "b": [1, 2, 3, 4]}, index=index)
+
+def test_unknown_format():
+    with pytest.raises(MECSConfigError) as e:
+        get_format("csv")
+    assert "aggregated_format 'csv' is not supported" in str(e)
+
+def test_json_round_trip(df, tmp_path):
+    path = str(tmp_path / "day.json")
+    JSONFormat().write(df, path)
+    result = read_aggregated(path)
+    assert list(result.index) == list(df.index)
+    assert result['a'].equals(df['a'])
+
+def test_npz_round_trip(df, tmp_path):
+    path = str(tmp_path / "day.npz")
+    NumpyFormat().write(df, path)
+    result = read_aggregated(path)
+    assert result.index.equals(df.index)
+    assert list(result.columns) == ["a", "b"]
+    assert result['a'].dtype == np.float32
+    assert np.isnan(result['a'].iloc[1])
+    assert list(result['b']) == [1, 2, 3, 4]
+
+@pytest.mark.parametrize("fmt", [ParquetFormat, FeatherFormat])
+def test_arrow_round_trip(df, tmp_path, fmt):
+    pytest.importorskip("pyarrow")
+    fmt = fmt()
+    path = str(tmp_path / f"day{fmt.extension}")
+    fmt.write(df, path)
+    result = read_aggregated(path)
+    assert result.index.equals(df.index)
+    assert result['a'].dtype == np.float32
+
+def test_convert(df, tmp_path):
+    path = str(tmp_path / "day.json")
+    JSONFormat().write(df, path)
+    new_path = convert(path, NumpyFormat(), remove=True)
+    assert new_path == str(tmp_path / "day.npz")
+    assert not (tmp_path / "day.json").exists()
+    assert list(read_aggregated(new_path)['b']) == [1, 2, 3, 4]
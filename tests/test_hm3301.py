@@ -0,0 +1,49 @@
+"""
+Testing the HM3301Device frame decoding and background sampling against a simulated sensor
+"""
+import pytest
+
+from MECS.simulation import Faults, Simulator
+from MECS.simulation.hm3301 import HM3301
+from MECS.data_acquisition.devices.HM3301 import CHANNELS, HM3301Device, HM3301Error, decode
+
+
+def test_decode():
+    sensor = HM3301(**{'PM2.5': 15, 'PM10': 30, 'Count 0.3um+ in 1l air': 1234})
+    values = decode(sensor.frame())
+    assert list(values) == CHANNELS
+    assert values['PM2.5'] == 15 and values['PM10'] == 30 and values['Count 0.3um+ in 1l air'] == 1234
+    assert values['PM1.0'] == 0
+
+def test_decode_bad_frames():
+    frame = HM3301(**{'PM2.5': 15}).frame()
+    assert decode(frame[:20]) is None
+    frame[6] += 1
+    assert decode(frame) is None
+
+def test_configured_channels():
+    with Simulator(particulates={'PM1.0': 5, 'PM2.5': 15, 'Count 2.5um+ in 1l air': 42}):
+        device = HM3301Device(True, label="pm", poll_interval=60, channels=['PM1.0', 'Count 2.5um+ in 1l air'])
+        assert device.readings() == {'PM1.0': 5, 'Count 2.5um+ in 1l air': 42}
+        device.close()
+
+def test_checksum_failures_are_retried():
+    faults = Faults(pigpio=0.0)
+    with Simulator(particulates={'PM2.5': 15, 'PM10': 30}, faults=faults):
+        device = HM3301Device(True, label="pm", poll_interval=60, retries=2)
+        faults.rates['pigpio'] = 1.0
+        assert device.sample() == {}
+        assert device.metrics()["checksum_errors"] == 3
+        assert device.metrics()["frames"] == 4
+        # the last good values are kept
+        assert device.readings() == {'PM2.5': 15, 'PM10': 30}
+        device.close()
+
+@pytest.mark.parametrize("config", [
+    {"channels": ["PM4.0"]},
+    {"channels": "PM2.5"},
+    {"poll_interval": 0},
+])
+def test_invalid_config(config):
+    with pytest.raises(HM3301Error):
+        HM3301Device(False, **config)
@@ -52,3 +52,56 @@ def test_invalid_type():
         ina = INA3221Device(hardware_required=False, **c)
     assert "Unknown type 'invalid value'" in str(e)
 
+
+
+class FakeSMBus:
+    """Registers hold raw values, words are byte swapped as the INA3221 sends them"""
+    def __init__(self, registers):
+        self.registers = registers
+        self.reads = []
+        self.writes = []
+
+    def read_word_data(self, addr, register):
+        self.reads.append(register)
+        value = self.registers[register] & 0xFFFF
+        return ((value & 0xFF) << 8) | (value >> 8)
+
+    def write_word_data(self, addr, register, data):
+        self.writes.append((register, ((data & 0xFF) << 8) | (data >> 8)))
+
+def test_snapshot_reads_each_register_once():
+    from MECS.data_acquisition.INA3221 import SDL_Pi_INA3221
+    c = copy.deepcopy(config)
+    c['data_points']['daq_shunt_voltage'] = {"channel": 1, "type": "shuntVoltage"}
+    ina = INA3221Device(hardware_required=False, **c)
+    # 200 * 5uV across 0.1 Ohm is 10mA, bus voltages in mV
+    bus = FakeSMBus({0x01: 200, 0x02: 5000, 0x03: -100, 0x04: 12000})
+    ina.device = SDL_Pi_INA3221(bus=bus)
+    readings = ina.readings()
+    assert sorted(bus.reads) == [0x01, 0x02, 0x03, 0x04]
+    assert readings['daq_load_current'] == pytest.approx(0.01 - 0.0056)
+    assert readings['daq_shunt_voltage'] == pytest.approx(0.001)
+    assert readings['usb_load_current'] == pytest.approx(-0.005 - 0.0056)
+    assert readings['daq_bus_voltage'] == pytest.approx(5)
+    assert readings['load_bus_voltage'] == pytest.approx(12)
+
+def test_chip_config():
+    from MECS.data_acquisition.INA3221 import SDL_Pi_INA3221
+    bus = FakeSMBus({})
+    SDL_Pi_INA3221(bus=bus)
+    assert bus.writes == [(0x00, 0x7527)]
+    bus = FakeSMBus({})
+    SDL_Pi_INA3221(bus=bus, averaging=1024, bus_conversion_time=140, shunt_conversion_time=8244, channels=[2])
+    assert bus.writes == [(0x00, 0x2E3F)]
+
+@pytest.mark.parametrize("option, value", [
+    ("averaging", 10),
+    ("bus_conversion_time", 1000),
+    ("shunt_conversion_time", "1100"),
+])
+def test_invalid_chip_config(option, value):
+    c = copy.deepcopy(config)
+    c[option] = value
+    with pytest.raises(INA3221Error) as e:
+        INA3221Device(hardware_required=False, **c)
+    assert f"{option}: {value!r}" in str(e)
@@ -0,0 +1,94 @@
+"""
+Testing concurrent device polling
+"""
+import time
+import threading
+
+from MECS.data_acquisition.board import MECSBoard
+from MECS.data_acquisition.polling import DevicePoller
+
+
+class SlowDevice:
+    def __init__(self, label, delay, bus=None):
+        self.label = label
+        self.delay = delay
+        if bus:
+            self.bus = bus
+
+    def read(self):
+        time.sleep(self.delay)
+        yield self.label, self.delay
+
+
+def make_poller(devices, timeout=1.0):
+    labels = {k: [d.label] for k, d in devices.items()}
+    timeouts = {k: timeout for k in devices}
+    return DevicePoller(devices, labels, timeouts)
+
+def test_devices_are_read_in_parallel():
+    devices = {f"d{i}": SlowDevice(f"reading {i}", 0.2) for i in range(4)}
+    poller = make_poller(devices)
+    start = time.monotonic()
+    result = dict(poller.read())
+    assert time.monotonic() - start < 0.6
+    assert result == {f"reading {i}": 0.2 for i in range(4)}
+    poller.close()
+
+def test_shared_bus_is_serialised():
+    lock = threading.Lock()
+    overlaps = []
+    class BusDevice(SlowDevice):
+        def read(self):
+            if not lock.acquire(blocking=False):
+                overlaps.append(self.label)
+                yield self.label, None
+                return
+            try:
+                yield from super().read()
+            finally:
+                lock.release()
+    devices = {f"d{i}": BusDevice(f"reading {i}", 0.05, bus="i2c") for i in range(3)}
+    poller = make_poller(devices)
+    result = dict(poller.read())
+    assert overlaps == []
+    assert result == {f"reading {i}": 0.05 for i in range(3)}
+    poller.close()
+
+def test_slow_device_times_out():
+    devices = {"fast": SlowDevice("fast", 0), "slow": SlowDevice("slow", 0.5)}
+    poller = make_poller(devices, timeout=0.1)
+    start = time.monotonic()
+    assert dict(poller.read()) == {"fast": 0, "slow": None}
+    assert time.monotonic() - start < 0.3
+    # the slow device is still busy, so it is skipped rather than queued
+    assert dict(poller.read()) == {"fast": 0, "slow": None}
+    assert poller.missed["slow"] == 2
+    assert poller.missed["fast"] == 0
+    poller.close()
+
+def test_failing_device_reports_none():
+    class BrokenDevice:
+        def read(self):
+            raise OSError("no device")
+            yield
+    devices = {"broken": BrokenDevice()}
+    poller = DevicePoller(devices, {"broken": ["a", "b"]}, {"broken": 1})
+    assert dict(poller.read()) == {"a": None, "b": None}
+    poller.close()
+
+def test_concurrent_board():
+    board = MECSBoard(hardware_required=False, concurrent=True, **{
+        "test": {
+            "device": "ADCPi",
+            "bit_rate": 16,
+            "input_impedance": 16800,
+            "timeout": 0.5,
+            "sensors": {
+                "voltage": {"channel": 1, "type": "voltage", "zero_point": 0, "resistance": 10}
+            }
+        }
+    })
+    assert board.timeouts == {"test": 0.5}
+    assert board.labels == {"test": ["voltage"]}
+    assert board.readings()['data'] == {"voltage": None}
+    board.close()
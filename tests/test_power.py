@@ -0,0 +1,33 @@
+"""
+Testing RMS and power from sampled AC waveforms
+"""
+import numpy as np
+import pytest
+
+from MECS.data_acquisition.power import ac_power
+
+
+def sampled(rate=240, seconds=2, mains=50, phase=0.0, offset=2.5):
+    """240 samples per second is only 4.8 per cycle, but the samples fall at different phases"""
+    t = np.arange(int(rate * seconds)) / rate
+    v = offset + 230 * np.sqrt(2) * np.sin(2 * np.pi * mains * t)
+    i = offset + 5 * np.sqrt(2) * np.sin(2 * np.pi * mains * t - phase)
+    return v, i
+
+def test_resistive_load():
+    result = ac_power(*sampled())
+    assert result['vrms'] == pytest.approx(230, rel=0.01)
+    assert result['irms'] == pytest.approx(5, rel=0.01)
+    assert result['real_power'] == pytest.approx(1150, rel=0.01)
+    assert result['power_factor'] == pytest.approx(1, abs=0.01)
+
+def test_lagging_load():
+    result = ac_power(*sampled(phase=np.pi / 3))
+    assert result['apparent_power'] == pytest.approx(1150, rel=0.01)
+    assert result['power_factor'] == pytest.approx(0.5, abs=0.01)
+
+def test_no_current():
+    v, _ = sampled()
+    result = ac_power(v, np.full_like(v, 2.5))
+    assert result['irms'] == 0
+    assert result['power_factor'] is None
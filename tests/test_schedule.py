@@ -0,0 +1,66 @@
+"""
+Testing the DeadlineScheduler with a fake clock
+"""
+from datetime import datetime
+
+import pytest
+
+from MECS.data_management.schedule import DeadlineScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, t):
+        self.slept.append(t)
+        self.now += t
+
+def make_scheduler(period=1):
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(period, clock=clock, sleep=clock.sleep, wall_clock=lambda: datetime(2022, 1, 1))
+    return scheduler, clock
+
+def test_invalid_period():
+    with pytest.raises(ValueError):
+        DeadlineScheduler(0)
+
+def test_work_time_does_not_cause_drift():
+    scheduler, clock = make_scheduler()
+    for _ in range(10):
+        scheduler.wait()
+        clock.now += 0.3
+    scheduler.wait()
+    assert clock.now == pytest.approx(110.0)
+    assert clock.slept == pytest.approx([0.7] * 10)
+    assert scheduler.samples == 10
+    assert scheduler.overruns == 0
+
+def test_overruns_skip_slots():
+    scheduler, clock = make_scheduler()
+    scheduler.wait()
+    clock.now += 2.5  # a slow read misses two deadlines
+    scheduler.wait()
+    clock.now += 0.1
+    scheduler.wait()
+    assert clock.now == pytest.approx(103.0)
+    assert scheduler.overruns == 1
+    assert scheduler.skipped == 1
+    assert scheduler.lateness.max == pytest.approx(0.5)
+
+def test_stats_and_reset():
+    scheduler, clock = make_scheduler()
+    for _ in range(5):
+        scheduler.wait()
+    stats = scheduler.stats()
+    assert stats['sched_samples'] == 4
+    assert stats['sched_rate'] == pytest.approx(1.0)
+    assert stats['sched_jitter_ms'] == pytest.approx(0.0)
+    assert stats['sched_overruns'] == 0
+    scheduler.reset()
+    scheduler.wait()
+    assert scheduler.samples == 1
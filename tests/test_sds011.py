@@ -0,0 +1,69 @@
+"""
+Testing the duty cycled SDS011Device against a simulated sensor
+"""
+import time
+
+import pytest
+
+from MECS.simulation import Faults, Simulator
+from MECS.data_acquisition.board import MECSBoard, known_devices
+from MECS.data_acquisition.devices import SDS011Device
+from MECS.data_acquisition.devices.SDS011 import SDS011Error
+
+
+def wait_for_burst(device, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not device.reader.polls and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_registered():
+    assert known_devices["SDS011"] is SDS011Device
+
+def test_burst_mean_and_sleep():
+    with Simulator(dust={'PM2.5': 12.3, 'PM10': 20.0}, response_time=0) as simulator:
+        device = SDS011Device(True, period=60, warm_up=0, burst=3, burst_interval=0.01)
+        wait_for_burst(device)
+        assert device.readings() == {'SDS011_PM2.5': 12.3, 'SDS011_PM10': 20.0}
+        assert device.duty_cycled and not simulator.dust.awake
+        device.close()
+
+def test_short_period_leaves_the_sensor_working():
+    with Simulator(response_time=0) as simulator:
+        device = SDS011Device(True, period=0.02, warm_up=0, burst=3, burst_interval=0.01)
+        wait_for_burst(device)
+        assert not device.duty_cycled and simulator.dust.awake
+        device.close()
+        assert not simulator.dust.awake
+
+def test_read_does_not_wait_for_the_warm_up():
+    with Simulator(response_time=0) as simulator:
+        device = SDS011Device(True, period=60, warm_up=30)
+        start = time.monotonic()
+        assert device.readings() == {'SDS011_PM2.5': None, 'SDS011_PM10': None}
+        device.close()
+        assert time.monotonic() - start < 1
+        assert not simulator.dust.awake
+
+def test_lost_replies():
+    with Simulator(response_time=0, faults=Faults(serial=1.0)):
+        device = SDS011Device(True, period=60, warm_up=0, burst=2, burst_interval=0, timeout=0.05)
+        wait_for_burst(device)
+        assert device.readings() == {'SDS011_PM2.5': None, 'SDS011_PM10': None}
+        assert device.failed_queries == 2
+        device.close()
+
+def test_on_a_board_with_an_hm3301():
+    with Simulator(particulates={'PM2.5': 15, 'PM10': 30}, dust={'PM2.5': 12.3, 'PM10': 20.0}, response_time=0):
+        board = MECSBoard(True, **{
+            "pm": {"device": "HM3301", "poll_interval": 60},
+            "dust": {"device": "SDS011", "label": "outdoor", "period": 60, "warm_up": 0, "burst": 1},
+        })
+        wait_for_burst(board.devices["dust"])
+        data = board.readings()['data']
+        board.close()
+    assert data == {'PM2.5': 15, 'PM10': 30, 'outdoor_PM2.5': 12.3, 'outdoor_PM10': 20.0}
+
+@pytest.mark.parametrize("config", [{"period": 0}, {"burst": 0}, {"warm_up": "long"}, {"label": ""}])
+def test_invalid_config(config):
+    with pytest.raises(SDS011Error):
+        SDS011Device(False, **config)
@@ -0,0 +1,145 @@
+"""
+Testing the simulated hardware
+"""
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from MECS.simulation import Simulator, Faults, SimulatedServer, sine
+from MECS.simulation.ep3000 import EP3000, SimulatedSerial
+from MECS.simulation.i2c import SimulatedSMBus, MCP3424
+from MECS.simulation.w1 import SimulatedDS18B20, SensorNotReadyError
+from MECS.data_acquisition import backends
+from MECS.data_acquisition.ADCPi import ADCPi
+from MECS.data_acquisition.board import MECSBoard
+from MECS.data_acquisition.devices import HM3301Device
+from MECS.journal import UploadJournal
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+devices_config = {
+    "adc": {
+        "device": "ADCPi",
+        "input_impedance": 10,
+        "bit_rate": 12,
+        "sensors": {
+            "battery": {"type": "voltage", "channel": 1, "zero_point": 0, "resistance": 10},
+            "load": {"type": "current", "channel": 5, "zero_point": 2.5, "milliVoltPerAmp": 100},
+        }
+    },
+    "ina": {
+        "device": "INA3221",
+        "data_points": {
+            "current": {"channel": 1, "type": "current"},
+            "voltage": {"channel": 1, "type": "busVoltage"},
+        }
+    }
+}
+
+def test_board_reads_simulated_devices():
+    with Simulator(adc={1: 1.0, 5: 2.6}, currents={1: 0.5}, voltages={1: 12.0}) as simulator:
+        board = MECSBoard(True, **json.loads(json.dumps(devices_config)))
+        data = board.readings()['data']
+    assert backends.simulator is None
+    assert data['battery'] == pytest.approx(2.0, abs=0.01)
+    assert data['load'] == pytest.approx(1.0, abs=0.01)
+    assert data['current'] == pytest.approx(0.5 - 0.0056)
+    assert data['voltage'] == pytest.approx(12.0)
+    assert simulator.i2c.transactions > 0
+
+def test_board_is_due_on_its_clock():
+    clock = FakeClock()
+    with Simulator(currents={1: 0.5}):
+        board = MECSBoard(True, clock=clock, ina=json.loads(json.dumps(devices_config["ina"])))
+        assert board.readings()['data']
+        assert board.readings()['data'] == {}
+        clock.sleep(board.interval)
+        assert set(board.readings()['data']) == {'current', 'voltage'}
+
+def test_benchmark_reads_return_data():
+    pipeline = pytest.importorskip("benchmarks.pipeline")
+    with Simulator(response_time=0):
+        clock = pipeline.VirtualClock(datetime(2022, 10, 26))
+        board = MECSBoard(True, clock=clock, **json.loads(json.dumps(devices_config)))
+        readings = pipeline.read_board(board, clock, 3)
+        board.close()
+    assert all(set(reading['data']) == {'battery', 'load', 'current', 'voltage'} for reading in readings)
+
+def test_adc_conversion_time():
+    clock = FakeClock()
+    bus = SimulatedSMBus({0x68: MCP3424({1: sine(1, 1, offset=2), 2: 0.5}, clock=clock), 0x69: MCP3424({}, clock=clock)}, sleep=clock.sleep)
+    adc = ADCPi(bus, rate=16, sleep=clock.sleep, clock=clock)
+    samples = adc.read_voltage_array([1, 2], 15)
+    # 15 samples a second from each channel, read in turn
+    assert clock.now == pytest.approx(2, rel=0.05)
+    assert samples[:, 1] == pytest.approx(0.5, abs=0.001)
+    assert samples[:, 0].max() > 2.9 and samples[:, 0].min() < 1.1
+
+def test_i2c_faults():
+    faults = Faults(i2c=1.0)
+    bus = SimulatedSMBus({0x68: MCP3424({})}, faults=faults, sleep=lambda s: None)
+    with pytest.raises(OSError):
+        bus.write_byte(0x68, 0x9C)
+    with pytest.raises(OSError):
+        SimulatedSMBus({}, sleep=lambda s: None).write_byte(0x68, 0x9C)
+    assert faults.injected == {"i2c": 1}
+
+def test_serial_reply_timing():
+    clock = FakeClock()
+    port = SimulatedSerial(EP3000(clock=clock), "/dev/ttyUSB0", 2400, timeout=1, clock=clock, sleep=clock.sleep)
+    port.write(b"Q1\r")
+    assert port.in_waiting == 0
+    reply = port.read_until(b"\r")
+    assert reply == b"(230.0 000.0 230.0 012 50.0 2.25 25.0 00001001\r"
+    assert clock.now == pytest.approx((3 + len(reply)) * 10 / 2400 + 0.05)
+    assert port.read_until(b"\r") == b""
+    assert clock.now == pytest.approx((3 + len(reply)) * 10 / 2400 + 1.05)
+
+def test_serial_fault_drops_the_reply():
+    clock = FakeClock()
+    port = SimulatedSerial(EP3000(), "/dev/ttyUSB0", 2400, timeout=0.5, faults=Faults(serial=1.0), clock=clock, sleep=clock.sleep)
+    port.write(b"F\r")
+    assert port.read_until(b"\r") == b""
+
+def test_ds18b20():
+    clock = FakeClock()
+    sensor = SimulatedDS18B20(21.03, clock=clock, sleep=clock.sleep)
+    assert sensor.get_temperature() == 21.0
+    assert clock.now == 0.75
+    sensor.faults = Faults(w1=1.0)
+    with pytest.raises(SensorNotReadyError):
+        sensor.get_temperature()
+
+def test_hm3301_frames():
+    with Simulator(particulates={'PM2.5': 15, 'PM10': 30}, faults=Faults(pigpio=0.0)) as simulator:
+        device = HM3301Device(True, label="pm")
+        assert dict(device.read()) == {'PM2.5': 15, 'PM10': 30}
+        simulator.faults.rates['pigpio'] = 1.0
+        assert device.sample() == {}
+        device.close()
+
+def test_simulated_server(tmp_path):
+    source, archive = tmp_path / "aggregated", tmp_path / "archive"
+    source.mkdir()
+    content = os.urandom(5000)
+    (source / "20221025.json").write_bytes(content)
+    journal = UploadJournal(str(tmp_path / "journal.json"))
+    server = SimulatedServer(str(tmp_path / "remote"), latency=0, faults=Faults(server=1.0, seed=0))
+    server.upload(str(source), "unit", str(archive), journal=journal)
+    assert os.listdir(source) == ["20221025.json"]
+    server.faults = None
+    server.upload(str(source), "unit", str(archive), journal=journal)
+    assert (tmp_path / "remote" / "data" / "unit" / "20221025.json").read_bytes() == content
+    assert os.listdir(archive) == ["20221025.json"]
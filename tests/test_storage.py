@@ -0,0 +1,74 @@
+"""
+Testing the minutely storage backends
+"""
+import os
+import json
+from datetime import datetime, timedelta
+
+from MECS.data_management.storage import SegmentStore, MinuteFileStore, recover, read_segment
+from MECS.data_management.aggregate import aggregate_folder
+
+
+def records(start, n):
+    for i in range(n):
+        yield {"dt": start + timedelta(minutes=i), "a": float(i), "b": None}
+
+def test_segment_store(tmp_path):
+    store = SegmentStore(str(tmp_path), fsync_every=2)
+    for data in records(datetime(2022, 10, 24, 23, 58), 4):
+        store.write(data)
+    store.close()
+    assert sorted(os.listdir(tmp_path)) == ["20221024", "20221025"]
+    first = list(read_segment(tmp_path / "20221024" / "20221024.jsonl"))
+    assert [r['dt'] for r, _ in first] == ["2022-10-24T23:58:00", "2022-10-24T23:59:00"]
+    assert first[-1][1] == os.path.getsize(tmp_path / "20221024" / "20221024.jsonl")
+    second = list(read_segment(tmp_path / "20221025" / "20221025.jsonl"))
+    assert [r['a'] for r, _ in second] == [2.0, 3.0]
+
+def test_read_segment_from_offset(tmp_path):
+    store = SegmentStore(str(tmp_path))
+    for data in records(datetime(2022, 10, 24, 12, 0), 3):
+        store.write(data)
+    store.close()
+    path = tmp_path / "20221024" / "20221024.jsonl"
+    (_, offset), *_ = read_segment(path)
+    assert [r['a'] for r, _ in read_segment(path, offset)] == [1.0, 2.0]
+
+def test_recover_truncates_partial_record(tmp_path):
+    path = tmp_path / "segment.jsonl"
+    path.write_bytes(b'{"a": 1}\n{"a": 2}\n{"a": 3')
+    recover(str(path))
+    assert path.read_bytes() == b'{"a": 1}\n{"a": 2}\n'
+    recover(str(path))
+    assert path.read_bytes() == b'{"a": 1}\n{"a": 2}\n'
+
+def test_recover_without_newline(tmp_path):
+    path = tmp_path / "segment.jsonl"
+    path.write_bytes(b'{"a": 1')
+    recover(str(path), chunk_size=2)
+    assert path.read_bytes() == b''
+
+def test_store_appends_after_crash(tmp_path):
+    folder = tmp_path / "20221024"
+    folder.mkdir()
+    (folder / "20221024.jsonl").write_bytes(b'{"dt": "2022-10-24T12:00:00", "a": 0.0}\n{"dt": "2022-10')
+    store = SegmentStore(str(tmp_path))
+    store.write({"dt": datetime(2022, 10, 24, 12, 2), "a": 2.0})
+    store.close()
+    assert [r['a'] for r, _ in read_segment(folder / "20221024.jsonl")] == [0.0, 2.0]
+
+def test_minute_file_store(tmp_path):
+    store = MinuteFileStore(str(tmp_path))
+    for data in records(datetime(2022, 10, 24, 12, 0), 2):
+        store.write(data)
+    assert sorted(os.listdir(tmp_path / "20221024")) == ["202210241200.json", "202210241201.json"]
+    with open(tmp_path / "20221024" / "202210241201.json") as f:
+        assert json.load(f) == {"dt": "2022-10-24T12:01:00", "a": 1.0, "b": None}
+
+def test_aggregate_mixed_folder(tmp_path):
+    MinuteFileStore(str(tmp_path)).write({"dt": datetime(2022, 10, 24, 12, 0), "a": 0.0})
+    store = SegmentStore(str(tmp_path))
+    store.write({"dt": datetime(2022, 10, 24, 12, 1), "a": 1.0})
+    store.close()
+    df = aggregate_folder(str(tmp_path / "20221024"))
+    assert list(df['a']) == [0.0, 1.0]
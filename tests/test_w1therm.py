@@ -0,0 +1,60 @@
+"""
+Testing the W1ThermDevice against simulated DS18B20s
+"""
+import time
+
+import pytest
+
+from MECS import MECSHardwareError
+from MECS.simulation import Simulator
+from MECS.data_acquisition.devices.W1Therm import W1ThermDevice, W1ThermError
+
+
+@pytest.fixture
+def simulator():
+    simulator = Simulator(temperature={"0316a2794c2f": 20.0, "0316a27a1b3c": 30.0})
+    for sensor in simulator.thermometers:
+        sensor.sleep = lambda seconds: None
+    with simulator:
+        yield simulator
+
+def test_sensors_found_on_the_bus(simulator):
+    device = W1ThermDevice(True, label="temperature", conversion_interval=60)
+    assert device.readings() == {"temperature_0316a2794c2f": 20.0, "temperature_0316a27a1b3c": 30.0}
+    assert set(device.metrics()) == {"temperature_0316a2794c2f_age", "temperature_0316a27a1b3c_age"}
+    device.close()
+
+def test_named_sensors(simulator):
+    device = W1ThermDevice(True, label="temperature", conversion_interval=60, sensors={"0316a27a1b3c": "battery", "missing": "inside"})
+    assert device.readings() == {"battery": 30.0, "inside": None}
+    device.close()
+
+def test_sensors_are_converted_in_turn(simulator):
+    device = W1ThermDevice(True, label="temperature", conversion_interval=60)
+    assert [list(device.convert()) for _ in range(3)] == [
+        ["temperature_0316a2794c2f"], ["temperature_0316a27a1b3c"], ["temperature_0316a2794c2f"]
+    ]
+    device.close()
+
+def test_read_does_not_wait_for_a_conversion(simulator):
+    device = W1ThermDevice(True, label="temperature", conversion_interval=0.01)
+    for sensor in simulator.thermometers:
+        sensor.sleep = time.sleep
+    time.sleep(0.05)
+    start = time.monotonic()
+    readings = device.readings()
+    assert time.monotonic() - start < 0.1
+    assert readings["temperature_0316a2794c2f"] == 20.0
+    device.close()
+
+def test_no_sensors():
+    with Simulator(temperature={}):
+        with pytest.raises(MECSHardwareError):
+            W1ThermDevice(True, label="temperature")
+        device = W1ThermDevice(False, label="temperature")
+    assert device.readings() == {"temperature": None}
+
+@pytest.mark.parametrize("option, value", [("resolution", 8), ("conversion_interval", 0), ("sensors", ["a"])])
+def test_invalid_config(option, value):
+    with pytest.raises(W1ThermError):
+        W1ThermDevice(False, label="temperature", **{option: value})